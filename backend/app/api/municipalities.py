@@ -1,9 +1,50 @@
 from flask import Blueprint, jsonify, request
 from app.models.municipality import Municipality
+from app.services.municipality_search import get_search_index, lookup_municipalities
+from app.services.hierarchy import get_hierarchy
+from app.services.spatial_index import get_spatial_index
+from app.services.import_generation import current_generation
+from app.services.http_cache import conditional_json, make_etag
+from app.services.pagination import KeysetKey, InvalidCursor, keyset_paginate
+from app.services.serialization import FieldSet, InvalidFields, fast_jsonify
+from app.services.profiling import phase
+from app.services.municipality_snapshot import get_snapshot
+from app.services.export import InvalidExport, export_params, export_response, since_filter
 from sqlalchemy import desc, asc
+import math
 
 bp = Blueprint('municipalities', __name__, url_prefix='/api/municipalities')
 
+# Limity zapytań przestrzennych
+MAX_NEAREST = 100
+MAX_SPATIAL_RESULTS = 1000
+MAX_RADIUS_KM = 500
+
+# Maksymalna liczba identyfikatorów w jednym zapytaniu zbiorczym
+MAX_BATCH_LOOKUP = 1000
+
+# Wartości zastępcze dla kolumn z NULL w paginacji kursorowej
+KEYSET_NULL_VALUES = {
+    'county_name': '',
+    'population': -1,
+    'area': -1.0
+}
+
+# Pola dostępne w parametrze fields= (projekcja na poziomie SQL)
+MUNICIPALITY_FIELDS = FieldSet(Municipality, [
+    'id', 'teryt_code', 'name', 'type', 'voivodeship_code', 'voivodeship_name',
+    'county_code', 'county_name', 'lat', 'lng', 'population', 'area',
+    'bip_url', 'official_website'
+])
+
+# Wielkość liter jak w LIKE SQLite: bez rozróżniania tylko dla liter ASCII ("ł" nie pasuje do "Ł")
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+def _contains(column, value):
+    """Filtr "zawiera" bez rozróżniania wielkości liter; % i _ w wartości traktowane dosłownie"""
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.ilike(f'%{escaped}%', escape='\\')
+
 @bp.route('/', methods=['GET'])
 def get_municipalities():
     """Pobieranie listy gmin z możliwością filtrowania i sortowania"""
@@ -26,11 +67,11 @@ def get_municipalities():
     
     # Filtrowanie
     if name:
-        query = query.filter(Municipality.name.ilike(f'%{name}%'))
+        query = query.filter(_contains(Municipality.name, name))
     if voivodeship:
-        query = query.filter(Municipality.voivodeship_name.ilike(f'%{voivodeship}%'))
+        query = query.filter(_contains(Municipality.voivodeship_name, voivodeship))
     if county:
-        query = query.filter(Municipality.county_name.ilike(f'%{county}%'))
+        query = query.filter(_contains(Municipality.county_name, county))
     if municipality_type:
         query = query.filter(Municipality.type == municipality_type)
     
@@ -38,6 +79,44 @@ def get_municipalities():
     if sort_by not in ['name', 'voivodeship_name', 'county_name', 'type', 'population', 'area']:
         sort_by = 'name'  # Domyślne sortowanie
     
+    # Wybrane pola (np. fields=id,name,teryt_code) - pobierane bez budowania obiektów ORM
+    try:
+        fields = MUNICIPALITY_FIELDS.parse(request.args.get('fields'))
+    except InvalidFields as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Lista stronicowana z migawki gmin (bez zapytań do bazy); paginacja kursorowa korzysta z bazy
+    snapshot = get_snapshot()
+    if snapshot is not None and 'cursor' not in request.args:
+        filters = {'name': name, 'voivodeship_name': voivodeship, 'county_name': county}
+        return fast_jsonify(_snapshot_page(
+            snapshot, filters, municipality_type, sort_by, sort_dir, page, per_page, fields
+        ))
+    
+    if fields:
+        query = MUNICIPALITY_FIELDS.project(query, fields, required=(sort_by, 'id'))
+    
+    # Paginacja kursorowa (keyset) - włączana parametrem "cursor" (pusty dla pierwszej strony)
+    if 'cursor' in request.args:
+        keys = [
+            KeysetKey(getattr(Municipality, sort_by), sort_by, KEYSET_NULL_VALUES.get(sort_by)),
+            KeysetKey(Municipality.id, 'id')
+        ]
+        try:
+            page_data = keyset_paginate(
+                query, keys,
+                descending=(sort_dir == 'desc'),
+                cursor=request.args.get('cursor'),
+                per_page=per_page,
+                signature=f"municipalities:{sort_by}:{sort_dir}",
+                count=request.args.get('count')
+            )
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        
+        page_data['items'] = _serialize(page_data['items'], fields)
+        return fast_jsonify(page_data)
+    
     if sort_dir == 'desc':
         query = query.order_by(desc(getattr(Municipality, sort_by)))
     else:
@@ -48,26 +127,149 @@ def get_municipalities():
     
     # Przygotowanie odpowiedzi
     response = {
-        'items': [m.to_dict() for m in paginated.items],
+        'items': _serialize(paginated.items, fields),
         'total': paginated.total,
         'pages': paginated.pages,
         'page': page,
         'per_page': per_page
     }
     
-    return jsonify(response)
+    return fast_jsonify(response)
+
+def _serialize(items, fields):
+    """Serializuje obiekty gmin lub wiersze projekcji pól"""
+    with phase('serialize'):
+        if fields:
+            return MUNICIPALITY_FIELDS.serialize_rows(items, fields)
+        return [m.to_dict() for m in items]
+
+def _snapshot_page(snapshot, filters, municipality_type, sort_by, sort_dir, page, per_page, fields):
+    """Strona listy gmin z migawki - filtry jak w zapytaniu SQL, porządek sortowania zapisany w migawce"""
+    positions = snapshot.orders[f'{sort_by}:desc' if sort_dir == 'desc' else sort_by]
+    
+    # Porównanie jak w _contains na SQLite - migawka i baza zwracają te same wiersze
+    checks = [(snapshot.columns[column], value.translate(_ASCII_LOWER)) for column, value in filters.items() if value]
+    type_column = snapshot.columns['type']
+    if checks or municipality_type:
+        positions = [
+            i for i in positions
+            if (not municipality_type or type_column[i] == municipality_type)
+            and all(value in (column[i] or '').translate(_ASCII_LOWER) for column, value in checks)
+        ]
+    
+    total = len(positions)
+    page_number = max(page, 1)
+    per_page = per_page if per_page > 0 else 20
+    start = (page_number - 1) * per_page
+    with phase('serialize'):
+        items = [snapshot.row(i, fields) for i in positions[start:start + per_page]]
+    return {
+        'items': items,
+        'total': total,
+        'pages': math.ceil(total / per_page),
+        'page': page,
+        'per_page': per_page
+    }
+
+def _snapshot_response(snapshot, index):
+    """Odpowiedź warunkowa ze szczegółami gminy z migawki"""
+    id = snapshot.columns['id'][index]
+    updated_at = snapshot.updated_at(index)
+    etag = make_etag('municipality', id, updated_at, current_generation())
+    return conditional_json(('municipality', id), etag, updated_at, lambda: snapshot.row(index))
 
 @bp.route('/<int:id>', methods=['GET'])
 def get_municipality(id):
     """Pobieranie szczegółów gminy na podstawie ID"""
-    municipality = Municipality.query.get_or_404(id)
-    return jsonify(municipality.to_dict())
+    snapshot = get_snapshot()
+    index = snapshot.find_id(id) if snapshot is not None else None
+    if index is not None:
+        return _snapshot_response(snapshot, index)
+    
+    # Gminy spoza migawki (lub brak migawki) - odczyt z bazy
+    version = Municipality.query.with_entities(
+        Municipality.id, Municipality.updated_at
+    ).filter_by(id=id).first_or_404()
+    return _municipality_response(version)
 
 @bp.route('/teryt/<teryt_code>', methods=['GET'])
 def get_municipality_by_teryt(teryt_code):
     """Pobieranie szczegółów gminy na podstawie kodu TERYT"""
-    municipality = Municipality.query.filter_by(teryt_code=teryt_code).first_or_404()
-    return jsonify(municipality.to_dict())
+    snapshot = get_snapshot()
+    index = snapshot.find_teryt(teryt_code) if snapshot is not None else None
+    if index is not None:
+        return _snapshot_response(snapshot, index)
+    
+    version = Municipality.query.with_entities(
+        Municipality.id, Municipality.updated_at
+    ).filter_by(teryt_code=teryt_code).first_or_404()
+    return _municipality_response(version)
+
+def _municipality_response(version):
+    """Odpowiedź warunkowa (ETag/Last-Modified) ze szczegółami gminy"""
+    id, updated_at = version
+    etag = make_etag('municipality', id, updated_at, current_generation())
+    return conditional_json(
+        ('municipality', id), etag, updated_at,
+        lambda: Municipality.query.get(id).to_dict()
+    )
+
+@bp.route('/batch', methods=['POST'])
+def get_municipalities_batch():
+    """Zbiorcze pobieranie gmin po ID i kodach TERYT - wynik w słownikach według klucza"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids') or []
+    teryt_codes = data.get('teryt_codes') or []
+    
+    if not isinstance(ids, list) or not isinstance(teryt_codes, list):
+        return jsonify({'error': 'Pola ids i teryt_codes muszą być listami'}), 400
+    if len(ids) + len(teryt_codes) > MAX_BATCH_LOOKUP:
+        return jsonify({'error': f'Maksymalnie {MAX_BATCH_LOOKUP} identyfikatorów w jednym zapytaniu'}), 400
+    try:
+        ids = list(dict.fromkeys(int(i) for i in ids))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Pole ids musi zawierać liczby całkowite'}), 400
+    teryt_codes = list(dict.fromkeys(str(t) for t in teryt_codes))
+    
+    fields = data.get('fields')
+    if isinstance(fields, list):
+        fields = ','.join(fields)
+    try:
+        fields = MUNICIPALITY_FIELDS.parse(fields)
+    except InvalidFields as e:
+        return jsonify({'error': str(e)}), 400
+    
+    by_id, by_teryt = lookup_municipalities(ids, teryt_codes)
+    if fields:
+        by_id = {k: {f: v[f] for f in fields} for k, v in by_id.items()}
+        by_teryt = {k: {f: v[f] for f in fields} for k, v in by_teryt.items()}
+    
+    return fast_jsonify({
+        'ids': {str(i): by_id[i] for i in ids if i in by_id},
+        'teryt_codes': {t: by_teryt[t] for t in teryt_codes if t in by_teryt},
+        'missing': {
+            'ids': [i for i in ids if i not in by_id],
+            'teryt_codes': [t for t in teryt_codes if t not in by_teryt]
+        }
+    })
+
+@bp.route('/export', methods=['GET'])
+def export_municipalities():
+    """Eksport strumieniowy gmin (NDJSON lub CSV); since= zwraca tylko gminy zmienione od podanej chwili"""
+    try:
+        export_format, fields, since, compress = export_params(MUNICIPALITY_FIELDS)
+    except InvalidExport as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = Municipality.query
+    if request.args.get('voivodeship_code'):
+        query = query.filter(Municipality.voivodeship_code == request.args['voivodeship_code'])
+    if since:
+        query = query.filter(since_filter(Municipality.updated_at, since))
+
+    query = MUNICIPALITY_FIELDS.project(query, fields, required=('id',))
+    return export_response(query, Municipality.id, MUNICIPALITY_FIELDS.serializer, fields,
+                           export_format, 'municipalities', compress)
 
 @bp.route('/search', methods=['GET'])
 def search_municipalities():
@@ -78,54 +280,94 @@ def search_municipalities():
     if not query or len(query) < 2:
         return jsonify({'error': 'Zapytanie musi zawierać co najmniej 2 znaki'}), 400
     
-    results = Municipality.search(query, limit)
-    return jsonify([m.to_dict() for m in results])
+    try:
+        fields = MUNICIPALITY_FIELDS.parse(request.args.get('fields'))
+    except InvalidFields as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Wyniki pochodzą z indeksu w pamięci - bez zapytania do bazy
+    results = get_search_index().search(query, limit)
+    if fields:
+        results = [{f: item[f] for f in fields} for item in results]
+    return fast_jsonify(results)
 
 @bp.route('/voivodeships', methods=['GET'])
 def get_voivodeships():
     """Pobieranie listy wszystkich województw"""
-    voivodeships = Municipality.query.with_entities(
-        Municipality.voivodeship_code, 
-        Municipality.voivodeship_name
-    ).distinct().order_by(Municipality.voivodeship_name).all()
-    
-    return jsonify([
-        {'code': v[0], 'name': v[1]} 
-        for v in voivodeships
-    ])
+    return jsonify(get_hierarchy().voivodeships)
 
 @bp.route('/counties', methods=['GET'])
 def get_counties():
     """Pobieranie listy wszystkich powiatów"""
     voivodeship_code = request.args.get('voivodeship_code')
-    
-    query = Municipality.query.with_entities(
-        Municipality.county_code, 
-        Municipality.county_name,
-        Municipality.voivodeship_code,
-        Municipality.voivodeship_name
-    ).distinct()
-    
-    if voivodeship_code:
-        query = query.filter(Municipality.voivodeship_code == voivodeship_code)
-    
-    counties = query.order_by(Municipality.county_name).all()
-    
-    return jsonify([
-        {
-            'code': c[0], 
-            'name': c[1],
-            'voivodeship_code': c[2],
-            'voivodeship_name': c[3]
-        } 
-        for c in counties if c[1]  # Filtruje puste nazwy powiatów
-    ])
+    return jsonify(get_hierarchy().get_counties(voivodeship_code))
 
 @bp.route('/types', methods=['GET'])
 def get_municipality_types():
     """Pobieranie listy wszystkich typów gmin"""
-    types = Municipality.query.with_entities(
-        Municipality.type
-    ).distinct().order_by(Municipality.type).all()
+    return jsonify(get_hierarchy().types)
+
+@bp.route('/tree', methods=['GET'])
+def get_municipality_tree():
+    """Pobieranie pełnej hierarchii: województwa, powiaty i gminy wraz z licznikami"""
+    return jsonify(get_hierarchy().to_dict())
+
+def _coordinate_args(*names):
+    """Pobiera współrzędne z parametrów zapytania (None, jeśli brakuje lub są niepoprawne)"""
+    values = [request.args.get(name, type=float) for name in names]
+    if any(v is None for v in values):
+        return None
+    return values
+
+def _with_distances(pairs):
+    """Łączy wyniki indeksu przestrzennego z danymi gmin z pamięci"""
+    municipalities = get_search_index().by_id
+    return [
+        {**municipalities[id], 'distance_km': round(distance, 3)}
+        for id, distance in pairs if id in municipalities
+    ]
+
+@bp.route('/nearest', methods=['GET'])
+def get_nearest_municipalities():
+    """Pobieranie k najbliższych gmin od punktu"""
+    coordinates = _coordinate_args('lat', 'lng')
+    if coordinates is None:
+        return jsonify({'error': 'Wymagane parametry: lat, lng'}), 400
+    
+    k = max(1, min(request.args.get('k', 10, type=int), MAX_NEAREST))
+    lat, lng = coordinates
+    return jsonify(_with_distances(get_spatial_index().nearest(lat, lng, k)))
+
+@bp.route('/radius', methods=['GET'])
+def get_municipalities_in_radius():
+    """Pobieranie gmin w promieniu od punktu (od najbliższych)"""
+    coordinates = _coordinate_args('lat', 'lng', 'radius_km')
+    if coordinates is None:
+        return jsonify({'error': 'Wymagane parametry: lat, lng, radius_km'}), 400
+    
+    lat, lng, radius_km = coordinates
+    if radius_km <= 0 or radius_km > MAX_RADIUS_KM:
+        return jsonify({'error': f'Promień musi mieścić się w zakresie (0, {MAX_RADIUS_KM}] km'}), 400
+    
+    limit = max(1, min(request.args.get('limit', 100, type=int), MAX_SPATIAL_RESULTS))
+    return jsonify(_with_distances(get_spatial_index().radius(lat, lng, radius_km, limit)))
+
+@bp.route('/bbox', methods=['GET'])
+def get_municipalities_in_bbox():
+    """Pobieranie gmin w prostokącie (widok mapy)"""
+    coordinates = _coordinate_args('min_lat', 'min_lng', 'max_lat', 'max_lng')
+    if coordinates is None:
+        return jsonify({'error': 'Wymagane parametry: min_lat, min_lng, max_lat, max_lng'}), 400
+    
+    min_lat, min_lng, max_lat, max_lng = coordinates
+    if min_lat > max_lat or min_lng > max_lng:
+        return jsonify({'error': 'Niepoprawny prostokąt: wartości minimalne większe od maksymalnych'}), 400
+    
+    limit = max(1, min(request.args.get('limit', MAX_SPATIAL_RESULTS, type=int), MAX_SPATIAL_RESULTS))
+    ids = get_spatial_index().bbox(min_lat, min_lng, max_lat, max_lng, limit + 1)
     
-    return jsonify([t[0] for t in types])
\ No newline at end of file
+    municipalities = get_search_index().by_id
+    return jsonify({
+        'items': [municipalities[id] for id in ids[:limit] if id in municipalities],
+        'truncated': len(ids) > limit
+    })
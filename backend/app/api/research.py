@@ -1,15 +1,186 @@
-from flask import Blueprint, jsonify, request, current_app, send_file
-from app.models.research import Research, ResearchReport
+from flask import Blueprint, jsonify, request, current_app, send_file, Response
+from app.models.research import Research, ResearchReport, ResearchDispatch, ResearchCampaign
 from app.models.municipality import Municipality
 from app.extensions import db
-from datetime import datetime
+from app.services.pagination import KeysetKey, InvalidCursor, keyset_paginate
+from app.services.progress_events import progress_broker, format_sse, TERMINAL_STATUSES, SSE_HEARTBEAT_INTERVAL
+from app.services.dispatcher import ensure_dispatcher, notify_dispatcher, enqueue_dispatch, dispatch_mode
+from app.services.http_cache import response_cache, conditional_json, make_etag
+from app.services.report_store import report_store, UploadOffsetMismatch, CHUNK_SIZE
+from app.services.serialization import FieldSet, InvalidFields, fast_jsonify
+from app.services.municipality_search import lookup_municipalities
+from app.services.import_generation import current_generation
+from app.services.sqlite_profile import install_sqlite_profile
+from app.services.profiling import install_profiling, phase
+from app.services.metrics import install_metrics_endpoint
+from app.services.admission import AdmissionRejected, admission_transaction, admit_interactive, admit_bulk, admission_status, observe_status_change
+from app.services.analytics import research_analytics, step_latency_stats, InvalidAnalyticsQuery
+from app.services.progress_history import record_progress, progress_timeline, DEFAULT_TIMELINE_POINTS, MAX_TIMELINE_POINTS
+from app.services.export import InvalidExport, export_params, export_response, since_filter
+from app.services.sql_time import parse_utc
+from app.services.research_reuse import params_hash, reuse_lock, find_in_flight, find_reusable
+from app.services.campaigns import (
+    IN_FLIGHT_STATUSES, MAX_CAMPAIGN_SIZE, expand_selection, create_campaign_research,
+    campaign_progress, release_scheduled_research
+)
+from sqlalchemy import select, update, func, or_
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import io
 import os
-import json
+import time
 import uuid
-import requests
 
 bp = Blueprint('research', __name__, url_prefix='/api/research')
 
+# Maksymalna liczba aktualizacji w jednym żądaniu zbiorczym
+MAX_STATUS_BATCH_SIZE = 1000
+
+# Statusy, które można nadać badaniu w aktualizacji statusu
+RESEARCH_STATUSES = ('scheduled',) + IN_FLIGHT_STATUSES + TERMINAL_STATUSES
+
+# Parametry dzierżaw zadań pobieranych przez document_processor
+DEFAULT_LEASE_SECONDS = 300
+MAX_LEASE_SECONDS = 3600
+MAX_CLAIM_LIMIT = 100
+
+# Pola dostępne w parametrze fields= (projekcja na poziomie SQL)
+RESEARCH_FIELDS = FieldSet(Research, [
+    'id', 'task_id', 'title', 'status', 'progress', 'current_step', 'error_message',
+    'region_name', 'region_id', 'breadth', 'depth', 'config', 'municipality_id',
+    'start_time', 'end_time', 'created_at', 'updated_at'
+], expressions={
+    # Czas trwania liczony w SQL (hybrydowa właściwość modelu)
+    'duration': Research.duration
+})
+
+# Metadane raportów w eksporcie zbiorczym (bez treści)
+REPORT_FIELDS = FieldSet(ResearchReport, [
+    'id', 'research_id', 'type', 'title', 'file_path', 'content_hash', 'content_encoding',
+    'content_size', 'stored_size', 'upload_status', 'created_at', 'updated_at'
+], expressions={
+    'task_id': select(Research.task_id).where(Research.id == ResearchReport.research_id).scalar_subquery()
+})
+
+# Domyślny zakres statystyk zbiorczych (w dniach)
+ANALYTICS_DEFAULT_DAYS = 30
+
+# Typ MIME pobieranych raportów markdown
+REPORT_MIMETYPE = 'text/markdown; charset=utf-8'
+
+@bp.record_once
+def _install_sqlite_profile(state):
+    """Ustawienia wydajnościowe (WAL, PRAGMA) dla każdego nowego połączenia SQLite"""
+    install_sqlite_profile()
+
+@bp.record_once
+def _install_profiling(state):
+    """Opcjonalne profilowanie żądań i endpoint /metrics (PROFILING=1)"""
+    install_profiling(state.app)
+
+@bp.record_once
+def _install_metrics(state):
+    """Endpoint /metrics z metrykami kolejki badań (niezależnie od profilowania)"""
+    install_metrics_endpoint(state.app)
+
+@bp.record_once
+def _install_progress_polling(state):
+    """Zmiany postępu zapisane przez inne procesy trafiają do strumieni SSE tego procesu"""
+    flask_app = state.app
+    
+    def load_states(task_ids, include_active):
+        with flask_app.app_context():
+            return _load_progress_states(task_ids, include_active)
+    
+    progress_broker.configure_polling(load_states)
+
+def _load_progress_states(task_ids, include_active):
+    """Stan postępu obserwowanych badań (i badań w toku) - jedno zapytanie po indeksach"""
+    conditions = []
+    if task_ids:
+        conditions.append(Research.task_id.in_(task_ids))
+    if include_active:
+        conditions.append(Research.status.in_(('scheduled',) + IN_FLIGHT_STATUSES))
+    if not conditions:
+        return []
+    return [r.to_progress_dict() for r in Research.query.filter(or_(*conditions)).all()]
+
+@bp.before_app_request
+def _start_dispatcher():
+    """Uruchamia dyspozytor zleceń przy pierwszym żądaniu w procesie"""
+    ensure_dispatcher(current_app._get_current_object(), tick_hooks=[_release_campaign_research])
+
+def _release_campaign_research():
+    """Cykl harmonogramu - zwalnia zaplanowane badania (interaktywne i kampanii) w ramach limitów"""
+    with admission_transaction():
+        released = release_scheduled_research()
+    for research in released:
+        _publish_progress(research)
+
+def _clear_lease(research):
+    """Usuwa informacje o dzierżawie zadania"""
+    research.lease_owner = None
+    research.lease_token = None
+    research.lease_expires_at = None
+
+def _holds_lease(research, token):
+    """Czy aktualizacja może zmienić badanie - wymagany token bieżącej dzierżawy (tryb pull)
+
+    Po wygaśnięciu dzierżawy zadanie mogło zostać przekazane innemu procesowi - spóźniona
+    aktualizacja poprzedniego procesu nie może nadpisać jego wyników.
+    """
+    if token is None and research.lease_token is None:
+        return True
+    if token != research.lease_token:
+        return False
+    # Warunkowy UPDATE blokuje wiersz do końca transakcji - równoległe /claim nie przejmie
+    # zadania między sprawdzeniem tokenu a zapisem aktualizacji
+    return db.session.execute(
+        update(Research)
+        .where(Research.id == research.id, Research.lease_token == token)
+        .values(lease_token=token)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+def _publish_progress(research):
+    """Rozgłasza stan postępu badania do subskrybentów strumieni SSE i unieważnia cache odpowiedzi"""
+    response_cache.invalidate(('research', research.task_id))
+    progress_broker.publish(research.task_id, research.to_progress_dict())
+    
+    # Zakończone badanie zwalnia miejsce - budzimy harmonogram
+    if research.status in TERMINAL_STATUSES:
+        notify_dispatcher()
+
+def _sse_response(subscription, snapshots, close_on_terminal=False):
+    """Tworzy odpowiedź strumieniową SSE dla subskrypcji"""
+    def stream():
+        try:
+            for state in snapshots:
+                yield format_sse('snapshot', state)
+                if close_on_terminal and state.get('status') in TERMINAL_STATUSES:
+                    yield format_sse('end', {'task_id': state['task_id']})
+                    return
+            
+            while not subscription.closed:
+                events = subscription.wait(SSE_HEARTBEAT_INTERVAL)
+                if not events:
+                    # Komentarz SSE podtrzymuje połączenie przez proxy
+                    yield ': keep-alive\n\n'
+                    continue
+                
+                for task_id, delta in events:
+                    yield format_sse('progress', delta)
+                    if close_on_terminal and delta.get('status') in TERMINAL_STATUSES:
+                        yield format_sse('end', {'task_id': task_id})
+                        return
+        finally:
+            progress_broker.unsubscribe(subscription)
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @bp.route('/', methods=['GET'])
 def get_all_research():
     """Pobieranie listy wszystkich badań z możliwością filtrowania"""
@@ -33,32 +204,224 @@ def get_all_research():
     if municipality_id:
         query = query.filter(Research.municipality_id == municipality_id)
     
+    # Wybrane pola (np. fields=task_id,status,progress) - pobierane bez budowania obiektów ORM
+    try:
+        fields = RESEARCH_FIELDS.parse(request.args.get('fields'))
+    except InvalidFields as e:
+        return jsonify({'error': str(e)}), 400
+    # Dołączanie danych gminy do każdego badania (embed=municipality) - bez osobnych zapytań klienta
+    embed_municipality = _embeds_municipality()
+    if fields:
+        required = ('created_at', 'id', 'municipality_id') if embed_municipality else ('created_at', 'id')
+        query = RESEARCH_FIELDS.project(query, fields, required=required)
+    
+    # Paginacja kursorowa (keyset) - włączana parametrem "cursor" (pusty dla pierwszej strony)
+    if 'cursor' in request.args:
+        keys = [
+            KeysetKey(Research.created_at, 'created_at'),
+            KeysetKey(Research.id, 'id')
+        ]
+        try:
+            page_data = keyset_paginate(
+                query, keys,
+                descending=True,
+                cursor=request.args.get('cursor'),
+                per_page=per_page,
+                signature='research:created_at:desc',
+                count=request.args.get('count')
+            )
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        
+        page_data['items'] = _serialize_research(page_data['items'], fields, embed_municipality)
+        return fast_jsonify(page_data)
+    
     # Sortowanie - od najnowszych
-    query = query.order_by(Research.created_at.desc())
+    query = query.order_by(Research.created_at.desc(), Research.id.desc())
     
     # Paginacja
     paginated = query.paginate(page=page, per_page=per_page, error_out=False)
     
     # Przygotowanie odpowiedzi
     response = {
-        'items': [r.to_dict() for r in paginated.items],
+        'items': _serialize_research(paginated.items, fields, embed_municipality),
         'total': paginated.total,
         'pages': paginated.pages,
         'page': page,
         'per_page': per_page
     }
     
-    return jsonify(response)
+    return fast_jsonify(response)
+
+def _embeds_municipality():
+    return 'municipality' in request.args.get('embed', '').split(',')
+
+def _serialize_research(items, fields, embed_municipality=False):
+    """Serializuje obiekty badań lub wiersze projekcji pól"""
+    with phase('serialize'):
+        if fields:
+            serialized = RESEARCH_FIELDS.serialize_rows(items, fields)
+        else:
+            serialized = [r.to_dict() for r in items]
+    
+    if embed_municipality:
+        # Wszystkie gminy strony pobierane jednym wyszukaniem
+        by_id, _ = lookup_municipalities({r.municipality_id for r in items if r.municipality_id})
+        for item, data in zip(items, serialized):
+            data['municipality'] = by_id.get(item.municipality_id)
+    return serialized
 
 @bp.route('/<task_id>', methods=['GET'])
 def get_research(task_id):
     """Pobieranie szczegółów badania na podstawie ID zadania"""
+    # Wersję zasobu ustalamy bez pełnego odczytu wiersza (updated_at ma rozdzielczość sekund)
+    version = Research.query.with_entities(
+        Research.updated_at, Research.status, Research.progress, Research.current_step,
+        Research.error_message, Research.start_time, Research.end_time
+    ).filter_by(task_id=task_id).first_or_404()
+    
+    if version.start_time is not None and version.end_time is None:
+        # Trwające badanie - duration rośnie z każdą sekundą, odpowiedzi nie cache'ujemy
+        research = Research.query.filter_by(task_id=task_id).first()
+        response = fast_jsonify(_serialize_research([research], None, _embeds_municipality())[0])
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    
+    if _embeds_municipality():
+        # Dane gminy zmieniają się tylko przy imporcie TERYT
+        return conditional_json(
+            ('research', task_id, 'municipality'),
+            make_etag('research', task_id, *version, current_generation()), version[0],
+            lambda: _serialize_research(
+                [Research.query.filter_by(task_id=task_id).first()], None, embed_municipality=True
+            )[0]
+        )
+    
+    return conditional_json(
+        ('research', task_id), make_etag('research', task_id, *version), version[0],
+        lambda: Research.query.filter_by(task_id=task_id).first().to_dict()
+    )
+
+@bp.route('/analytics', methods=['GET'])
+def get_research_analytics():
+    """Statystyki zbiorcze badań: statusy, czasy trwania, odsetek błędów według województw, przepustowość"""
+    try:
+        until = parse_utc(request.args['until']) if request.args.get('until') else datetime.utcnow()
+        since = (parse_utc(request.args['since']) if request.args.get('since')
+                 else until - timedelta(days=ANALYTICS_DEFAULT_DAYS))
+    except ValueError:
+        return jsonify({'error': 'Niepoprawny format daty (oczekiwano ISO 8601)'}), 400
+    
+    try:
+        analytics = research_analytics(since, until, request.args.get('bucket', 'day'))
+    except InvalidAnalyticsQuery as e:
+        return jsonify({'error': str(e)}), 400
+    return fast_jsonify(analytics)
+
+@bp.route('/analytics/steps', methods=['GET'])
+def get_research_step_analytics():
+    """Czasy kroków badań (z historii postępu): percentyle i udział w łącznym czasie"""
+    try:
+        until = parse_utc(request.args['until']) if request.args.get('until') else datetime.utcnow()
+        since = (parse_utc(request.args['since']) if request.args.get('since')
+                 else until - timedelta(days=ANALYTICS_DEFAULT_DAYS))
+    except ValueError:
+        return jsonify({'error': 'Niepoprawny format daty (oczekiwano ISO 8601)'}), 400
+    
+    campaign_id = request.args.get('campaign_id', type=int)
+    try:
+        stats = step_latency_stats(since, until, request.args.get('status'), campaign_id)
+    except InvalidAnalyticsQuery as e:
+        return jsonify({'error': str(e)}), 400
+    return fast_jsonify({'since': since.isoformat(), 'until': until.isoformat(), **stats})
+
+@bp.route('/export', methods=['GET'])
+def export_research():
+    """Eksport strumieniowy badań (NDJSON lub CSV); since= zwraca tylko rekordy zmienione od podanej chwili"""
+    try:
+        export_format, fields, since, compress = export_params(RESEARCH_FIELDS)
+    except InvalidExport as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = Research.query
+    if request.args.get('status'):
+        query = query.filter(Research.status == request.args['status'])
+    if request.args.get('municipality_id'):
+        query = query.filter(Research.municipality_id == request.args['municipality_id'])
+    if since:
+        query = query.filter(since_filter(Research.updated_at, since))
+    
+    query = RESEARCH_FIELDS.project(query, fields, required=('id',))
+    return export_response(query, Research.id, RESEARCH_FIELDS.serializer, fields,
+                           export_format, 'research', compress)
+
+@bp.route('/reports/export', methods=['GET'])
+def export_research_reports():
+    """Eksport strumieniowy metadanych raportów (bez treści)"""
+    try:
+        export_format, fields, since, compress = export_params(REPORT_FIELDS)
+    except InvalidExport as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = ResearchReport.query
+    if request.args.get('type'):
+        query = query.filter(ResearchReport.type == request.args['type'])
+    if since:
+        query = query.filter(since_filter(ResearchReport.updated_at, since))
+    
+    query = REPORT_FIELDS.project(query, fields, required=('id',))
+    return export_response(query, ResearchReport.id, REPORT_FIELDS.serializer, fields,
+                           export_format, 'research_reports', compress)
+
+@bp.route('/<task_id>/timeline', methods=['GET'])
+def get_research_timeline(task_id):
+    """Historia postępu badania: przerzedzona oś czasu i czas spędzony w krokach"""
     research = Research.query.filter_by(task_id=task_id).first_or_404()
-    return jsonify(research.to_dict())
+    points = max(2, min(request.args.get('points', DEFAULT_TIMELINE_POINTS, type=int), MAX_TIMELINE_POINTS))
+    
+    timeline = progress_timeline(research, points)
+    return fast_jsonify({'task_id': task_id, 'status': research.status, **timeline})
+
+@bp.route('/<task_id>/events', methods=['GET'])
+def stream_research_events(task_id):
+    """Strumień SSE ze zmianami postępu jednego badania"""
+    # Subskrybujemy przed odczytem stanu, aby nie zgubić zmian w międzyczasie
+    subscription = progress_broker.subscribe([task_id])
+    read_at = time.monotonic()
+    research = Research.query.filter_by(task_id=task_id).first()
+    if research is None:
+        progress_broker.unsubscribe(subscription)
+        return jsonify({'error': 'Nie znaleziono badania'}), 404
+    
+    snapshot = research.to_progress_dict()
+    progress_broker.remember(task_id, snapshot, read_at)
+    return _sse_response(subscription, [snapshot], close_on_terminal=True)
+
+@bp.route('/events', methods=['GET'])
+def stream_research_list_events():
+    """Zbiorczy strumień SSE dla wielu badań (parametr task_ids) lub wszystkich"""
+    task_ids = [t for t in request.args.get('task_ids', '').split(',') if t]
+    subscription = progress_broker.subscribe(task_ids or None)
+    
+    snapshots = []
+    if task_ids:
+        read_at = time.monotonic()
+        researches = Research.query.filter(Research.task_id.in_(task_ids)).all()
+        snapshots = [r.to_progress_dict() for r in researches]
+        for snapshot in snapshots:
+            progress_broker.remember(snapshot['task_id'], snapshot, read_at)
+    
+    return _sse_response(subscription, snapshots)
 
 @bp.route('/', methods=['POST'])
 def create_research():
-    """Tworzenie nowego badania"""
+    """Tworzenie nowego badania
+
+    Identyczne badanie w toku (te same region_id, breadth, depth, config) jest zwracane zamiast
+    nowego (200, reused: in_flight). Wynik zakończonego badania z okna RESEARCH_REUSE_WINDOW
+    jest zwracany tylko na żądanie (reuse: true). Badanie z własnym task_id nigdy nie jest
+    zastępowane innym - identyczne badanie w toku kończy się 409 z jego task_id.
+    """
     data = request.json
     
     # Sprawdzanie wymaganych pól
@@ -68,6 +431,7 @@ def create_research():
             return jsonify({'error': f'Brak wymaganego pola: {field}'}), 400
     
     # Tworzenie identyfikatora zadania
+    explicit_task_id = 'task_id' in data
     task_id = data.get('task_id', f"region_{data['region_id']}_{uuid.uuid4().hex[:8]}")
     
     # Pobieranie gminy, jeśli zdefiniowano
@@ -77,69 +441,109 @@ def create_research():
         if not municipality:
             return jsonify({'error': f'Nie znaleziono gminy o ID: {data["municipality_id"]}'}), 404
     
-    # Tworzenie nowego badania
-    research = Research(
-        task_id=task_id,
-        title=data.get('title', f"Badanie regionu: {data['region_name']}"),
-        status='queued',
-        progress=0,
-        region_name=data['region_name'],
-        region_id=data['region_id'],
-        breadth=data.get('breadth', 4),
-        depth=data.get('depth', 2),
-        config=data.get('config', {}),
-        municipality_id=data.get('municipality_id')
-    )
-    
-    # Zapisywanie do bazy danych
-    db.session.add(research)
-    db.session.commit()
-    
-    # Zlecanie zadania do document_processor
+    breadth = data.get('breadth', 4)
+    depth = data.get('depth', 2)
+    config = data.get('config', {})
     try:
-        # Adres document_processor definiowany w zmiennych środowiskowych
-        processor_url = os.environ.get('DOCUMENT_PROCESSOR_URL', 'http://document_processor:5000')
-        response = requests.post(
-            f"{processor_url}/api/deep_research/start",
-            json={
-                'task_id': task_id,
-                'region_name': data['region_name'],
-                'region_id': data['region_id'],
-                'options': {
-                    'breadth': research.breadth,
-                    'depth': research.depth,
-                    'config': research.config
-                }
-            },
-            timeout=5
-        )
+        digest = params_hash(data['region_id'], breadth, depth, config)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Pola breadth i depth muszą być liczbami całkowitymi'}), 400
+    
+    with reuse_lock(digest):
+        # Wynik zakończonego badania o tych samych parametrach - tylko na żądanie (reuse: true)
+        if data.get('reuse') is True and not explicit_task_id:
+            reusable = find_reusable(digest)
+            if reusable is not None:
+                return jsonify({**reusable.to_dict(), 'reused': 'completed'}), 200
         
-        if response.status_code == 200:
-            # Aktualizacja statusu na "running"
-            research.status = 'running'
-            research.start_time = datetime.utcnow()
-            db.session.commit()
-        else:
-            current_app.logger.error(f"Błąd podczas zlecania zadania: {response.text}")
-            research.status = 'failed'
-            research.error_message = f"Błąd podczas zlecania zadania: {response.text}"
-            db.session.commit()
+        # Identyczne badanie w toku - dołączamy do niego zamiast uruchamiać drugie
+        in_flight = find_in_flight(digest)
+        if in_flight is not None:
+            return _in_flight_response(in_flight, explicit_task_id)
+        
+        # Kontrola przyjmowania: wolne miejsce - od razu do document_processor, w przeciwnym razie
+        # badanie czeka w kolejce backendu (przed badaniami kampanii) lub zgłoszenie dostaje 429.
+        # Zliczenie i zapis w jednej transakcji - równoległe zgłoszenia nie przekroczą limitu
+        with admission_transaction():
+            try:
+                status = admit_interactive()
+            except AdmissionRejected as e:
+                return _admission_rejected(e)
             
-    except Exception as e:
-        current_app.logger.error(f"Wyjątek podczas zlecania zadania: {str(e)}")
-        research.status = 'failed'
-        research.error_message = f"Wyjątek podczas zlecania zadania: {str(e)}"
-        db.session.commit()
-        return jsonify({'error': str(e)}), 500
+            # Tworzenie nowego badania
+            research = Research(
+                task_id=task_id,
+                title=data.get('title', f"Badanie regionu: {data['region_name']}"),
+                status=status,
+                progress=0,
+                region_name=data['region_name'],
+                region_id=data['region_id'],
+                breadth=breadth,
+                depth=depth,
+                config=config,
+                params_hash=digest,
+                in_flight_key=digest,
+                municipality_id=data.get('municipality_id')
+            )
+            
+            # Zapisywanie do bazy danych razem ze zleceniem w kolejce wychodzącej (outbox)
+            db.session.add(research)
+            if status == 'queued' and dispatch_mode() == 'push':
+                enqueue_dispatch(task_id, 'start', research.start_payload())
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Identyczne badanie utworzył równolegle inny proces
+                db.session.rollback()
+                in_flight = find_in_flight(digest)
+                if in_flight is not None and in_flight.task_id != task_id:
+                    return _in_flight_response(in_flight, explicit_task_id)
+                return jsonify({'error': f'Zadanie o ID {task_id} już istnieje'}), 409
     
-    return jsonify(research.to_dict()), 201
+    # Zlecenie wyśle dyspozytor w tle - nie blokujemy wątku obsługi żądania
+    notify_dispatcher()
+    _publish_progress(research)
+    return jsonify(research.to_dict()), 202
 
-@bp.route('/<task_id>/status', methods=['PUT'])
-def update_research_status(task_id):
-    """Aktualizowanie statusu badania"""
-    research = Research.query.filter_by(task_id=task_id).first_or_404()
-    data = request.json
-    
+def _in_flight_response(in_flight, explicit_task_id):
+    """Odpowiedź dla zgłoszenia identycznego z badaniem w toku"""
+    if explicit_task_id:
+        # Własny task_id wywołującego nie może wskazywać na inne badanie
+        return jsonify({
+            'error': 'Identyczne badanie jest już w toku',
+            'task_id': in_flight.task_id
+        }), 409
+    return jsonify({**in_flight.to_dict(), 'reused': 'in_flight'}), 200
+
+def _admission_rejected(error):
+    """Odpowiedź 429 z nagłówkiem Retry-After dla odrzuconego zgłoszenia"""
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+@bp.route('/admission', methods=['GET'])
+def get_admission_status():
+    """Stan kolejki badań: limity, liczba oczekujących i trwających badań, szacowany czas oczekiwania"""
+    return jsonify(admission_status())
+
+def _status_update_error(data):
+    """Sprawdza typy i wartości pól aktualizacji statusu - zwraca opis błędu lub None"""
+    if not isinstance(data, dict):
+        return 'Aktualizacja musi być obiektem JSON'
+    if 'status' in data and data['status'] not in RESEARCH_STATUSES:
+        return f"Nieznany status: {data['status']}"
+    if 'progress' in data:
+        progress = data['progress']
+        if not isinstance(progress, int) or isinstance(progress, bool) or not 0 <= progress <= 100:
+            return 'Pole progress musi być liczbą całkowitą z zakresu 0-100'
+    for field in ('current_step', 'error_message', 'report', 'lease_token'):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f'Pole {field} musi być tekstem'
+    return None
+
+def _apply_status_update(research, data):
+    """Nanosi aktualizację statusu na obiekt badania (bez zatwierdzania transakcji)"""
     # Aktualizacja pól statusu
     if 'status' in data:
         research.status = data['status']
@@ -147,6 +551,10 @@ def update_research_status(task_id):
         # Jeśli status zmienił się na "completed" lub "failed", ustawiamy czas zakończenia
         if data['status'] in ['completed', 'failed']:
             research.end_time = datetime.utcnow()
+        
+        # Zakończone zadanie zwalnia dzierżawę
+        if data['status'] in TERMINAL_STATUSES:
+            _clear_lease(research)
     
     if 'progress' in data:
         research.progress = data['progress']
@@ -157,75 +565,484 @@ def update_research_status(task_id):
     if 'error_message' in data:
         research.error_message = data['error_message']
     
-    # Zapisywanie raportu, jeśli jest dostępny
+    # Zmiana postępu, kroku lub statusu trafia do historii postępu
+    if 'status' in data or 'progress' in data or 'current_step' in data:
+        record_progress(research)
+    
+    # Zapisywanie raportu, jeśli jest dostępny (treść trafia do magazynu raportów)
     if 'report' in data and data['report']:
         report = ResearchReport(
             research_id=research.id,
             type='markdown',
-            title=f"Raport z badania regionu: {research.region_name}",
-            content=data['report']
+            title=f"Raport z badania regionu: {research.region_name}"
         )
+        report.store_content(data['report'])
         db.session.add(report)
+
+@bp.route('/<task_id>/status', methods=['PUT'])
+def update_research_status(task_id):
+    """Aktualizowanie statusu badania"""
+    research = Research.query.filter_by(task_id=task_id).first_or_404()
+    data = request.json
+    
+    error = _status_update_error(data)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    if not _holds_lease(research, data.get('lease_token')):
+        db.session.rollback()
+        return jsonify({'error': 'Dzierżawa wygasła lub należy do innego procesu'}), 409
+    
+    _apply_status_update(research, data)
     
     db.session.commit()
+    _publish_progress(research)
     return jsonify(research.to_dict())
 
+@bp.route('/status/batch', methods=['POST'])
+def update_research_status_batch():
+    """Zbiorcza aktualizacja statusów wielu badań w jednej transakcji"""
+    data = request.json or {}
+    updates = data.get('updates')
+    
+    if not isinstance(updates, list):
+        return jsonify({'error': 'Brak wymaganego pola: updates'}), 400
+    if len(updates) > MAX_STATUS_BATCH_SIZE:
+        return jsonify({'error': f'Maksymalna liczba aktualizacji w paczce: {MAX_STATUS_BATCH_SIZE}'}), 400
+    
+    # Łączenie aktualizacji tego samego zadania - późniejsze wartości zastępują wcześniejsze
+    results = [None] * len(updates)
+    merged = {}
+    last_index = {}
+    for index, update in enumerate(updates):
+        if not isinstance(update, dict) or not update.get('task_id') or not isinstance(update['task_id'], str):
+            results[index] = {'index': index, 'task_id': None, 'result': 'invalid'}
+            continue
+        
+        task_id = update['task_id']
+        if task_id in last_index:
+            results[last_index[task_id]] = {'index': last_index[task_id], 'task_id': task_id, 'result': 'coalesced'}
+        fields = {k: v for k, v in update.items() if k != 'task_id'}
+        if not fields.get('report'):
+            fields.pop('report', None)
+        merged.setdefault(task_id, {}).update(fields)
+        last_index[task_id] = index
+    
+    # Niepoprawne aktualizacje (po połączeniu) nie trafiają do transakcji - nie psują reszty paczki
+    for task_id, fields in list(merged.items()):
+        error = _status_update_error(fields)
+        if error:
+            index = last_index[task_id]
+            results[index] = {'index': index, 'task_id': task_id, 'result': 'invalid', 'error': error}
+            del merged[task_id]
+    
+    # Jedno zapytanie po wszystkie badania z paczki
+    researches = {}
+    if merged:
+        researches = {
+            r.task_id: r
+            for r in Research.query.filter(Research.task_id.in_(list(merged))).all()
+        }
+    
+    applied = []
+    for task_id, fields in merged.items():
+        index = last_index[task_id]
+        research = researches.get(task_id)
+        if research is None:
+            results[index] = {'index': index, 'task_id': task_id, 'result': 'not_found'}
+            continue
+        if not _holds_lease(research, fields.get('lease_token')):
+            results[index] = {'index': index, 'task_id': task_id, 'result': 'lease_lost'}
+            continue
+        _apply_status_update(research, fields)
+        applied.append(research)
+        results[index] = {'index': index, 'task_id': task_id, 'result': 'applied'}
+    
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Błąd podczas zbiorczej aktualizacji statusów: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    for research in applied:
+        _publish_progress(research)
+    
+    summary = {}
+    for item in results:
+        summary[item['result']] = summary.get(item['result'], 0) + 1
+    
+    return jsonify({'results': results, 'summary': summary})
+
 @bp.route('/<task_id>/stop', methods=['POST'])
 def stop_research(task_id):
     """Zatrzymywanie badania"""
     research = Research.query.filter_by(task_id=task_id).first_or_404()
     
-    if research.status not in ['running', 'queued']:
+    if research.status not in ['running', 'queued', 'scheduled']:
         return jsonify({'error': 'Badanie nie jest w trakcie wykonywania'}), 400
     
-    try:
-        # Adres document_processor definiowany w zmiennych środowiskowych
-        processor_url = os.environ.get('DOCUMENT_PROCESSOR_URL', 'http://document_processor:5000')
-        response = requests.post(
-            f"{processor_url}/api/deep_research/stop",
-            json={'task_id': task_id},
-            timeout=5
-        )
-        
-        if response.status_code == 200:
-            # Aktualizacja statusu na "stopped"
-            research.status = 'stopped'
-            research.end_time = datetime.utcnow()
-            db.session.commit()
-            return jsonify(research.to_dict())
-        else:
-            return jsonify({'error': f"Błąd podczas zatrzymywania badania: {response.text}"}), 500
-            
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    # Zadanie jeszcze niewysłane ani niepobrane przez document_processor (lub czekające
+    # w kolejce backendu) zatrzymujemy od razu
+    start_dispatch = ResearchDispatch.query.filter_by(task_id=task_id, action='start').first()
+    if research.status == 'scheduled' or (
+        research.status == 'queued' and (start_dispatch is None or start_dispatch.status == 'pending')
+    ):
+        if start_dispatch is not None:
+            start_dispatch.status = 'cancelled'
+        research.status = 'stopped'
+        research.end_time = datetime.utcnow()
+        db.session.commit()
+        _publish_progress(research)
+        return jsonify(research.to_dict())
+    
+    enqueue_dispatch(task_id, 'stop', {'task_id': task_id})
+    db.session.commit()
+    notify_dispatcher()
+    
+    return jsonify(research.to_dict()), 202
 
 @bp.route('/<task_id>/report', methods=['GET'])
 def get_research_report(task_id):
     """Pobieranie raportu z badania"""
-    research = Research.query.filter_by(task_id=task_id).first_or_404()
+    research = Research.query.with_entities(Research.id).filter_by(task_id=task_id).first_or_404()
     
-    # Pobieranie najnowszego raportu danego typu
+    # Pobieranie wersji najnowszego raportu danego typu (bez treści)
     report_type = request.args.get('type', 'markdown')
-    report = ResearchReport.query.filter_by(
+    version = ResearchReport.query.with_entities(
+        ResearchReport.id, ResearchReport.updated_at, ResearchReport.file_path
+    ).filter_by(
         research_id=research.id,
-        type=report_type
+        type=report_type,
+        upload_status=None
     ).order_by(ResearchReport.created_at.desc()).first()
     
-    if not report:
+    if not version:
         return jsonify({'error': 'Raport nie jest dostępny'}), 404
     
+    report_id, updated_at, file_path = version
+    
     # Jeśli raport to plik, zwracamy go
-    if report.file_path and os.path.exists(report.file_path):
-        return send_file(report.file_path, as_attachment=True)
+    if file_path and os.path.exists(file_path):
+        return send_file(file_path, as_attachment=True)
     
     # W przeciwnym razie zwracamy treść
-    return jsonify({
-        'report': report.content,
-        'title': report.title,
+    def build():
+        report = ResearchReport.query.get(report_id)
+        return {
+            'report': report.read_content(),
+            'title': report.title,
+            'type': report.type,
+            'created_at': report.created_at.isoformat()
+        }
+    
+    return conditional_json(
+        ('research_report', task_id, report_type),
+        make_etag('research_report', report_id, updated_at), updated_at,
+        build
+    )
+
+def _latest_report(task_id, report_type):
+    """Zwraca najnowszy raport danego typu (bez treści inline)"""
+    research = Research.query.with_entities(Research.id).filter_by(task_id=task_id).first_or_404()
+    return ResearchReport.query.filter_by(
+        research_id=research.id,
+        type=report_type,
+        upload_status=None
+    ).order_by(ResearchReport.created_at.desc()).first()
+
+def _accepts_encoding(encoding):
+    """Czy klient akceptuje odpowiedź w danym kodowaniu (Accept-Encoding)"""
+    return request.accept_encodings[encoding] > 0
+
+@bp.route('/<task_id>/report/download', methods=['GET'])
+def download_research_report(task_id):
+    """Strumieniowe pobieranie raportu z obsługą Range i przekazaniem skompresowanej treści"""
+    report_type = request.args.get('type', 'markdown')
+    report = _latest_report(task_id, report_type)
+    if not report:
+        return jsonify({'error': 'Raport nie jest dostępny'}), 404
+    
+    if report.file_path and os.path.exists(report.file_path):
+        return send_file(report.file_path, as_attachment=True, conditional=True)
+    
+    filename = f"{task_id}.md" if report_type == 'markdown' else task_id
+    
+    # Starszy raport zapisany w tabeli
+    if not report.content_hash:
+        content = (report.read_content() or '').encode('utf-8')
+        response = send_file(
+            io.BytesIO(content), mimetype=REPORT_MIMETYPE, as_attachment=True,
+            download_name=filename, conditional=True, etag=f"report-{report.id}"
+        )
+        return response
+    
+    # Klient akceptuje kodowanie magazynu - wysyłamy plik bez dekompresji
+    if _accepts_encoding(report.content_encoding):
+        response = send_file(
+            report_store.path_for(report.content_hash, report.content_encoding),
+            mimetype=REPORT_MIMETYPE, as_attachment=True, download_name=filename,
+            conditional=True, etag=f"{report.content_hash}-{report.content_encoding}"
+        )
+        response.headers['Content-Encoding'] = report.content_encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+    
+    # W przeciwnym razie dekompresujemy strumieniowo (zakresy liczone w treści niezakodowanej)
+    etag = report.content_hash
+    size = report.content_size
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    # If-Range z innym ETag (lub datą) oznacza zmianę zasobu - wysyłamy całość
+    if_range = request.if_range
+    range_valid = (if_range.etag is None and if_range.date is None) or if_range.etag == etag
+    
+    start, stop, status = 0, size, 200
+    if request.range is not None and range_valid:
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            response = current_app.response_class(status=416)
+            response.headers['Content-Range'] = f"bytes */{size}"
+            return response
+        start, stop = byte_range
+        status = 206
+    
+    response = current_app.response_class(
+        report_store.iter_range(report.content_hash, report.content_encoding, start, stop),
+        status=status, mimetype=REPORT_MIMETYPE, direct_passthrough=True
+    )
+    response.content_length = stop - start
+    if status == 206:
+        response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.set_etag(etag)
+    return response
+
+def _upload_dict(report):
+    """Stan raportu przesyłanego w częściach"""
+    return {
+        'upload_id': report.id,
+        'research_id': report.research_id,
         'type': report.type,
-        'created_at': report.created_at.isoformat()
+        'title': report.title,
+        'status': report.upload_status or 'complete',
+        'offset': report.uploaded_size() or 0,
+        'content_hash': report.content_hash
+    }
+
+def _get_upload(task_id, upload_id):
+    research = Research.query.with_entities(Research.id).filter_by(task_id=task_id).first_or_404()
+    return ResearchReport.query.filter_by(id=upload_id, research_id=research.id).first_or_404()
+
+@bp.route('/<task_id>/report/uploads', methods=['POST'])
+def open_report_upload(task_id):
+    """Rozpoczęcie przesyłania raportu w częściach (document_processor)"""
+    research = Research.query.filter_by(task_id=task_id).first_or_404()
+    data = request.get_json(silent=True) or {}
+    
+    report = ResearchReport(
+        research_id=research.id,
+        type=data.get('type', 'markdown'),
+        title=data.get('title') or f"Raport z badania regionu: {research.region_name}",
+        content_size=0,
+        upload_status='open'
+    )
+    db.session.add(report)
+    db.session.commit()
+    
+    return jsonify(_upload_dict(report)), 201
+
+@bp.route('/<task_id>/report/uploads/<int:upload_id>', methods=['GET'])
+def get_report_upload(task_id, upload_id):
+    """Stan przesyłania raportu (bieżące przesunięcie do wznowienia)"""
+    return jsonify(_upload_dict(_get_upload(task_id, upload_id)))
+
+@bp.route('/<task_id>/report/uploads/<int:upload_id>/sections', methods=['POST'])
+def append_report_section(task_id, upload_id):
+    """Dopisanie sekcji raportu - treść w ciele żądania, zapisywana strumieniowo na dysk"""
+    report = _get_upload(task_id, upload_id)
+    if report.upload_status != 'open':
+        return jsonify({'error': 'Przesyłanie raportu zostało już zakończone'}), 409
+    
+    # Upload-Offset: rozmiar raportu, do którego klient dopisuje sekcję. Ponowienie
+    # już zapisanej sekcji kończy się 409 z bieżącym przesunięciem zamiast duplikatu.
+    expected_offset = request.headers.get('Upload-Offset', type=int)
+    if expected_offset is None:
+        expected_offset = request.args.get('offset', type=int)
+    
+    try:
+        size = report.append_section(
+            iter(lambda: request.stream.read(CHUNK_SIZE), b''), expected_offset
+        )
+    except UploadOffsetMismatch as e:
+        return jsonify({
+            'error': 'Nieprawidłowe przesunięcie sekcji raportu',
+            'offset': e.offset
+        }), 409
+    
+    return jsonify({'upload_id': report.id, 'offset': size})
+
+@bp.route('/<task_id>/report/uploads/<int:upload_id>/finalize', methods=['POST'])
+def finalize_report_upload(task_id, upload_id):
+    """Zakończenie przesyłania - raport trafia do magazynu i staje się najnowszą wersją"""
+    report = _get_upload(task_id, upload_id)
+    
+    # Przejęcie zakończenia warunkową aktualizacją - równoległe wywołanie go nie powtórzy
+    claimed = db.session.execute(
+        update(ResearchReport)
+        .where(ResearchReport.id == report.id, ResearchReport.upload_status == 'open')
+        .values(upload_status='finalizing')
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        db.session.refresh(report)
+        if report.upload_status == 'finalizing':
+            return jsonify({'error': 'Przesyłanie raportu jest właśnie kończone'}), 409
+        # Ponowne zakończenie jest idempotentne
+        return jsonify(_upload_dict(report))
+    
+    try:
+        report.finalize_upload()
+        db.session.commit()
+    except Exception as e:
+        # Zwolnienie przejęcia - inaczej każde ponowienie kończyłoby się 409
+        db.session.rollback()
+        db.session.execute(
+            update(ResearchReport)
+            .where(ResearchReport.id == report.id, ResearchReport.upload_status == 'finalizing')
+            .values(upload_status='open')
+        )
+        db.session.commit()
+        current_app.logger.error(f"Błąd podczas kończenia przesyłania raportu {report.id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    report_store.discard_upload(report.id)
+    response_cache.invalidate(('research_report', task_id, report.type))
+    
+    return jsonify(_upload_dict(report))
+
+@bp.route('/<task_id>/report/uploads/<int:upload_id>/content', methods=['GET'])
+def read_report_upload(task_id, upload_id):
+    """Odczyt raportu w trakcie przesyłania (Range pozwala pobierać tylko nowe sekcje)"""
+    report = _get_upload(task_id, upload_id)
+    if report.upload_status != 'open':
+        if not report.content_hash:
+            return jsonify({'error': 'Raport nie jest dostępny'}), 404
+        response = current_app.response_class(
+            report_store.iter_range(report.content_hash, report.content_encoding),
+            mimetype=REPORT_MIMETYPE, direct_passthrough=True
+        )
+        response.content_length = report.content_size
+        response.set_etag(report.content_hash)
+        return response
+    
+    path = report_store.upload_path(report.id)
+    if not os.path.exists(path):
+        return current_app.response_class(b'', mimetype=REPORT_MIMETYPE)
+    
+    response = send_file(path, mimetype=REPORT_MIMETYPE, conditional=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@bp.route('/campaigns', methods=['POST'])
+def create_campaign():
+    """Tworzenie kampanii badań dla gmin z wybranego fragmentu hierarchii"""
+    data = request.get_json(silent=True) or {}
+    
+    selection = {
+        key: data[key]
+        for key in ('voivodeship_code', 'county_code', 'type', 'municipality_ids')
+        if data.get(key)
+    }
+    if not selection:
+        return jsonify({'error': 'Brak wyboru gmin (voivodeship_code, county_code, type lub municipality_ids)'}), 400
+    
+    municipalities = expand_selection(selection)
+    if not municipalities:
+        return jsonify({'error': 'Wybór nie obejmuje żadnej gminy'}), 400
+    if len(municipalities) > MAX_CAMPAIGN_SIZE:
+        return jsonify({'error': f'Kampania może obejmować maksymalnie {MAX_CAMPAIGN_SIZE} gmin'}), 400
+    
+    max_concurrency = data.get('max_concurrency')
+    if max_concurrency is not None and (not isinstance(max_concurrency, int) or max_concurrency < 1):
+        return jsonify({'error': 'Pole max_concurrency musi być dodatnią liczbą całkowitą'}), 400
+    
+    with admission_transaction():
+        try:
+            admit_bulk(len(municipalities))
+        except AdmissionRejected as e:
+            return _admission_rejected(e)
+        
+        campaign = ResearchCampaign(
+            title=data.get('title') or f"Kampania badań: {len(municipalities)} gmin",
+            selection=selection,
+            breadth=data.get('breadth', 4),
+            depth=data.get('depth', 2),
+            config=data.get('config', {}),
+            max_concurrency=max_concurrency,
+            total=len(municipalities)
+        )
+        db.session.add(campaign)
+        db.session.flush()
+        
+        # Wszystkie badania kampanii jednym wstawieniem; uruchamia je harmonogram dyspozytora
+        create_campaign_research(campaign, municipalities)
+        db.session.commit()
+    notify_dispatcher()
+    
+    progress = campaign_progress([campaign.id])
+    return jsonify(campaign.to_dict(progress[campaign.id])), 201
+
+@bp.route('/campaigns', methods=['GET'])
+def get_campaigns():
+    """Pobieranie listy kampanii z postępem"""
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), 100)
+    
+    paginated = ResearchCampaign.query.order_by(
+        ResearchCampaign.created_at.desc(), ResearchCampaign.id.desc()
+    ).paginate(page=page, per_page=per_page, error_out=False)
+    
+    # Postęp wszystkich kampanii strony jednym zapytaniem GROUP BY
+    progress = campaign_progress([c.id for c in paginated.items])
+    
+    return jsonify({
+        'items': [c.to_dict(progress[c.id]) for c in paginated.items],
+        'total': paginated.total,
+        'pages': paginated.pages,
+        'page': page,
+        'per_page': per_page
     })
 
+@bp.route('/campaigns/<int:campaign_id>', methods=['GET'])
+def get_campaign(campaign_id):
+    """Pobieranie szczegółów kampanii z postępem"""
+    campaign = ResearchCampaign.query.get_or_404(campaign_id)
+    progress = campaign_progress([campaign.id])
+    return jsonify(campaign.to_dict(progress[campaign.id]))
+
+@bp.route('/campaigns/<int:campaign_id>/cancel', methods=['POST'])
+def cancel_campaign(campaign_id):
+    """Anulowanie kampanii - badania jeszcze nieuruchomione nie zostaną zlecone"""
+    campaign = ResearchCampaign.query.get_or_404(campaign_id)
+    
+    campaign.status = 'cancelled'
+    cancelled = db.session.execute(
+        update(Research)
+        .where(Research.campaign_id == campaign.id, Research.status == 'scheduled')
+        .values(status='stopped', end_time=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    
+    progress = campaign_progress([campaign.id])
+    return jsonify({'cancelled': cancelled, 'campaign': campaign.to_dict(progress[campaign.id])})
+
 @bp.route('/register', methods=['POST'])
 def register_research_task():
     """Rejestracja zadania badawczego z document_processor"""
@@ -256,13 +1073,125 @@ def register_research_task():
     
     db.session.add(research)
     db.session.commit()
+    _publish_progress(research)
     
     return jsonify(research.to_dict()), 201
 
 @bp.route('/pending', methods=['GET'])
 def get_pending_research():
-    """Pobieranie zadań oczekujących na przetworzenie (dla document_processor)"""
-    # Pobieranie zadań w statusie "queued"
-    pending = Research.query.filter_by(status='queued').order_by(Research.created_at).all()
+    """Pobieranie zadań oczekujących na przetworzenie (dla document_processor, zastąpione przez /claim)"""
+    limit = min(request.args.get('limit', 100, type=int), MAX_CLAIM_LIMIT)
+    
+    # Pobieranie zadań w statusie "queued" (indeks status, created_at)
+    pending = Research.query.filter_by(status='queued').order_by(Research.created_at).limit(limit).all()
+    
+    return jsonify([r.to_dict() for r in pending])
+
+def _bounded_int(data, name, default, maximum):
+    """Liczba całkowita z treści żądania ograniczona do zakresu 1..maximum"""
+    try:
+        value = int(data.get(name, default))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'Pole {name} musi być liczbą całkowitą')
+    return max(1, min(value, maximum))
+
+def _requeue_expired_leases(now):
+    """Zwraca do kolejki zadania z wygasłą dzierżawą"""
+    expired = Research.query.filter(
+        Research.status == 'running',
+        Research.lease_expires_at.isnot(None),
+        Research.lease_expires_at < now
+    ).all()
+    
+    for research in expired:
+        current_app.logger.warning(f"Wygasła dzierżawa zadania {research.task_id} ({research.lease_owner})")
+        research.status = 'queued'
+        _clear_lease(research)
+    return expired
+
+@bp.route('/claim', methods=['POST'])
+def claim_research():
+    """Atomowe pobranie do N zadań z kolejki wraz z dzierżawą (dla document_processor)"""
+    if dispatch_mode() != 'pull':
+        return jsonify({'error': 'Pobieranie zadań jest dostępne tylko w trybie pull'}), 409
+    
+    data = request.json or {}
+    worker_id = data.get('worker_id')
+    if not worker_id:
+        return jsonify({'error': 'Brak wymaganego pola: worker_id'}), 400
+    
+    try:
+        limit = _bounded_int(data, 'limit', 1, MAX_CLAIM_LIMIT)
+        lease_seconds = _bounded_int(data, 'lease_seconds', DEFAULT_LEASE_SECONDS, MAX_LEASE_SECONDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    now = datetime.utcnow()
+    
+    requeued = _requeue_expired_leases(now)
+    
+    # Jedno polecenie UPDATE rezerwuje zadania - dwa procesy nie dostaną tego samego wiersza
+    token = uuid.uuid4().hex
+    # Badania interaktywne (spoza kampanii) przed badaniami kampanii
+    oldest = (
+        select(Research.id)
+        .where(Research.status == 'queued')
+        .order_by(Research.campaign_id.isnot(None), Research.created_at, Research.id)
+        .limit(limit)
+    )
+    db.session.execute(
+        update(Research)
+        .where(Research.id.in_(oldest), Research.status == 'queued')
+        .values(
+            status='running',
+            lease_owner=worker_id,
+            lease_token=token,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            start_time=func.coalesce(Research.start_time, now),
+            updated_at=now
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    
+    claimed = Research.query.filter_by(lease_token=token).order_by(Research.created_at, Research.id).all()
+    for research in claimed:
+        # Zmiana statusu poleceniem UPDATE omija walidator modelu - czas oczekiwania notujemy tutaj
+        if research.start_time == now:
+            observe_status_change(research, 'running', now)
+    for research in requeued + claimed:
+        _publish_progress(research)
+    
+    return jsonify({
+        'lease_token': token,
+        'lease_expires_at': (now + timedelta(seconds=lease_seconds)).isoformat(),
+        'items': [r.to_dict() for r in claimed]
+    })
+
+@bp.route('/<task_id>/lease', methods=['POST'])
+def renew_research_lease(task_id):
+    """Przedłużenie dzierżawy zadania (heartbeat z document_processor)"""
+    data = request.json or {}
+    token = data.get('lease_token')
+    if not token:
+        return jsonify({'error': 'Brak wymaganego pola: lease_token'}), 400
+    
+    try:
+        lease_seconds = _bounded_int(data, 'lease_seconds', DEFAULT_LEASE_SECONDS, MAX_LEASE_SECONDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=lease_seconds)
+    
+    # Przedłużamy tylko ważną dzierżawę - wygasła mogła zostać przekazana innemu procesowi
+    renewed = Research.query.filter(
+        Research.task_id == task_id,
+        Research.status == 'running',
+        Research.lease_token == token,
+        Research.lease_expires_at >= now
+    ).update({'lease_expires_at': expires_at}, synchronize_session=False)
+    db.session.commit()
+    
+    if not renewed:
+        return jsonify({'error': 'Dzierżawa wygasła lub należy do innego procesu'}), 409
     
-    return jsonify([r.to_dict() for r in pending])
\ No newline at end of file
+    return jsonify({'task_id': task_id, 'lease_expires_at': expires_at.isoformat()})
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from app.services.dispatcher import stop_dispatcher, use_event_loop
+from app.services.progress_events import (
+    AsyncSubscription, SSE_HEARTBEAT_INTERVAL, TERMINAL_STATUSES, format_sse, progress_broker
+)
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:  # a2wsgi jest opcjonalny - potrzebny tylko w trybie ASGI
+    WSGIMiddleware = None
+
+logger = logging.getLogger(__name__)
+
+# Wątki obsługujące żądania przekazywane do Flask (WSGI)
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 16))
+# Wątki do krótkich odczytów z bazy wykonywanych przez strumienie SSE
+ASGI_DB_THREADS = int(os.environ.get('ASGI_DB_THREADS', 4))
+# Maksymalna liczba jednocześnie otwartych strumieni SSE w procesie
+MAX_SSE_STREAMS = int(os.environ.get('MAX_SSE_STREAMS', 10000))
+
+# Strumienie SSE obsługiwane bezpośrednio w pętli asyncio (odpowiedniki tras z app/api/research.py)
+LIST_EVENTS_PATH = '/api/research/events'
+TASK_EVENTS_PATH = re.compile(r'^/api/research/(?P<task_id>[^/]+)/events$')
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+]
+
+
+class AsgiApp:
+    """Aplikacja ASGI: strumienie SSE w pętli asyncio, pozostałe żądania przez Flask w puli wątków
+
+    Otwarty strumień zajmuje tylko subskrypcję i połączenie, a nie wątek - jeden proces
+    utrzyma tysiące klientów. Uruchomienie:
+
+        uvicorn --factory app.asgi:create_asgi_app --host 0.0.0.0 --port 5000 --workers 2
+
+    Przy kilku procesach zmiany zapisane przez inny proces docierają do strumieni z bazy
+    co PROGRESS_POLL_INTERVAL sekund (zmiany obsłużone w tym samym procesie - od razu);
+    PROGRESS_POLL_INTERVAL=0 jest bezpieczne tylko przy jednym procesie (--workers 1).
+    """
+
+    def __init__(self, flask_app):
+        if WSGIMiddleware is None:
+            raise RuntimeError('Tryb ASGI wymaga pakietu a2wsgi (pip install a2wsgi uvicorn)')
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)
+        self._db_executor = ThreadPoolExecutor(max_workers=ASGI_DB_THREADS, thread_name_prefix='asgi-db')
+        self._streams = set()
+        self._loop = None
+
+    async def __call__(self, scope, receive, send):
+        if self._loop is None:
+            # Dyspozytor zleceń wysyła wtedy zapytania do document_processor w tej pętli
+            self._loop = asyncio.get_running_loop()
+            use_event_loop(self._loop)
+
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            path = scope['path']
+            if path == LIST_EVENTS_PATH:
+                query = parse_qs(scope['query_string'].decode('latin-1'))
+                task_ids = [t for t in ','.join(query.get('task_ids', [])).split(',') if t]
+                await self._stream(receive, send, task_ids, close_on_terminal=False)
+                return
+            match = TASK_EVENTS_PATH.match(path)
+            if match:
+                await self._stream(receive, send, [match.group('task_id')], close_on_terminal=True)
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for subscription in list(self._streams):
+                    progress_broker.unsubscribe(subscription)
+                progress_broker.stop_polling(1)
+                await self._loop.run_in_executor(None, stop_dispatcher, 10)
+                self._db_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _load_snapshots(self, task_ids):
+        """Bieżący stan postępu badań z bazy (w puli wątków - zapytanie po indeksie task_id)"""
+        from app.models.research import Research
+
+        with self.flask_app.app_context():
+            researches = Research.query.filter(Research.task_id.in_(task_ids)).all()
+            return [r.to_progress_dict() for r in researches]
+
+    async def _stream(self, receive, send, task_ids, close_on_terminal):
+        """Strumień SSE o tej samej treści co _sse_response w app/api/research.py"""
+        if len(self._streams) >= MAX_SSE_STREAMS:
+            await _send_json(send, 503, {'error': 'Zbyt wiele otwartych strumieni zdarzeń'})
+            return
+
+        # Subskrybujemy przed odczytem stanu, aby nie zgubić zmian w międzyczasie
+        subscription = progress_broker.subscribe(task_ids or None, AsyncSubscription(task_ids or None))
+        self._streams.add(subscription)
+        watcher = None
+        try:
+            snapshots = []
+            read_at = time.monotonic()
+            if task_ids:
+                snapshots = await self._loop.run_in_executor(self._db_executor, self._load_snapshots, task_ids)
+            if close_on_terminal and not snapshots:
+                await _send_json(send, 404, {'error': 'Nie znaleziono badania'})
+                return
+            for snapshot in snapshots:
+                progress_broker.remember(snapshot['task_id'], snapshot, read_at)
+
+            await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS})
+            watcher = asyncio.ensure_future(_close_on_disconnect(receive, subscription))
+            async for message in _events(subscription, snapshots, close_on_terminal):
+                await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        except OSError:
+            # Klient rozłączył się w trakcie zapisu
+            pass
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            self._streams.discard(subscription)
+            progress_broker.unsubscribe(subscription)
+
+
+async def _events(subscription, snapshots, close_on_terminal):
+    for state in snapshots:
+        yield format_sse('snapshot', state)
+        if close_on_terminal and state.get('status') in TERMINAL_STATUSES:
+            yield format_sse('end', {'task_id': state['task_id']})
+            return
+
+    while not subscription.closed:
+        events = await subscription.wait_async(SSE_HEARTBEAT_INTERVAL)
+        if not events:
+            if not subscription.closed:
+                # Komentarz SSE podtrzymuje połączenie przez proxy
+                yield ': keep-alive\n\n'
+            continue
+
+        for task_id, delta in events:
+            yield format_sse('progress', delta)
+            if close_on_terminal and delta.get('status') in TERMINAL_STATUSES:
+                yield format_sse('end', {'task_id': task_id})
+                return
+
+
+async def _close_on_disconnect(receive, subscription):
+    """Zamyka subskrypcję po rozłączeniu klienta (budzi oczekujący strumień)"""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            subscription.close()
+            return
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('ascii')),
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def create_asgi_app(flask_app=None):
+    """Tworzy aplikację ASGI (fabryka dla uvicorn --factory)"""
+    if flask_app is None:
+        from app.app import create_app
+        flask_app = create_app()
+    return AsgiApp(flask_app)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.extensions import db
@@ -6,6 +6,13 @@ from app.extensions import db
 class Municipality(db.Model):
     """Model reprezentujący gminę"""
     __tablename__ = 'municipalities'
+    __table_args__ = (
+        # Pokrywający indeks hierarchii (filtry województwa/powiatu, lista powiatów)
+        Index('ix_municipalities_hierarchy', 'voivodeship_code', 'county_code', 'county_name'),
+        Index('ix_municipalities_county_code', 'county_code'),
+        # Domyślne sortowanie listy gmin
+        Index('ix_municipalities_name', 'name'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     teryt_code = Column(String(10), unique=True, nullable=False, index=True)
@@ -43,13 +50,15 @@ class Municipality(db.Model):
     
     @classmethod
     def search(cls, query, limit=20):
-        """Wyszukuje gminy według zapytania"""
-        return cls.query.filter(
-            (cls.name.ilike(f"%{query}%")) |
-            (cls.teryt_code.ilike(f"%{query}%")) |
-            (cls.county_name.ilike(f"%{query}%")) |
-            (cls.voivodeship_name.ilike(f"%{query}%"))
-        ).limit(limit).all()
+        """Wyszukuje gminy według zapytania (indeks w pamięci, z rankingiem trafności)"""
+        from app.services.municipality_search import get_search_index
+        
+        ids = get_search_index().search_ids(query, limit)
+        if not ids:
+            return []
+        
+        by_id = {m.id: m for m in cls.query.filter(cls.id.in_(ids)).all()}
+        return [by_id[i] for i in ids if i in by_id]
     
     @property
     def coordinates(self):
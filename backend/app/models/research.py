@@ -1,16 +1,26 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON, UniqueConstraint, Index, LargeBinary
+from sqlalchemy.orm import relationship, deferred, validates
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.sql import func
+from datetime import datetime
 from app.extensions import db
 
 class Research(db.Model):
     """Model reprezentujący badanie regionu"""
     __tablename__ = 'researches'
+    __table_args__ = (
+        # Filtr statusu z sortowaniem od najnowszych (lista badań, /pending, /claim)
+        Index('ix_researches_status_created_at', 'status', 'created_at'),
+        # Lista badań bez filtrów (ORDER BY created_at DESC, id DESC) i filtr gminy
+        Index('ix_researches_created_at_id', 'created_at', 'id'),
+        Index('ix_researches_municipality_created_at', 'municipality_id', 'created_at'),
+        Index('ix_researches_params_hash_status', 'params_hash', 'status', 'end_time'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     task_id = Column(String(100), unique=True, nullable=False, index=True)
     title = Column(String(255), nullable=False)
-    status = Column(String(50), nullable=False, default='queued')  # queued, running, completed, failed, stopped
+    status = Column(String(50), nullable=False, default='queued')  # scheduled, queued, running, completed, failed, stopped
     progress = Column(Integer, default=0)  # Procent ukończenia (0-100)
     current_step = Column(String(255))
     error_message = Column(Text)
@@ -22,11 +32,25 @@ class Research(db.Model):
     depth = Column(Integer, default=2)
     config = Column(JSON)
     
+    # Skrót znormalizowanych parametrów (region, breadth, depth, config) do ponownego użycia wyników
+    params_hash = Column(String(64))
+    # Ten sam skrót, ale tylko dopóki badanie trwa - unikalność zapobiega zdublowanym uruchomieniom
+    in_flight_key = Column(String(64), unique=True)
+    
     # Relacje
     municipality_id = Column(Integer, ForeignKey('municipalities.id'))
     municipality = relationship('Municipality', back_populates='researches')
     reports = relationship('ResearchReport', back_populates='research', cascade='all, delete-orphan')
     
+    # Kampania, w ramach której utworzono badanie (status "scheduled" do czasu zwolnienia przez harmonogram)
+    campaign_id = Column(Integer, ForeignKey('research_campaigns.id'), index=True)
+    campaign = relationship('ResearchCampaign', back_populates='researches')
+    
+    # Dzierżawa zadania pobranego przez document_processor (tryb pull)
+    lease_owner = Column(String(100))
+    lease_token = Column(String(32), index=True)
+    lease_expires_at = Column(DateTime)
+    
     # Śledzenie czasu
     start_time = Column(DateTime)
     end_time = Column(DateTime)
@@ -36,14 +60,37 @@ class Research(db.Model):
     def __repr__(self):
         return f"<Research {self.task_id} ({self.status})>"
     
-    @property
+    @validates('status')
+    def _on_status_change(self, key, status):
+        # Zakończone badanie nie blokuje już uruchomienia badania o tych samych parametrach
+        if status in ('completed', 'failed', 'stopped'):
+            self.in_flight_key = None
+        
+        # Czas oczekiwania w kolejce i czas wykonania (histogramy kontroli przyjmowania)
+        if self.status is not None and status != self.status:
+            from app.services.admission import observe_status_change
+            observe_status_change(self, status)
+        return status
+    
+    @hybrid_property
     def duration(self):
         """Zwraca czas trwania badania w sekundach"""
-        if not self.start_time:
+        return self.compute_duration(self.start_time, self.end_time)
+    
+    @duration.expression
+    def duration(cls):
+        """Czas trwania liczony w zapytaniu SQL"""
+        from app.services.sql_time import elapsed_seconds
+        return elapsed_seconds(cls.start_time, cls.end_time)
+    
+    @staticmethod
+    def compute_duration(start_time, end_time):
+        """Czas trwania w sekundach (trwające badanie - do chwili obecnej)"""
+        if not start_time:
             return 0
         
-        end = self.end_time or func.now()
-        return (end - self.start_time).total_seconds()
+        end = end_time or datetime.utcnow()
+        return (end - start_time).total_seconds()
     
     def to_dict(self):
         """Konwertuje obiekt do słownika"""
@@ -61,6 +108,7 @@ class Research(db.Model):
             'depth': self.depth,
             'config': self.config,
             'municipality_id': self.municipality_id,
+            'campaign_id': self.campaign_id,
             'start_time': self.start_time.isoformat() if self.start_time else None,
             'end_time': self.end_time.isoformat() if self.end_time else None,
             'created_at': self.created_at.isoformat(),
@@ -68,17 +116,111 @@ class Research(db.Model):
             'duration': self.duration
         }
 
+    def start_payload(self):
+        """Treść zlecenia uruchomienia badania w document_processor"""
+        return {
+            'task_id': self.task_id,
+            'region_name': self.region_name,
+            'region_id': self.region_id,
+            'options': {
+                'breadth': self.breadth,
+                'depth': self.depth,
+                'config': self.config
+            }
+        }
+    
+    def to_progress_dict(self):
+        """Konwertuje stan postępu badania do słownika (zdarzenia SSE)"""
+        return {
+            'task_id': self.task_id,
+            # Nagłówek widoku postępu - stan początkowy pochodzi tylko ze zdarzenia snapshot
+            'title': self.title,
+            'region_name': self.region_name,
+            'status': self.status,
+            'progress': self.progress,
+            'current_step': self.current_step,
+            'error_message': self.error_message,
+            'start_time': self.start_time.isoformat() if self.start_time else None,
+            'end_time': self.end_time.isoformat() if self.end_time else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class ResearchCampaign(db.Model):
+    """Model kampanii badań wielu gmin (np. całego województwa lub powiatu)"""
+    __tablename__ = 'research_campaigns'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    title = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False, default='active')  # active, cancelled
+    # Wybór gmin: voivodeship_code, county_code, type, municipality_ids
+    selection = Column(JSON)
+    
+    # Parametry badań kampanii
+    breadth = Column(Integer, default=4)
+    depth = Column(Integer, default=2)
+    config = Column(JSON)
+    
+    # Maksymalna liczba jednocześnie trwających badań kampanii (NULL - tylko limity globalne)
+    max_concurrency = Column(Integer)
+    total = Column(Integer, nullable=False, default=0)
+    
+    # Relacje
+    researches = relationship('Research', back_populates='campaign')
+    
+    # Śledzenie czasu
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<ResearchCampaign {self.id} ({self.status})>"
+    
+    def to_dict(self, progress=None):
+        """Konwertuje obiekt do słownika (z postępem zagregowanym przez campaign_progress)"""
+        data = {
+            'id': self.id,
+            'title': self.title,
+            'status': self.status,
+            'selection': self.selection,
+            'breadth': self.breadth,
+            'depth': self.depth,
+            'config': self.config,
+            'max_concurrency': self.max_concurrency,
+            'total': self.total,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+        if progress is not None:
+            data['progress'] = progress
+            # Kampania bez badań w toku jest zakończona
+            if self.status == 'active' and progress['active'] == 0:
+                data['status'] = 'completed'
+        return data
+
 class ResearchReport(db.Model):
     """Model reprezentujący raport badania"""
     __tablename__ = 'research_reports'
+    __table_args__ = (
+        # Najnowszy raport danego typu dla badania
+        Index('ix_research_reports_research_type_created', 'research_id', 'type', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     research_id = Column(Integer, ForeignKey('researches.id'), nullable=False)
     type = Column(String(50), nullable=False)  # 'markdown', 'pdf', 'excel', etc.
     title = Column(String(255), nullable=False)
-    content = Column(Text)
+    # Treść inline tylko dla starszych raportów - ładowana wyłącznie na żądanie
+    content = deferred(Column(Text))
     file_path = Column(String(255))
     
+    # Raport w magazynie adresowanym treścią (app/services/report_store.py)
+    content_hash = Column(String(64), index=True)
+    content_encoding = Column(String(10))  # gzip, zstd
+    content_size = Column(Integer)
+    stored_size = Column(Integer)
+    
+    # Stan przesyłania raportu w częściach: 'open', 'finalizing', NULL - raport kompletny
+    upload_status = Column(String(20))
+    
     # Relacje
     research = relationship('Research', back_populates='reports')
     
@@ -89,6 +231,51 @@ class ResearchReport(db.Model):
     def __repr__(self):
         return f"<ResearchReport {self.id} ({self.type})>"
     
+    def store_content(self, text):
+        """Zapisuje treść raportu w magazynie raportów zamiast w tabeli"""
+        from app.services.report_store import report_store
+        
+        blob = report_store.put_text(text)
+        self.content = None
+        self.content_hash = blob.digest
+        self.content_encoding = blob.encoding
+        self.content_size = blob.size
+        self.stored_size = blob.stored_size
+        return blob
+    
+    def append_section(self, chunks, expected_offset=None):
+        """Dopisuje fragment raportu przesyłanego w częściach; zwraca nowy rozmiar"""
+        from app.services.report_store import report_store
+        
+        _, size = report_store.append_upload(self.id, chunks, expected_offset)
+        return size
+    
+    def uploaded_size(self):
+        """Rozmiar raportu: bieżący rozmiar pliku częściowego w trakcie przesyłania"""
+        if self.upload_status == 'open':
+            from app.services.report_store import report_store
+            return report_store.upload_size(self.id)
+        return self.content_size
+    
+    def finalize_upload(self):
+        """Kończy przesyłanie - plik częściowy trafia do magazynu raportów"""
+        from app.services.report_store import report_store
+        
+        blob = report_store.finalize_upload(self.id)
+        self.content_hash = blob.digest
+        self.content_encoding = blob.encoding
+        self.content_size = blob.size
+        self.stored_size = blob.stored_size
+        self.upload_status = None
+        return blob
+    
+    def read_content(self):
+        """Odczytuje treść raportu (z magazynu lub ze starszej kolumny inline)"""
+        if self.content_hash:
+            from app.services.report_store import report_store
+            return report_store.read_text(self.content_hash, self.content_encoding)
+        return self.content
+    
     def to_dict(self):
         """Konwertuje obiekt do słownika"""
         return {
@@ -96,8 +283,83 @@ class ResearchReport(db.Model):
             'research_id': self.research_id,
             'type': self.type,
             'title': self.title,
-            'content': self.content if self.type == 'markdown' else None,
+            'content': self.read_content() if self.type == 'markdown' else None,
+            'content_size': self.uploaded_size(),
+            'upload_status': self.upload_status,
             'file_path': self.file_path,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+class ResearchDispatch(db.Model):
+    """Model kolejki wychodzącej (outbox) zleceń wysyłanych do document_processor"""
+    __tablename__ = 'research_dispatches'
+    __table_args__ = (
+        UniqueConstraint('task_id', 'action', name='uq_research_dispatches_task_action'),
+        Index('ix_research_dispatches_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    task_id = Column(String(100), nullable=False, index=True)
+    action = Column(String(20), nullable=False)  # start, stop
+    payload = Column(JSON)
+    status = Column(String(20), nullable=False, default='pending')  # pending, sending, sent, failed, cancelled
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=func.now())
+    claim_token = Column(String(32), index=True)
+    last_error = Column(Text)
+    
+    # Śledzenie czasu
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<ResearchDispatch {self.task_id}:{self.action} ({self.status})>"
+    
+    def to_dict(self):
+        """Konwertuje obiekt do słownika"""
+        return {
+            'id': self.id,
+            'task_id': self.task_id,
+            'action': self.action,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class ResearchProgressSeries(db.Model):
+    """Historia postępu badania: słownik kroków i łączne czasy kroków (zmiany w ResearchProgressChunk)"""
+    __tablename__ = 'research_progress_series'
+    
+    research_id = Column(Integer, ForeignKey('researches.id'), primary_key=True)
+    # Nazwy kroków (current_step) - zmiana postępu przechowuje tylko indeks w tej liście
+    steps = Column(JSON, nullable=False)
+    # Łączny czas kroków w sekundach (pozycje jak w steps) - do statystyk bez dekodowania zmian
+    step_seconds = Column(JSON, nullable=False)
+    ticks = Column(Integer, nullable=False, default=0)
+    
+    # Pierwsza i ostatnia zapisana zmiana (ostatnia jest podstawą kodowania różnicowego następnej)
+    started_at = Column(DateTime, nullable=False)
+    last_at = Column(DateTime, nullable=False)
+    last_progress = Column(Integer)
+    last_step = Column(Integer)
+    
+    def __repr__(self):
+        return f"<ResearchProgressSeries {self.research_id} ({self.ticks})>"
+
+class ResearchProgressChunk(db.Model):
+    """Fragment historii postępu: do PROGRESS_HISTORY_CHUNK_TICKS zmian zakodowanych różnicowo"""
+    __tablename__ = 'research_progress_chunks'
+    
+    research_id = Column(Integer, ForeignKey('researches.id'), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    # Czas pierwszej zmiany we fragmencie (kolejne zapisane jako przyrosty w milisekundach)
+    started_at = Column(DateTime, nullable=False)
+    ticks = Column(Integer, nullable=False, default=0)
+    data = Column(LargeBinary, nullable=False)
+    
+    def __repr__(self):
+        return f"<ResearchProgressChunk {self.research_id}:{self.seq} ({self.ticks})>"
@@ -0,0 +1,200 @@
+import math
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, select
+
+from app.services.campaigns import CAMPAIGN_MAX_RUNNING, IN_FLIGHT_STATUSES
+from app.services.metrics import registry
+
+# Miejsca w limicie CAMPAIGN_MAX_RUNNING zarezerwowane dla badań interaktywnych (kampanie ich nie zajmują)
+ADMISSION_INTERACTIVE_RESERVED = int(os.environ.get('ADMISSION_INTERACTIVE_RESERVED', 1))
+# Maksymalna liczba badań interaktywnych oczekujących w backendzie - kolejne zgłoszenia dostają 429
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 50))
+# Maksymalna liczba oczekujących badań kampanii
+ADMISSION_MAX_BULK_QUEUE = int(os.environ.get('ADMISSION_MAX_BULK_QUEUE', 20000))
+# Szacowany czas badania, gdy w ostatniej dobie nie zakończyło się żadne badanie (w sekundach)
+ADMISSION_DEFAULT_RUN_SECONDS = int(os.environ.get('ADMISSION_DEFAULT_RUN_SECONDS', 600))
+MAX_RETRY_AFTER = 3600
+
+# Klasy priorytetu: pojedyncze badania z interfejsu wyprzedzają badania kampanii
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BULK = 'bulk'
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+
+# Statusy liczone przez kontrolę przyjmowania (oczekujące w backendzie i w toku)
+TRACKED_STATUSES = ('scheduled',) + IN_FLIGHT_STATUSES
+
+# Przedziały histogramów w sekundach (od sekund do kilku godzin)
+QUEUE_WAIT_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600)
+RUN_DURATION_BUCKETS = (30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 14400, 28800)
+
+QUEUE_WAIT = registry.histogram(
+    'research_queue_wait_seconds', 'Czas od zgłoszenia do rozpoczęcia badania',
+    labels=('priority',), buckets=QUEUE_WAIT_BUCKETS)
+RUN_DURATION = registry.histogram(
+    'research_run_duration_seconds', 'Czas wykonania badania (od rozpoczęcia do zakończenia)',
+    labels=('priority', 'status'), buckets=RUN_DURATION_BUCKETS)
+ADMISSION_DECISIONS = registry.counter(
+    'research_admission_total', 'Decyzje kontroli przyjmowania badań',
+    labels=('priority', 'decision'))
+TRACKED_RESEARCH = registry.gauge(
+    'research_admission_tracked', 'Badania oczekujące i w toku według statusu i priorytetu (ostatni odczyt)',
+    labels=('status', 'priority'))
+
+
+# Decyzje przyjęcia w procesie zapadają po kolei (między procesami - BEGIN IMMEDIATE w SQLite)
+_admission_lock = threading.Lock()
+
+
+class AdmissionRejected(Exception):
+    """Kolejka badań jest pełna - zgłoszenie można ponowić po retry_after sekundach"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def priority_of(campaign_id):
+    return PRIORITY_BULK if campaign_id is not None else PRIORITY_INTERACTIVE
+
+
+def priority_expression(model):
+    """Klasa priorytetu badania w SQL (badania kampanii - bulk)"""
+    return case((model.campaign_id.is_(None), PRIORITY_INTERACTIVE), else_=PRIORITY_BULK)
+
+
+def load_counts():
+    """Liczba badań oczekujących i w toku: {(status, priorytet): liczba} - jedno zapytanie GROUP BY"""
+    from app.extensions import db
+    from app.models.research import Research
+
+    priority = priority_expression(Research)
+    counts = {(status, p): 0 for status in TRACKED_STATUSES for p in PRIORITIES}
+    rows = db.session.execute(
+        select(Research.status, priority, func.count(Research.id))
+        .where(Research.status.in_(TRACKED_STATUSES))
+        .group_by(Research.status, priority)
+    )
+    for status, p, count in rows:
+        counts[(status, p)] = count
+    for (status, p), count in counts.items():
+        TRACKED_RESEARCH.set(count, status=status, priority=p)
+    return counts
+
+
+def in_flight(counts):
+    return sum(counts[(status, p)] for status in IN_FLIGHT_STATUSES for p in PRIORITIES)
+
+
+def average_run_seconds():
+    """Średni czas badań zakończonych w ostatniej dobie (do szacowania Retry-After)"""
+    from app.extensions import db
+    from app.models.research import Research
+
+    since = datetime.utcnow() - timedelta(days=1)
+    average = db.session.execute(
+        select(func.avg(Research.duration))
+        .where(Research.status == 'completed', Research.end_time >= since, Research.start_time.isnot(None))
+    ).scalar()
+    return float(average) if average else float(ADMISSION_DEFAULT_RUN_SECONDS)
+
+
+def estimate_wait(position, slots=None):
+    """Szacowany czas (w sekundach), po którym zwolni się miejsce dla pozycji w kolejce"""
+    slots = max(1, slots or CAMPAIGN_MAX_RUNNING)
+    seconds = math.ceil(average_run_seconds() * max(1, position) / slots)
+    return max(1, min(MAX_RETRY_AFTER, seconds))
+
+
+@contextmanager
+def admission_transaction():
+    """Zliczenie badań i zapis decyzji w jednej transakcji, bez równoległych decyzji
+
+    W SQLite BEGIN IMMEDIATE zajmuje blokadę zapisu przed zliczeniem - inny proces nie zmieni
+    liczby badań w toku do zatwierdzenia transakcji. Transakcja niezatwierdzona w bloku
+    jest wycofywana (zwolnienie blokady).
+    """
+    from app.extensions import db
+
+    with _admission_lock:
+        connection = db.session.connection()
+        if connection.dialect.name == 'sqlite' and not connection.connection.driver_connection.in_transaction:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+        try:
+            yield
+        finally:
+            db.session.rollback()
+
+
+def admit_interactive():
+    """Decyzja dla nowego badania interaktywnego: 'queued' (od razu) lub 'scheduled' (kolejka backendu)
+
+    Badanie trafia od razu do document_processor tylko wtedy, gdy jest wolne miejsce
+    i nie czekają wcześniejsze zgłoszenia. Pełna kolejka kończy się AdmissionRejected.
+    Wywołanie i zapis badania muszą być objęte admission_transaction().
+    """
+    counts = load_counts()
+    waiting = counts[('scheduled', PRIORITY_INTERACTIVE)]
+    if in_flight(counts) < CAMPAIGN_MAX_RUNNING and not waiting:
+        decision = 'queued'
+    elif waiting >= ADMISSION_MAX_QUEUE:
+        ADMISSION_DECISIONS.inc(priority=PRIORITY_INTERACTIVE, decision='rejected')
+        raise AdmissionRejected(
+            f'Kolejka badań jest pełna ({waiting} oczekujących) - spróbuj ponownie później',
+            estimate_wait(waiting - ADMISSION_MAX_QUEUE + 1)
+        )
+    else:
+        decision = 'scheduled'
+    ADMISSION_DECISIONS.inc(priority=PRIORITY_INTERACTIVE, decision=decision)
+    return decision
+
+
+def admit_bulk(count):
+    """Sprawdza, czy kolejka kampanii przyjmie kolejne badania (AdmissionRejected, jeśli nie)"""
+    counts = load_counts()
+    waiting = counts[('scheduled', PRIORITY_BULK)]
+    if waiting + count > ADMISSION_MAX_BULK_QUEUE:
+        ADMISSION_DECISIONS.inc(count, priority=PRIORITY_BULK, decision='rejected')
+        slots = CAMPAIGN_MAX_RUNNING - ADMISSION_INTERACTIVE_RESERVED
+        raise AdmissionRejected(
+            f'Kolejka kampanii jest pełna ({waiting} oczekujących badań, limit {ADMISSION_MAX_BULK_QUEUE})',
+            estimate_wait(waiting + count - ADMISSION_MAX_BULK_QUEUE, slots)
+        )
+    ADMISSION_DECISIONS.inc(count, priority=PRIORITY_BULK, decision='scheduled')
+
+
+def admission_status():
+    """Stan kontroli przyjmowania: limity, liczby badań i szacowany czas oczekiwania"""
+    counts = load_counts()
+    waiting = counts[('scheduled', PRIORITY_INTERACTIVE)]
+    return {
+        'limits': {
+            'max_running': CAMPAIGN_MAX_RUNNING,
+            'interactive_reserved': ADMISSION_INTERACTIVE_RESERVED,
+            'max_queue': ADMISSION_MAX_QUEUE,
+            'max_bulk_queue': ADMISSION_MAX_BULK_QUEUE
+        },
+        'counts': {
+            p: {status: counts[(status, p)] for status in TRACKED_STATUSES}
+            for p in PRIORITIES
+        },
+        'in_flight': in_flight(counts),
+        'saturated': waiting >= ADMISSION_MAX_QUEUE,
+        'estimated_wait_seconds': (
+            estimate_wait(waiting + 1) if waiting or in_flight(counts) >= CAMPAIGN_MAX_RUNNING else 0
+        )
+    }
+
+
+def observe_status_change(research, status, now=None):
+    """Histogramy czasu oczekiwania i wykonania - wywoływane przy zmianie statusu badania"""
+    now = now or datetime.utcnow()
+    priority = priority_of(research.campaign_id)
+    if status == 'running' and research.created_at is not None:
+        QUEUE_WAIT.observe(max(0.0, (now - research.created_at).total_seconds()), priority=priority)
+    elif status in ('completed', 'failed', 'stopped') and research.start_time is not None:
+        RUN_DURATION.observe(max(0.0, (now - research.start_time).total_seconds()),
+                             priority=priority, status=status)
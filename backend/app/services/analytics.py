@@ -0,0 +1,344 @@
+import bisect
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import func, select
+
+from app.extensions import db
+from app.services.pagination import sqlite_comparable
+from app.services.progress_events import TERMINAL_STATUSES
+from app.services.sql_time import BUCKET_UNITS, bucket_start, time_bucket
+
+try:
+    import numpy as np
+except ImportError:  # NumPy jest opcjonalny - bez niego percentyle liczone w czystym Pythonie
+    np = None
+
+# Maksymalna liczba przedziałów w jednym zapytaniu o statystyki
+MAX_ANALYTICS_BUCKETS = 1000
+# Czas ważności przedziałów, które mogą się jeszcze zmienić (trwające badania, bieżący przedział)
+ANALYTICS_CACHE_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL', 60))
+# Liczba przedziałów przechowywanych w pamięci procesu
+ANALYTICS_CACHE_SIZE = int(os.environ.get('ANALYTICS_CACHE_SIZE', 20000))
+
+PERCENTILES = (50, 90, 99)
+# Górne granice przedziałów histogramu czasu trwania (w sekundach)
+DURATION_HISTOGRAM_EDGES = (60, 300, 900, 1800, 3600, 7200, 14400, 43200, 86400)
+# Maksymalna liczba badań (najnowszych) uwzględnianych w statystykach kroków
+STEP_STATS_MAX_RUNS = int(os.environ.get('STEP_STATS_MAX_RUNS', 20000))
+
+
+class InvalidAnalyticsQuery(ValueError):
+    """Błędny zakres lub przedział statystyk"""
+
+
+class BucketStats:
+    """Agregaty badań jednego przedziału czasowego - sumowalne między przedziałami"""
+
+    __slots__ = ('created', 'statuses', 'voivodeships', 'durations', 'finished')
+
+    def __init__(self):
+        # Badania utworzone w przedziale: liczba, statusy, województwa [wszystkie, zakończone, nieudane]
+        self.created = 0
+        self.statuses = {}
+        self.voivodeships = {}
+        # Czasy trwania zakończonych badań utworzonych w przedziale (status -> wartości)
+        self.durations = {}
+        # Badania zakończone w przedziale (według end_time): status -> liczba
+        self.finished = {}
+
+    def settled(self):
+        """Czy wszystkie badania przedziału są zakończone (agregaty nie zmienią się)"""
+        return all(status in TERMINAL_STATUSES for status in self.statuses)
+
+
+class BucketCache:
+    """Cache LRU agregatów przedziałów; przedziały niezakończone wygasają po ANALYTICS_CACHE_TTL"""
+
+    def __init__(self, max_entries=ANALYTICS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stats, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return stats
+
+    def put(self, key, stats, ttl=None):
+        with self._lock:
+            self._entries[key] = (stats, time.monotonic() + ttl if ttl is not None else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Cache współdzielony w procesie
+bucket_cache = BucketCache()
+
+
+def _as_array(values):
+    return np.fromiter(values, dtype=np.float64) if np is not None else list(values)
+
+
+def _load_buckets(starts, unit):
+    """Liczy agregaty dla listy przedziałów trzema zapytaniami GROUP BY i jednym odczytem kolumnowym"""
+    from app.models.municipality import Municipality
+    from app.models.research import Research
+
+    since = starts[0]
+    until = starts[-1] + BUCKET_UNITS[unit]
+    if db.session.get_bind().dialect.name == 'sqlite':
+        since, until = sqlite_comparable(since), sqlite_comparable(until)
+    stats = {start.isoformat(): BucketStats() for start in starts}
+    created_bucket = time_bucket(Research.created_at, unit)
+    in_range = (Research.created_at >= since, Research.created_at < until)
+
+    # Statusy i województwa badań utworzonych w przedziałach
+    rows = db.session.execute(
+        select(created_bucket, Research.status, Municipality.voivodeship_name, func.count())
+        .select_from(Research)
+        .outerjoin(Municipality, Municipality.id == Research.municipality_id)
+        .where(*in_range)
+        .group_by(created_bucket, Research.status, Municipality.voivodeship_name)
+    )
+    for bucket, status, voivodeship, count in rows:
+        entry = stats.get(bucket)
+        if entry is None:
+            continue
+        entry.created += count
+        entry.statuses[status] = entry.statuses.get(status, 0) + count
+        totals = entry.voivodeships.setdefault(voivodeship, [0, 0, 0])
+        totals[0] += count
+        if status in TERMINAL_STATUSES:
+            totals[1] += count
+        if status == 'failed':
+            totals[2] += count
+
+    # Czasy trwania zakończonych badań - wyliczane w SQL, pobierane kolumnowo
+    rows = db.session.execute(
+        select(created_bucket, Research.status, Research.duration)
+        .where(*in_range, Research.status.in_(TERMINAL_STATUSES), Research.start_time.isnot(None))
+        .order_by(created_bucket, Research.status)
+    )
+    for (bucket, status), group in groupby(rows, key=lambda row: (row[0], row[1])):
+        entry = stats.get(bucket)
+        if entry is not None:
+            entry.durations[status] = _as_array(row[2] for row in group)
+
+    # Przepustowość - badania zakończone w przedziałach (według end_time)
+    finished_bucket = time_bucket(Research.end_time, unit)
+    rows = db.session.execute(
+        select(finished_bucket, Research.status, func.count())
+        .where(Research.end_time >= since, Research.end_time < until,
+               Research.status.in_(TERMINAL_STATUSES))
+        .group_by(finished_bucket, Research.status)
+    )
+    for bucket, status, count in rows:
+        entry = stats.get(bucket)
+        if entry is not None:
+            entry.finished[status] = entry.finished.get(status, 0) + count
+
+    return stats
+
+
+def _collect_buckets(starts, unit, now):
+    """Zwraca agregaty przedziałów - z cache lub liczone jednym przebiegiem dla brakujących"""
+    result = {}
+    missing = []
+    for start in starts:
+        cached = bucket_cache.get((unit, start))
+        if cached is None:
+            missing.append(start)
+        else:
+            result[start] = cached
+
+    if missing:
+        loaded = _load_buckets(missing, unit)
+        for start in missing:
+            entry = loaded[start.isoformat()]
+            closed = start + BUCKET_UNITS[unit] <= now
+            # Zamknięty przedział bez trwających badań nie zmieni się - przechowywany bez wygasania
+            bucket_cache.put((unit, start), entry, None if closed and entry.settled() else ANALYTICS_CACHE_TTL)
+            result[start] = entry
+    return result
+
+
+def _percentiles(values):
+    if np is not None:
+        return [float(v) for v in np.percentile(values, PERCENTILES)]
+    # Interpolacja liniowa - ta sama metoda co domyślnie w NumPy
+    ordered = sorted(values)
+    result = []
+    for q in PERCENTILES:
+        k = (len(ordered) - 1) * q / 100
+        low = math.floor(k)
+        high = min(low + 1, len(ordered) - 1)
+        result.append(ordered[low] + (ordered[high] - ordered[low]) * (k - low))
+    return result
+
+
+def _histogram(values):
+    if np is not None:
+        positions = np.searchsorted(DURATION_HISTOGRAM_EDGES, values, side='left')
+        counts = np.bincount(positions, minlength=len(DURATION_HISTOGRAM_EDGES) + 1).tolist()
+    else:
+        counts = [0] * (len(DURATION_HISTOGRAM_EDGES) + 1)
+        for value in values:
+            counts[bisect.bisect_left(DURATION_HISTOGRAM_EDGES, value)] += 1
+    return [
+        {'le': edge, 'count': count}
+        for edge, count in zip(list(DURATION_HISTOGRAM_EDGES) + [None], counts)
+    ]
+
+
+def duration_stats(values):
+    """Liczba, średnia, min/max, percentyle i histogram czasów trwania (w sekundach)"""
+    count = len(values)
+    if not count:
+        return {'count': 0, 'mean': None, 'min': None, 'max': None,
+                **{f'p{q}': None for q in PERCENTILES}, 'histogram': _histogram([])}
+    if np is not None:
+        mean, low, high = float(values.mean()), float(values.min()), float(values.max())
+    else:
+        mean, low, high = sum(values) / count, min(values), max(values)
+    return {
+        'count': count,
+        'mean': round(mean, 3),
+        'min': round(low, 3),
+        'max': round(high, 3),
+        **{f'p{q}': round(v, 3) for q, v in zip(PERCENTILES, _percentiles(values))},
+        'histogram': _histogram(values)
+    }
+
+
+def _concat(arrays):
+    if np is not None:
+        return np.concatenate(arrays) if arrays else np.empty(0)
+    return [value for values in arrays for value in values]
+
+
+def research_analytics(since, until, unit='day', now=None):
+    """Statystyki zbiorcze badań utworzonych w zakresie dat, w podziale na przedziały czasowe"""
+    if unit not in BUCKET_UNITS:
+        raise InvalidAnalyticsQuery(f"Nieznany przedział: {unit} (dostępne: {', '.join(BUCKET_UNITS)})")
+    if since >= until:
+        raise InvalidAnalyticsQuery('Początek zakresu musi być wcześniejszy niż koniec')
+
+    step = BUCKET_UNITS[unit]
+    starts = []
+    start = bucket_start(since, unit)
+    while start < until:
+        starts.append(start)
+        if len(starts) > MAX_ANALYTICS_BUCKETS:
+            raise InvalidAnalyticsQuery(f'Zakres obejmuje ponad {MAX_ANALYTICS_BUCKETS} przedziałów')
+        start += step
+
+    buckets = _collect_buckets(starts, unit, now or datetime.utcnow())
+
+    statuses = {}
+    voivodeships = {}
+    durations = {}
+    series = []
+    for start in starts:
+        entry = buckets[start]
+        for status, count in entry.statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+        for name, totals in entry.voivodeships.items():
+            merged = voivodeships.setdefault(name, [0, 0, 0])
+            for i, value in enumerate(totals):
+                merged[i] += value
+        for status, values in entry.durations.items():
+            durations.setdefault(status, []).append(values)
+        series.append({
+            'bucket': start.isoformat(),
+            'created': entry.created,
+            **{status: entry.finished.get(status, 0) for status in TERMINAL_STATUSES}
+        })
+
+    finished = sum(statuses.get(s, 0) for s in TERMINAL_STATUSES)
+    return {
+        'since': starts[0].isoformat(),
+        'until': (starts[-1] + step).isoformat(),
+        'bucket': unit,
+        'total': sum(statuses.values()),
+        'status_counts': statuses,
+        'failure_rate': round(statuses.get('failed', 0) / finished, 4) if finished else None,
+        'durations': {
+            status: duration_stats(_concat(durations.get(status, [])))
+            for status in TERMINAL_STATUSES
+        },
+        'voivodeships': [
+            {
+                'voivodeship': name,
+                'total': total,
+                'finished': done,
+                'failed': failed,
+                'failure_rate': round(failed / done, 4) if done else None
+            }
+            for name, (total, done, failed) in sorted(
+                voivodeships.items(), key=lambda item: (-item[1][0], item[0] or '')
+            )
+        ],
+        'series': series
+    }
+
+
+def step_latency_stats(since, until, status=None, campaign_id=None):
+    """Czasy kroków badań utworzonych w zakresie dat (z sum zapisanych w historii postępu)"""
+    from app.models.research import Research, ResearchProgressSeries
+
+    if since >= until:
+        raise InvalidAnalyticsQuery('Początek zakresu musi być wcześniejszy niż koniec')
+    if db.session.get_bind().dialect.name == 'sqlite':
+        since, until = sqlite_comparable(since), sqlite_comparable(until)
+
+    query = (
+        select(ResearchProgressSeries.steps, ResearchProgressSeries.step_seconds)
+        .join(Research, Research.id == ResearchProgressSeries.research_id)
+        .where(Research.created_at >= since, Research.created_at < until)
+    )
+    if status:
+        query = query.where(Research.status == status)
+    if campaign_id is not None:
+        query = query.where(Research.campaign_id == campaign_id)
+    rows = db.session.execute(
+        query.order_by(Research.created_at.desc()).limit(STEP_STATS_MAX_RUNS)
+    ).all()
+
+    # Krok -> czasy w kolejnych badaniach (badanie bez danego kroku nie wnosi zera)
+    samples = {}
+    for steps, seconds in rows:
+        for name, value in zip(steps, seconds):
+            samples.setdefault(name, []).append(value)
+
+    total = sum(sum(values) for values in samples.values())
+    return {
+        'runs': len(rows),
+        'truncated': len(rows) == STEP_STATS_MAX_RUNS,
+        'steps': [
+            {
+                'step': name,
+                'total_seconds': round(sum(values), 3),
+                'share': round(sum(values) / total, 4) if total else None,
+                **duration_stats(_as_array(values))
+            }
+            for name, values in sorted(samples.items(), key=lambda item: -sum(item[1]))
+        ]
+    }
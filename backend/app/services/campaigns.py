@@ -0,0 +1,228 @@
+import logging
+import os
+import uuid
+from datetime import datetime
+
+from sqlalchemy import case, func, insert, or_, select, update
+
+logger = logging.getLogger(__name__)
+
+# Globalny limit jednocześnie trwających badań (ochrona backendu LLM)
+CAMPAIGN_MAX_RUNNING = int(os.environ.get('CAMPAIGN_MAX_RUNNING', 4))
+# Limit jednocześnie trwających badań w jednym województwie
+CAMPAIGN_MAX_RUNNING_PER_REGION = int(os.environ.get('CAMPAIGN_MAX_RUNNING_PER_REGION', 2))
+
+# Statusy badań zajmujących miejsce w limitach
+IN_FLIGHT_STATUSES = ('queued', 'running')
+
+# Największa kampania tworzona jednym żądaniem
+MAX_CAMPAIGN_SIZE = 5000
+
+
+def expand_selection(selection):
+    """Zamienia wybór z hierarchii (województwo, powiat, typ, lista ID) na listę gmin"""
+    from app.models.municipality import Municipality
+
+    query = Municipality.query.with_entities(
+        Municipality.id, Municipality.name, Municipality.teryt_code
+    )
+    if selection.get('voivodeship_code'):
+        query = query.filter(Municipality.voivodeship_code == selection['voivodeship_code'])
+    if selection.get('county_code'):
+        query = query.filter(Municipality.county_code == selection['county_code'])
+    if selection.get('type'):
+        query = query.filter(Municipality.type == selection['type'])
+    if selection.get('municipality_ids'):
+        query = query.filter(Municipality.id.in_(selection['municipality_ids']))
+    return query.order_by(Municipality.teryt_code).limit(MAX_CAMPAIGN_SIZE + 1).all()
+
+
+def create_campaign_research(campaign, municipalities):
+    """Tworzy badania kampanii jednym wstawieniem zbiorczym (status "scheduled")"""
+    from app.extensions import db
+    from app.models.research import Research
+    from app.services.research_reuse import params_hash
+
+    now = datetime.utcnow()
+    rows = [{
+        'task_id': f"region_{teryt_code}_{uuid.uuid4().hex[:8]}",
+        'title': f"Badanie regionu: {name}",
+        'status': 'scheduled',
+        'progress': 0,
+        'region_name': name,
+        'region_id': teryt_code,
+        'breadth': campaign.breadth,
+        'depth': campaign.depth,
+        'config': campaign.config or {},
+        'params_hash': params_hash(teryt_code, campaign.breadth, campaign.depth, campaign.config),
+        'municipality_id': id,
+        'campaign_id': campaign.id,
+        'created_at': now,
+        'updated_at': now
+    } for id, name, teryt_code in municipalities]
+
+    if rows:
+        db.session.execute(insert(Research), rows)
+    return len(rows)
+
+
+def campaign_progress(campaign_ids):
+    """Postęp kampanii zagregowany w SQL (liczba badań według statusu i średni postęp)"""
+    from app.extensions import db
+    from app.models.research import Research
+
+    progress = {
+        campaign_id: {'by_status': {}, 'total': 0, 'active': 0, 'progress': 0.0}
+        for campaign_id in campaign_ids
+    }
+    if not progress:
+        return progress
+
+    rows = db.session.execute(
+        select(
+            Research.campaign_id, Research.status,
+            func.count(Research.id), func.coalesce(func.sum(Research.progress), 0)
+        )
+        .where(Research.campaign_id.in_(list(progress)))
+        .group_by(Research.campaign_id, Research.status)
+    ).all()
+
+    for campaign_id, status, count, progress_sum in rows:
+        entry = progress[campaign_id]
+        entry['by_status'][status] = count
+        entry['total'] += count
+        # Zakończone badania liczą się jako 100%, niezależnie od ostatniego zgłoszonego postępu
+        entry['progress'] += count * 100 if status == 'completed' else progress_sum
+        if status in ('scheduled',) + IN_FLIGHT_STATUSES:
+            entry['active'] += count
+
+    for entry in progress.values():
+        entry['progress'] = round(entry['progress'] / entry['total'], 1) if entry['total'] else 0.0
+    return progress
+
+
+def _in_flight_counts():
+    """Liczba trwających badań: łącznie, według województwa i według kampanii"""
+    from app.extensions import db
+    from app.models.municipality import Municipality
+    from app.models.research import Research
+
+    rows = db.session.execute(
+        select(Municipality.voivodeship_code, Research.campaign_id, func.count(Research.id))
+        .select_from(Research)
+        .outerjoin(Municipality, Research.municipality_id == Municipality.id)
+        .where(Research.status.in_(IN_FLIGHT_STATUSES))
+        .group_by(Municipality.voivodeship_code, Research.campaign_id)
+    ).all()
+
+    total = 0
+    by_region = {}
+    by_campaign = {}
+    for region, campaign_id, count in rows:
+        total += count
+        by_region[region] = by_region.get(region, 0) + count
+        if campaign_id is not None:
+            by_campaign[campaign_id] = by_campaign.get(campaign_id, 0) + count
+    return total, by_region, by_campaign
+
+
+def release_scheduled_research(max_running=None, max_per_region=None):
+    """Zwalnia zaplanowane badania w ramach limitów; zwraca listę zwolnionych badań
+
+    Badania interaktywne (spoza kampanii) są zwalniane jako pierwsze, w kolejności
+    zgłoszeń i bez limitu województwa. Badania kampanii nie zajmują ostatnich
+    ADMISSION_INTERACTIVE_RESERVED miejsc, a między sobą są pobierane na zmianę z każdej
+    kampanii i każdego województwa (ROW_NUMBER w obrębie pary kampania/województwo).
+    Wywołanie obejmuje admission_transaction() - limity obowiązują także przy wielu procesach.
+    """
+    from app.extensions import db
+    from app.models.municipality import Municipality
+    from app.models.research import Research, ResearchCampaign
+    from app.services.admission import ADMISSION_INTERACTIVE_RESERVED
+    from app.services.dispatcher import enqueue_dispatch, dispatch_mode
+
+    max_running = CAMPAIGN_MAX_RUNNING if max_running is None else max_running
+    max_per_region = CAMPAIGN_MAX_RUNNING_PER_REGION if max_per_region is None else max_per_region
+
+    total, by_region, by_campaign = _in_flight_counts()
+    capacity = max_running - total
+    if capacity <= 0:
+        return []
+
+    # Województwa, które wyczerpały limit, pomijamy już w zapytaniu
+    full_regions = [region for region, count in by_region.items()
+                    if region is not None and count >= max_per_region]
+
+    # Badania interaktywne mają turę 0 (kolejność zgłoszeń), badania kampanii - kolejne tury
+    interactive = Research.campaign_id.is_(None)
+    turn = case((interactive, 0), else_=func.row_number().over(
+        partition_by=(Research.campaign_id, Municipality.voivodeship_code),
+        order_by=Research.id
+    )).label('turn')
+    ranked = (
+        select(
+            Research.id, Research.campaign_id, Municipality.voivodeship_code.label('region'),
+            ResearchCampaign.max_concurrency, turn
+        )
+        .select_from(Research)
+        .outerjoin(ResearchCampaign, Research.campaign_id == ResearchCampaign.id)
+        .outerjoin(Municipality, Research.municipality_id == Municipality.id)
+        .where(Research.status == 'scheduled', or_(interactive, ResearchCampaign.status == 'active'))
+    )
+    if full_regions:
+        ranked = ranked.where(or_(interactive, Municipality.voivodeship_code.notin_(full_regions)))
+    ranked = ranked.subquery()
+
+    # Kandydatów pobieramy z zapasem - część może odpaść przez limity województw i kampanii
+    candidates = db.session.execute(
+        select(ranked.c.id, ranked.c.campaign_id, ranked.c.region, ranked.c.max_concurrency)
+        .order_by(ranked.c.turn, ranked.c.campaign_id, ranked.c.id)
+        .limit(capacity * 4 + 20)
+    ).all()
+
+    # Ostatnie miejsca w limicie pozostają wolne dla badań interaktywnych
+    bulk_capacity = max_running - ADMISSION_INTERACTIVE_RESERVED - total
+    selected = []
+    for id, campaign_id, region, max_concurrency in candidates:
+        if len(selected) >= capacity:
+            break
+        if campaign_id is None:
+            selected.append(id)
+            by_region[region] = by_region.get(region, 0) + 1
+            bulk_capacity -= 1
+            continue
+        if bulk_capacity <= 0:
+            break
+        if by_region.get(region, 0) >= max_per_region:
+            continue
+        if max_concurrency is not None and by_campaign.get(campaign_id, 0) >= max_concurrency:
+            continue
+        selected.append(id)
+        by_region[region] = by_region.get(region, 0) + 1
+        by_campaign[campaign_id] = by_campaign.get(campaign_id, 0) + 1
+        bulk_capacity -= 1
+
+    if not selected:
+        return []
+
+    # Warunkowa zmiana statusu - badanie zwolnione równolegle przez inną replikę jest pomijane
+    released_ids = []
+    for id in selected:
+        result = db.session.execute(
+            update(Research)
+            .where(Research.id == id, Research.status == 'scheduled')
+            .values(status='queued')
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            released_ids.append(id)
+
+    released = Research.query.filter(Research.id.in_(released_ids)).all() if released_ids else []
+    if dispatch_mode() == 'push':
+        for research in released:
+            enqueue_dispatch(research.task_id, 'start', research.start_payload())
+    db.session.commit()
+
+    if released:
+        logger.info(f"Zwolniono {len(released)} zaplanowanych badań")
+    return released
@@ -0,0 +1,369 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import select, update
+
+from app.services.metrics import registry
+
+try:
+    import httpx
+except ImportError:  # httpx jest opcjonalny - bez niego zlecenia wysyła pula wątków (requests)
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+# Kody odpowiedzi document_processor oznaczające przyjęcie zlecenia
+# (409 - zadanie o tym task_id zostało już przyjęte wcześniej)
+ACCEPTED_STATUS_CODES = (200, 201, 202, 409)
+
+OUTBOUND_DURATION = registry.histogram(
+    'document_processor_request_duration_seconds', 'Czas wysłania zlecenia do document_processor',
+    labels=('action', 'outcome'))
+
+
+class OutboxDispatcher:
+    """Wysyłanie zleceń z tabeli outbox do document_processor w tle"""
+
+    def __init__(self, app, base_url, max_workers=4, max_attempts=5,
+                 backoff_base=1.0, backoff_max=60.0, poll_interval=2.0,
+                 timeout=10.0, stale_after=120.0, tick_hooks=()):
+        self.app = app
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.stale_after = stale_after
+        # Funkcje wywoływane w każdym cyklu przed pobraniem zleceń (np. harmonogram kampanii)
+        self.tick_hooks = list(tick_hooks)
+
+        # Pula połączeń keep-alive współdzielona przez wątki wysyłające
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='outbox')
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Uruchamia wątek dyspozytora"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True)
+        self._thread.start()
+        logger.info(f"Uruchomiono dyspozytor zleceń dla {self.base_url}")
+
+    def stop(self, timeout=None):
+        """Zatrzymuje wątek dyspozytora"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def wake(self):
+        """Budzi dyspozytor po dodaniu nowego zlecenia"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            sent = 0
+            try:
+                with self.app.app_context():
+                    self._run_tick_hooks()
+                    items = self._claim_batch()
+                if items:
+                    sent = len(items)
+                    self._dispatch(items)
+            except Exception as e:
+                logger.exception(f"Błąd w pętli dyspozytora zleceń: {str(e)}")
+
+            # Gdy kolejka była pełna, od razu pobieramy następną porcję
+            if not sent:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _run_tick_hooks(self):
+        from app.extensions import db
+
+        for hook in self.tick_hooks:
+            try:
+                hook()
+            except Exception as e:
+                db.session.rollback()
+                logger.exception(f"Błąd w zadaniu cyklicznym dyspozytora: {str(e)}")
+
+    def _claim_batch(self):
+        """Atomowo rezerwuje porcję zleceń gotowych do wysłania"""
+        from app.extensions import db
+        from app.models.research import ResearchDispatch
+
+        now = datetime.utcnow()
+
+        # Zlecenia porzucone w stanie "sending" (np. po restarcie procesu) wracają do kolejki
+        db.session.execute(
+            update(ResearchDispatch)
+            .where(ResearchDispatch.status == 'sending',
+                   ResearchDispatch.updated_at < now - timedelta(seconds=self.stale_after))
+            .values(status='pending', claim_token=None)
+            .execution_options(synchronize_session=False)
+        )
+
+        token = uuid.uuid4().hex
+        due = (
+            select(ResearchDispatch.id)
+            .where(ResearchDispatch.status == 'pending', ResearchDispatch.next_attempt_at <= now)
+            .order_by(ResearchDispatch.id)
+            .limit(self.max_workers * 2)
+        )
+        db.session.execute(
+            update(ResearchDispatch)
+            .where(ResearchDispatch.id.in_(due), ResearchDispatch.status == 'pending')
+            .values(status='sending', claim_token=token, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        return [
+            {'id': d.id, 'task_id': d.task_id, 'action': d.action,
+             'payload': d.payload, 'attempts': d.attempts}
+            for d in ResearchDispatch.query.filter_by(claim_token=token).all()
+        ]
+
+    def _dispatch(self, items):
+        """Wysyła porcję zleceń równolegle i czeka na zapisanie wyników"""
+        futures = [self._executor.submit(self._send, item) for item in items]
+        for future in futures:
+            future.result()
+
+    def _request_args(self, item):
+        return {
+            'url': f"{self.base_url}/api/deep_research/{item['action']}",
+            'json': item['payload'],
+            'headers': {'Idempotency-Key': f"{item['task_id']}:{item['action']}"},
+            'timeout': self.timeout
+        }
+
+    def _send(self, item):
+        """Wysyła jedno zlecenie i zapisuje wynik"""
+        error = None
+        outcome = 'accepted'
+        started = time.perf_counter()
+        try:
+            response = self.session.post(**self._request_args(item))
+            if response.status_code not in ACCEPTED_STATUS_CODES:
+                outcome = 'rejected'
+                error = f"Błąd podczas zlecania zadania: {response.status_code} {response.text}"
+        except requests.RequestException as e:
+            outcome = 'exception'
+            error = f"Wyjątek podczas zlecania zadania: {str(e)}"
+        except Exception as e:
+            outcome, error = _unexpected_error(item, e)
+        OUTBOUND_DURATION.observe(time.perf_counter() - started, action=item['action'], outcome=outcome)
+        self._record(item, error)
+
+    def _record(self, item, error):
+        """Zapisuje wynik wysłania zlecenia"""
+        try:
+            with self.app.app_context():
+                self._complete(item, error)
+        except Exception as e:
+            logger.exception(f"Błąd zapisu wyniku zlecenia {item['task_id']}: {str(e)}")
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _complete(self, item, error):
+        from app.extensions import db
+        from app.models.research import Research, ResearchDispatch
+        from app.services.progress_events import progress_broker
+        from app.services.http_cache import response_cache
+
+        dispatch = ResearchDispatch.query.get(item['id'])
+        if dispatch is None or dispatch.status != 'sending':
+            return
+        research = Research.query.filter_by(task_id=item['task_id']).first()
+
+        dispatch.attempts = item['attempts'] + 1
+        dispatch.claim_token = None
+        now = datetime.utcnow()
+
+        if error is None:
+            dispatch.status = 'sent'
+            dispatch.last_error = None
+            if research is not None:
+                if item['action'] == 'start' and research.status == 'queued':
+                    research.status = 'running'
+                    research.start_time = now
+                elif item['action'] == 'stop' and research.status in ('running', 'queued'):
+                    research.status = 'stopped'
+                    research.end_time = now
+        else:
+            logger.warning(f"Zlecenie {item['task_id']}:{item['action']} nieudane "
+                           f"(próba {dispatch.attempts}): {error}")
+            dispatch.last_error = error
+            if dispatch.attempts >= self.max_attempts:
+                dispatch.status = 'failed'
+                if research is not None and item['action'] == 'start' and research.status == 'queued':
+                    research.status = 'failed'
+                    research.error_message = error
+                    research.end_time = now
+            else:
+                dispatch.status = 'pending'
+                dispatch.next_attempt_at = now + timedelta(seconds=self._backoff(dispatch.attempts))
+
+        db.session.commit()
+        if research is not None:
+            response_cache.invalidate(('research', research.task_id))
+            progress_broker.publish(research.task_id, research.to_progress_dict())
+
+
+class AsyncOutboxDispatcher(OutboxDispatcher):
+    """Dyspozytor wysyłający zlecenia klientem httpx w pętli asyncio serwera ASGI
+
+    Wolny document_processor nie zajmuje wątków - jednocześnie trwa tyle wywołań,
+    ile wynosi max_workers, a wątek dyspozytora tylko rezerwuje zlecenia i zapisuje wyniki.
+    """
+
+    def __init__(self, app, base_url, loop, **kwargs):
+        super().__init__(app, base_url, **kwargs)
+        self.loop = loop
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_workers, max_keepalive_connections=self.max_workers)
+        )
+
+    def stop(self, timeout=None):
+        super().stop(timeout)
+        if not self.loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop)
+
+    def _dispatch(self, items):
+        futures = [asyncio.run_coroutine_threadsafe(self._send_async(item), self.loop) for item in items]
+        results = [future.result() for future in futures]
+        # Zapis wyników w wątku dyspozytora - zapytania do bazy nie blokują pętli
+        for item, error in zip(items, results):
+            self._record(item, error)
+
+    async def _send_async(self, item):
+        error = None
+        outcome = 'accepted'
+        started = time.perf_counter()
+        try:
+            args = self._request_args(item)
+            response = await self.client.post(args.pop('url'), **args)
+            if response.status_code not in ACCEPTED_STATUS_CODES:
+                outcome = 'rejected'
+                error = f"Błąd podczas zlecania zadania: {response.status_code} {response.text}"
+        except httpx.HTTPError as e:
+            outcome = 'exception'
+            error = f"Wyjątek podczas zlecania zadania: {str(e)}"
+        except Exception as e:
+            outcome, error = _unexpected_error(item, e)
+        OUTBOUND_DURATION.observe(time.perf_counter() - started, action=item['action'], outcome=outcome)
+        return error
+
+
+def _unexpected_error(item, error):
+    """Błąd inny niż błąd połączenia (np. serializacja treści) jako wynik nieudanej próby"""
+    # Zapisana próba zwiększa attempts - zlecenie nie zostaje w "sending" i nie wraca bez końca
+    logger.exception(f"Nieoczekiwany błąd podczas zlecania zadania {item['task_id']}: {str(error)}")
+    return 'error', f"Nieoczekiwany błąd podczas zlecania zadania: {str(error)}"
+
+
+def enqueue_dispatch(task_id, action, payload):
+    """Dodaje (lub ponawia) zlecenie w kolejce wychodzącej - w bieżącej transakcji"""
+    from app.extensions import db
+    from app.models.research import ResearchDispatch
+
+    dispatch = ResearchDispatch.query.filter_by(task_id=task_id, action=action).first()
+    if dispatch is None:
+        dispatch = ResearchDispatch(task_id=task_id, action=action)
+        db.session.add(dispatch)
+    elif dispatch.status in ('pending', 'sending', 'sent'):
+        # Idempotencja - to samo zlecenie nie jest wysyłane ponownie
+        return dispatch
+
+    dispatch.payload = payload
+    dispatch.status = 'pending'
+    dispatch.attempts = 0
+    dispatch.last_error = None
+    dispatch.next_attempt_at = datetime.utcnow()
+    return dispatch
+
+
+def dispatch_mode():
+    """Tryb przekazywania zadań: push (outbox) lub pull (dzierżawy przez /claim)"""
+    return os.environ.get('RESEARCH_DISPATCH_MODE', 'push')
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+# Pętla asyncio serwera ASGI (app/asgi.py) - zlecenia wysyłane są wtedy asynchronicznie
+_event_loop = None
+
+
+def use_event_loop(loop):
+    """Rejestruje pętlę asyncio, na której dyspozytor ma wysyłać zlecenia (tryb ASGI)"""
+    global _event_loop
+    _event_loop = loop
+
+
+def dispatcher_enabled():
+    """Czy dyspozytor ma działać w tym procesie (zmienna DISPATCHER_ENABLED)"""
+    return os.environ.get('DISPATCHER_ENABLED', '1') == '1'
+
+
+def ensure_dispatcher(app, tick_hooks=()):
+    """Uruchamia dyspozytor w bieżącym procesie (jednorazowo)"""
+    global _dispatcher
+    if _dispatcher is not None or not dispatcher_enabled():
+        return _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            options = dict(
+                base_url=os.environ.get('DOCUMENT_PROCESSOR_URL', 'http://document_processor:5000'),
+                max_workers=int(os.environ.get('DISPATCHER_MAX_WORKERS', 4)),
+                max_attempts=int(os.environ.get('DISPATCHER_MAX_ATTEMPTS', 5)),
+                backoff_base=float(os.environ.get('DISPATCHER_BACKOFF_BASE', 1.0)),
+                timeout=float(os.environ.get('DISPATCHER_TIMEOUT', 10.0)),
+                tick_hooks=tick_hooks
+            )
+            if _event_loop is not None and httpx is not None:
+                dispatcher = AsyncOutboxDispatcher(app, loop=_event_loop, **options)
+            else:
+                dispatcher = OutboxDispatcher(app, **options)
+            dispatcher.start()
+            _dispatcher = dispatcher
+    return _dispatcher
+
+
+def notify_dispatcher():
+    """Budzi dyspozytor, jeśli działa w tym procesie"""
+    if _dispatcher is not None:
+        _dispatcher.wake()
+
+
+def stop_dispatcher(timeout=None):
+    """Zatrzymuje dyspozytor działający w tym procesie (zamykanie serwera)"""
+    global _dispatcher
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        dispatcher.stop(timeout)
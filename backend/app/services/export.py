@@ -0,0 +1,139 @@
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+
+from flask import current_app, request, stream_with_context
+from sqlalchemy import func
+
+from app.extensions import db
+from app.services.serialization import InvalidFields, json_bytes
+from app.services.sql_time import parse_utc
+
+# Liczba wierszy pobieranych jednym zapytaniem eksportu
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 1000))
+# Poziom kompresji gzip (szybkość ważniejsza niż rozmiar)
+EXPORT_GZIP_LEVEL = int(os.environ.get('EXPORT_GZIP_LEVEL', 6))
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+class InvalidExport(ValueError):
+    """Nieobsługiwany format lub parametr eksportu"""
+
+
+def parse_format(value):
+    value = value or 'ndjson'
+    if value not in EXPORT_FORMATS:
+        raise InvalidExport(f"Nieobsługiwany format eksportu: {value} (dostępne: {', '.join(EXPORT_FORMATS)})")
+    return value
+
+
+def export_params(field_set):
+    """Parametry eksportu z żądania: format, pola, since i kompresja gzip (Accept-Encoding)"""
+    export_format = parse_format(request.args.get('format'))
+    try:
+        fields = field_set.parse(request.args.get('fields'))
+    except InvalidFields as e:
+        raise InvalidExport(str(e))
+    fields = fields or field_set.names + list(field_set.expressions)
+
+    since = None
+    if request.args.get('since'):
+        try:
+            since = parse_utc(request.args['since'])
+        except ValueError:
+            raise InvalidExport('Niepoprawny format daty (oczekiwano ISO 8601)')
+    return export_format, fields, since, request.accept_encodings['gzip'] > 0
+
+
+def since_filter(column, since):
+    """Warunek eksportu przyrostowego (rekordy zmienione od danej chwili)"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        # SQLite porównuje daty jako tekst - ujednolicamy format (importer zapisywał daty z "T"
+        # zamiast spacji, CURRENT_TIMESTAMP - bez części ułamkowej)
+        return func.strftime('%Y-%m-%d %H:%M:%f', column) >= since.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+    return column >= since
+
+
+def iter_chunks(query, id_column, chunk_size=None):
+    """Wiersze zapytania porcjami według klucza id - pamięć nie zależy od liczby rekordów"""
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    last_id = None
+    while True:
+        chunk_query = query if last_id is None else query.filter(id_column > last_id)
+        rows = chunk_query.order_by(id_column).limit(chunk_size).all()
+        # Każda porcja we własnej transakcji - długi eksport nie blokuje punktów kontrolnych WAL
+        db.session.close()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1].id
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def encode_ndjson(chunks, serialize):
+    for rows in chunks:
+        yield b''.join(json_bytes(serialize(row)) + b'\n' for row in rows)
+
+
+def encode_csv(chunks, serialize, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for rows in chunks:
+        for row in rows:
+            item = serialize(row)
+            writer.writerow([_csv_value(item[name]) for name in fields])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_stream(parts):
+    """Kompresja gzip strumienia bajtów bez buforowania całości"""
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+    for part in parts:
+        data = compressor.compress(part)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(query, id_column, serializer, fields, export_format, filename, compress=False):
+    """Odpowiedź strumieniowa eksportu (NDJSON lub CSV, opcjonalnie gzip)"""
+    # Znacznik do kolejnego eksportu przyrostowego (since=) - ustalany przed pierwszym zapytaniem
+    watermark = datetime.utcnow().replace(microsecond=0)
+    serialize = serializer(fields)
+    chunks = iter_chunks(query, id_column)
+    if export_format == 'csv':
+        body = encode_csv(chunks, serialize, fields)
+    else:
+        body = encode_ndjson(chunks, serialize)
+    if compress:
+        body = gzip_stream(body)
+
+    response = current_app.response_class(
+        stream_with_context(body), content_type=EXPORT_FORMATS[export_format], direct_passthrough=True
+    )
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    response.headers['X-Export-Watermark'] = watermark.isoformat()
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
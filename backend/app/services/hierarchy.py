@@ -0,0 +1,127 @@
+from app.services.import_generation import GenerationCache
+
+
+class AdministrativeHierarchy:
+    """Migawka podziału administracyjnego: województwo → powiat → gmina"""
+
+    def __init__(self, rows, generation=None):
+        self.generation = generation
+        voivodeships = {}
+        counties = {}
+        type_counts = {}
+
+        for id, teryt_code, name, type, v_code, v_name, c_code, c_name in rows:
+            voivodeship = voivodeships.setdefault(v_code, {
+                'code': v_code,
+                'name': v_name,
+                'municipality_count': 0,
+                'counties': []
+            })
+            voivodeship['municipality_count'] += 1
+
+            county = counties.get(c_code)
+            if county is None:
+                county = counties[c_code] = {
+                    'code': c_code,
+                    'name': c_name,
+                    'voivodeship_code': v_code,
+                    'voivodeship_name': v_name,
+                    'municipality_count': 0,
+                    'municipalities': []
+                }
+                voivodeship['counties'].append(county)
+            county['municipality_count'] += 1
+            county['municipalities'].append({
+                'id': id,
+                'teryt_code': teryt_code,
+                'name': name,
+                'type': type
+            })
+
+            type_counts[type] = type_counts.get(type, 0) + 1
+
+        # Sortowanie zgodne z dotychczasowymi odpowiedziami API
+        self.tree = sorted(voivodeships.values(), key=lambda v: v['name'] or '')
+        for voivodeship in self.tree:
+            voivodeship['counties'].sort(key=lambda c: c['name'] or '')
+            for county in voivodeship['counties']:
+                county['municipalities'].sort(key=lambda m: (m['name'], m['teryt_code']))
+
+        self.voivodeships = [{'code': v['code'], 'name': v['name']} for v in self.tree]
+
+        # Listy powiatów bez gmin (pomijamy powiaty bez nazwy)
+        county_items = sorted(
+            (c for c in counties.values() if c['name']),
+            key=lambda c: c['name']
+        )
+        self.counties = [
+            {
+                'code': c['code'],
+                'name': c['name'],
+                'voivodeship_code': c['voivodeship_code'],
+                'voivodeship_name': c['voivodeship_name']
+            }
+            for c in county_items
+        ]
+        self.counties_by_voivodeship = {}
+        for county in self.counties:
+            self.counties_by_voivodeship.setdefault(county['voivodeship_code'], []).append(county)
+
+        self.types = sorted(type_counts)
+        self.type_counts = type_counts
+        self.municipality_count = len(rows)
+
+    def get_counties(self, voivodeship_code=None):
+        """Zwraca listę powiatów, opcjonalnie dla jednego województwa"""
+        if voivodeship_code:
+            return self.counties_by_voivodeship.get(voivodeship_code, [])
+        return self.counties
+
+    def to_dict(self):
+        """Konwertuje całą hierarchię do słownika"""
+        return {
+            'generation': self.generation,
+            'municipality_count': self.municipality_count,
+            'types': [{'name': t, 'municipality_count': self.type_counts[t]} for t in self.types],
+            'voivodeships': self.tree
+        }
+
+
+def _build_hierarchy():
+    from app.models.municipality import Municipality
+    from app.services.import_generation import current_generation
+    from app.services.municipality_snapshot import get_snapshot
+
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        rows = list(snapshot.iter_columns(
+            'id', 'teryt_code', 'name', 'type',
+            'voivodeship_code', 'voivodeship_name', 'county_code', 'county_name'
+        ))
+        return AdministrativeHierarchy(rows, generation=current_generation())
+
+    rows = Municipality.query.with_entities(
+        Municipality.id,
+        Municipality.teryt_code,
+        Municipality.name,
+        Municipality.type,
+        Municipality.voivodeship_code,
+        Municipality.voivodeship_name,
+        Municipality.county_code,
+        Municipality.county_name
+    ).all()
+    return AdministrativeHierarchy(rows, generation=current_generation())
+
+
+# Migawka współdzielona w procesie, przebudowywana po każdym imporcie TERYT
+_hierarchy_cache = GenerationCache(_build_hierarchy)
+
+
+def get_hierarchy():
+    """Zwraca aktualną migawkę podziału administracyjnego"""
+    return _hierarchy_cache.get()
+
+
+def invalidate_hierarchy():
+    """Wymusza przebudowę migawki przy następnym odczycie"""
+    _hierarchy_cache.invalidate()
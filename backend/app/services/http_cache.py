@@ -0,0 +1,95 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import timezone
+
+from flask import current_app, request
+
+# Maksymalna liczba odpowiedzi przechowywanych w pamięci procesu
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 2048))
+
+
+class ResponseCache:
+    """Ograniczony cache LRU zserializowanych odpowiedzi, walidowany przez ETag"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, etag):
+        """Zwraca treść odpowiedzi, jeśli w cache jest wersja o tym samym ETag"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, etag, body):
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Usuwa odpowiedź z cache (po zapisie zasobu)"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Cache współdzielony w procesie
+response_cache = ResponseCache()
+
+
+def make_etag(*parts):
+    """Buduje ETag z wersji zasobu (np. updated_at, generacja importu)"""
+    raw = '\x1f'.join('' if p is None else str(p) for p in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def _not_modified(etag, last_modified):
+    """Czy klient ma aktualną wersję zasobu
+
+    Przy znanym ETag rozstrzyga tylko If-None-Match. If-Modified-Since ma dokładność
+    do sekundy - zmiana w tej samej sekundzie co poprzedni odczyt dałaby fałszywe 304.
+    """
+    if etag is not None:
+        return bool(request.if_none_match) and request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def conditional_json(key, etag, last_modified, build):
+    """Odpowiedź JSON z obsługą If-None-Match/If-Modified-Since i cache treści"""
+    if last_modified is not None and last_modified.tzinfo is None:
+        # Daty w bazie są zapisywane w UTC bez strefy czasowej
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+
+    if _not_modified(etag, last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        body = response_cache.get(key, etag)
+        if body is None:
+            body = current_app.json.dumps(build()).encode('utf-8')
+            response_cache.put(key, etag, body)
+        response = current_app.response_class(body, mimetype='application/json')
+
+    if etag is not None:
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Klient może przechowywać odpowiedź, ale musi ją walidować przy każdym użyciu
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+
+# Plik znacznika generacji zapisywany przez scripts/import_teryt_data.py
+DATA_DIR = os.environ.get('DATA_DIR', '/app/data')
+GENERATION_FILE = os.path.join(DATA_DIR, 'teryt_generation')
+
+# Jak często (w sekundach) sprawdzamy znacznik na dysku
+CHECK_INTERVAL = 1.0
+
+_lock = threading.Lock()
+_state = {'checked_at': 0.0, 'mtime_ns': None, 'generation': '0'}
+
+
+def current_generation():
+    """Zwraca aktualną generację importu danych TERYT"""
+    now = time.monotonic()
+    if now - _state['checked_at'] < CHECK_INTERVAL:
+        return _state['generation']
+
+    with _lock:
+        if now - _state['checked_at'] < CHECK_INTERVAL:
+            return _state['generation']
+
+        try:
+            mtime_ns = os.stat(GENERATION_FILE).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+
+        if mtime_ns != _state['mtime_ns']:
+            generation = '0'
+            if mtime_ns is not None:
+                try:
+                    with open(GENERATION_FILE, 'r', encoding='utf-8') as f:
+                        generation = f.read().strip() or str(mtime_ns)
+                except OSError:
+                    generation = str(mtime_ns)
+            _state['mtime_ns'] = mtime_ns
+            _state['generation'] = generation
+
+        _state['checked_at'] = now
+        return _state['generation']
+
+
+class GenerationCache:
+    """Wartość budowana raz na generację importu i współdzielona w procesie"""
+
+    def __init__(self, builder):
+        self._builder = builder
+        self._lock = threading.Lock()
+        # Generacja i wartość w jednej krotce - odczyt bez blokady widzi spójną parę
+        self._entry = (None, None)
+
+    def get(self):
+        """Zwraca wartość, przebudowując ją po zmianie generacji importu"""
+        generation = current_generation()
+        entry = self._entry
+        if entry[0] != generation:
+            with self._lock:
+                entry = self._entry
+                if entry[0] != generation:
+                    entry = (generation, self._builder())
+                    self._entry = entry
+        return entry[1]
+
+    @property
+    def generation(self):
+        """Generacja, z której zbudowano bieżącą wartość"""
+        return self._entry[0]
+
+    def invalidate(self):
+        """Wymusza przebudowę przy następnym odczycie"""
+        with self._lock:
+            self._entry = (None, None)
@@ -0,0 +1,274 @@
+import bisect
+import heapq
+import unicodedata
+
+from app.services.import_generation import GenerationCache
+
+# Polskie znaki diakrytyczne (ł nie rozkłada się w NFKD, dlatego mapujemy ręcznie)
+_FOLD_TABLE = str.maketrans({
+    'ą': 'a', 'ć': 'c', 'ę': 'e', 'ł': 'l', 'ń': 'n',
+    'ó': 'o', 'ś': 's', 'ź': 'z', 'ż': 'z',
+})
+
+# Rozmiary n-gramów używanych do wyszukiwania infiksowego (1 - pojedyncze znaki w zapytaniach typu "nowa g")
+NGRAM_SIZES = (1, 2, 3)
+
+# Wagi trafień w poszczególnych polach
+SCORE_NAME_EXACT = 100
+SCORE_NAME_PREFIX = 80
+SCORE_TERYT_PREFIX = 70
+SCORE_NAME_WORD_PREFIX = 60
+SCORE_NAME_INFIX = 40
+SCORE_COUNTY_PREFIX = 25
+SCORE_COUNTY_INFIX = 20
+SCORE_VOIVODESHIP_PREFIX = 15
+SCORE_VOIVODESHIP_INFIX = 10
+SCORE_DIACRITICS_BONUS = 2
+
+
+def fold(text):
+    """Normalizuje tekst: małe litery, bez polskich znaków diakrytycznych"""
+    if not text:
+        return ''
+    text = text.lower().translate(_FOLD_TABLE)
+    if text.isascii():
+        return text
+    return ''.join(
+        c for c in unicodedata.normalize('NFKD', text)
+        if not unicodedata.combining(c)
+    )
+
+
+def _ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class _Entry:
+    """Wpis indeksu dla pojedynczej gminy"""
+
+    __slots__ = ('id', 'payload', 'name', 'name_lower', 'name_words',
+                 'teryt', 'county', 'voivodeship', 'sort_key')
+
+    def __init__(self, payload):
+        self.id = payload['id']
+        self.payload = payload
+        self.name_lower = (payload['name'] or '').lower()
+        self.name = fold(payload['name'])
+        self.name_words = tuple(self.name.replace('-', ' ').split())
+        self.teryt = payload['teryt_code'] or ''
+        self.county = fold(payload['county_name'])
+        self.voivodeship = fold(payload['voivodeship_name'])
+        self.sort_key = (len(self.name), self.name, self.teryt)
+
+
+class MunicipalitySearchIndex:
+    """Indeks wyszukiwania gmin w pamięci (prefiksy, n-gramy, ranking)"""
+
+    def __init__(self, payloads):
+        # Wpisy w kolejności rozstrzygania remisów - pozycja wpisu jest jego rangą
+        self.entries = sorted((_Entry(p) for p in payloads), key=lambda e: e.sort_key)
+        self.by_id = {e.id: e.payload for e in self.entries}
+        self.by_teryt = {e.teryt: e.payload for e in self.entries if e.teryt}
+
+        # Posortowane klucze do wyszukiwania prefiksowego
+        self._names = sorted((e.name, idx) for idx, e in enumerate(self.entries))
+        self._words = sorted(
+            (word, idx) for idx, e in enumerate(self.entries) for word in set(e.name_words)
+        )
+        self._teryts = sorted((e.teryt, idx) for idx, e in enumerate(self.entries))
+
+        # Indeksy n-gramowe dla wyszukiwania infiksowego, osobno dla każdego pola
+        self._postings = {
+            field: self._build_postings(field)
+            for field in ('name', 'county', 'voivodeship')
+        }
+
+    def _build_postings(self, field):
+        postings = {}
+        for idx, entry in enumerate(self.entries):
+            value = getattr(entry, field)
+            for n in NGRAM_SIZES:
+                for gram in _ngrams(value, n):
+                    postings.setdefault(gram, []).append(idx)
+        return postings
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _prefix_range(keys, token):
+        """Zwraca indeksy wpisów, których klucz zaczyna się od tokenu"""
+        start = bisect.bisect_left(keys, (token,))
+        result = []
+        for key, idx in keys[start:]:
+            if not key.startswith(token):
+                break
+            result.append(idx)
+        return result
+
+    def _infix(self, field, token):
+        """Zwraca (rosnąco) indeksy wpisów, których pole zawiera token"""
+        n = min(len(token), NGRAM_SIZES[-1])
+        postings = self._postings[field]
+        shortest = None
+        for gram in _ngrams(token, n):
+            posting = postings.get(gram)
+            if not posting:
+                return []
+            if shortest is None or len(posting) < len(shortest):
+                shortest = posting
+        if len(token) == n:
+            return shortest
+        return [idx for idx in shortest if token in getattr(self.entries[idx], field)]
+
+    def _tiers(self, token):
+        """Generuje kolejne poziomy trafności dla pojedynczego tokenu"""
+        prefix = self._prefix_range(self._names, token)
+        yield sorted(idx for idx in prefix if self.entries[idx].name == token)
+        yield sorted(prefix)
+        if token.isdigit():
+            yield sorted(self._prefix_range(self._teryts, token))
+        yield sorted(set(self._prefix_range(self._words, token)))
+        yield self._infix('name', token)
+        county = self._infix('county', token)
+        yield [idx for idx in county if self.entries[idx].county.startswith(token)]
+        yield county
+        voivodeship = self._infix('voivodeship', token)
+        yield [idx for idx in voivodeship if self.entries[idx].voivodeship.startswith(token)]
+        yield voivodeship
+
+    def _search_single(self, token, raw_token, limit):
+        result = []
+        seen = set()
+        diacritics = raw_token != token
+        for tier in self._tiers(token):
+            hits = [idx for idx in tier if idx not in seen]
+            if diacritics:
+                # Dokładne dopasowanie z polskimi znakami ("łódź" przed "lodz")
+                hits.sort(key=lambda idx: raw_token not in self.entries[idx].name_lower)
+            for idx in hits:
+                seen.add(idx)
+                result.append(idx)
+                if len(result) >= limit:
+                    return result
+        return result
+
+    @staticmethod
+    def _score_token(entry, token, raw_token):
+        score = 0
+        if entry.name == token:
+            score = SCORE_NAME_EXACT
+        elif entry.name.startswith(token):
+            score = SCORE_NAME_PREFIX
+        elif any(word.startswith(token) for word in entry.name_words):
+            score = SCORE_NAME_WORD_PREFIX
+        elif token in entry.name:
+            score = SCORE_NAME_INFIX
+
+        if token.isdigit() and entry.teryt.startswith(token):
+            score = max(score, SCORE_TERYT_PREFIX)
+
+        if entry.county.startswith(token):
+            score = max(score, SCORE_COUNTY_PREFIX)
+        elif token in entry.county:
+            score = max(score, SCORE_COUNTY_INFIX)
+
+        if entry.voivodeship.startswith(token):
+            score = max(score, SCORE_VOIVODESHIP_PREFIX)
+        elif token in entry.voivodeship:
+            score = max(score, SCORE_VOIVODESHIP_INFIX)
+
+        if score and raw_token != token and raw_token in entry.name_lower:
+            score += SCORE_DIACRITICS_BONUS
+        return score
+
+    def _search_multi(self, tokens, raw_tokens, limit):
+        # Kandydaci: wpisy, w których każdy token występuje w którymś z pól
+        candidates = None
+        for token in tokens:
+            found = set(self._infix('name', token))
+            found.update(self._infix('county', token))
+            found.update(self._infix('voivodeship', token))
+            if token.isdigit():
+                found.update(self._prefix_range(self._teryts, token))
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                return []
+
+        scored = []
+        for idx in candidates:
+            entry = self.entries[idx]
+            total = 0
+            for token, raw_token in zip(tokens, raw_tokens):
+                score = self._score_token(entry, token, raw_token)
+                if not score:
+                    break
+                total += score
+            else:
+                scored.append((-total, idx))
+        return [idx for _, idx in heapq.nsmallest(limit, scored)]
+
+    def search_ids(self, query, limit=20):
+        """Zwraca identyfikatory gmin posortowane według trafności"""
+        raw_tokens = (query or '').lower().split()
+        tokens = [fold(t) for t in raw_tokens]
+        if not tokens or limit <= 0:
+            return []
+
+        if len(tokens) == 1:
+            found = self._search_single(tokens[0], raw_tokens[0], limit)
+        else:
+            found = self._search_multi(tokens, raw_tokens, limit)
+        return [self.entries[idx].id for idx in found]
+
+    def search(self, query, limit=20):
+        """Zwraca słowniki gmin posortowane według trafności"""
+        return [self.by_id[i] for i in self.search_ids(query, limit)]
+
+
+def _build_index():
+    from app.models.municipality import Municipality
+    from app.services.municipality_snapshot import get_snapshot
+
+    # Migawka z importu - bez zapytania do bazy i budowania obiektów ORM
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return MunicipalitySearchIndex(snapshot.rows())
+
+    municipalities = Municipality.query.order_by(Municipality.id).all()
+    return MunicipalitySearchIndex([m.to_dict() for m in municipalities])
+
+
+# Indeks współdzielony w procesie, przebudowywany po każdym imporcie TERYT
+_index_cache = GenerationCache(_build_index)
+
+
+def get_search_index():
+    """Zwraca aktualny indeks wyszukiwania gmin"""
+    return _index_cache.get()
+
+
+def invalidate_search_index():
+    """Wymusza przebudowę indeksu przy następnym wyszukiwaniu"""
+    _index_cache.invalidate()
+
+
+def lookup_municipalities(ids=(), teryt_codes=()):
+    """Zwraca gminy (słowniki) po id i kodach TERYT - z indeksu w pamięci, brakujące jednym zapytaniem IN"""
+    from app.models.municipality import Municipality
+
+    index = get_search_index()
+    by_id = {i: index.by_id[i] for i in ids if i in index.by_id}
+    by_teryt = {t: index.by_teryt[t] for t in teryt_codes if t in index.by_teryt}
+
+    # Gminy dodane po zbudowaniu indeksu
+    missing_ids = [i for i in ids if i not in by_id]
+    missing_teryt = [t for t in teryt_codes if t not in by_teryt]
+    if missing_ids:
+        for m in Municipality.query.filter(Municipality.id.in_(missing_ids)).all():
+            by_id[m.id] = m.to_dict()
+    if missing_teryt:
+        for m in Municipality.query.filter(Municipality.teryt_code.in_(missing_teryt)).all():
+            by_teryt[m.teryt_code] = m.to_dict()
+
+    return by_id, by_teryt
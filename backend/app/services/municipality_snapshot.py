@@ -0,0 +1,289 @@
+import array
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+from datetime import datetime
+
+from app.services.import_generation import DATA_DIR, GenerationCache, current_generation
+
+logger = logging.getLogger(__name__)
+
+# Binarna migawka gmin zapisywana przez scripts/import_teryt_data.py
+SNAPSHOT_FILE = os.path.join(DATA_DIR, 'municipalities.snapshot')
+# Migawkę można wyłączyć (MUNICIPALITY_SNAPSHOT=0) - odczyty wracają wtedy do bazy
+SNAPSHOT_ENABLED = os.environ.get('MUNICIPALITY_SNAPSHOT', '1') == '1'
+
+SNAPSHOT_MAGIC = b'MUNSNAP\0'
+SNAPSHOT_VERSION = 1
+_PREAMBLE = struct.Struct('<8sII')
+
+# Kolumny migawki: nazwa -> typ ('i' - int32, 'd' - float64, 's' - indeks w tablicy napisów)
+SNAPSHOT_COLUMNS = [
+    ('id', 'i'), ('teryt_code', 's'), ('name', 's'), ('type', 's'),
+    ('voivodeship_code', 's'), ('voivodeship_name', 's'), ('county_code', 's'), ('county_name', 's'),
+    ('lat', 'd'), ('lng', 'd'), ('population', 'i'), ('area', 'd'),
+    ('bip_url', 's'), ('official_website', 's'), ('updated_at', 's'),
+]
+# Pola słownika gminy (jak Municipality.to_dict)
+ROW_FIELDS = [name for name, _ in SNAPSHOT_COLUMNS if name != 'updated_at']
+# Kolumny z zapisanym porządkiem sortowania (sortowanie listy gmin bez przeglądania danych)
+SORTED_COLUMNS = ['name', 'voivodeship_name', 'county_name', 'type', 'population', 'area']
+
+# Wartości oznaczające NULL
+INT_NULL = -2 ** 31
+STRING_NULL = 2 ** 32 - 1
+
+
+class InvalidSnapshot(ValueError):
+    """Plik migawki jest uszkodzony lub w nieobsługiwanej wersji"""
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _sort_key(value):
+    # NULL na początku przy sortowaniu rosnącym (jak w SQLite)
+    return (value is not None, value if value is not None else 0)
+
+
+def write_snapshot(path, rows, generation):
+    """Zapisuje migawkę gmin (kolumny + tablica napisów) atomowo; zwraca liczbę gmin"""
+    rows = sorted(rows, key=lambda r: r['id'])
+    strings = {}
+
+    def string_ref(value):
+        if value is None:
+            return STRING_NULL
+        value = value.isoformat() if isinstance(value, datetime) else str(value)
+        return strings.setdefault(value, len(strings))
+
+    blocks = []
+    columns = []
+    for name, kind in SNAPSHOT_COLUMNS:
+        values = [r.get(name) for r in rows]
+        if kind == 'i':
+            data = array.array('i', (INT_NULL if v is None else int(v) for v in values))
+        elif kind == 'd':
+            data = array.array('d', (math.nan if v is None else float(v) for v in values))
+        else:
+            data = array.array('I', (string_ref(v) for v in values))
+        columns.append({'name': name, 'type': kind})
+        blocks.append(('column', name, data))
+
+    # Wiersze są posortowane według id, a sortowanie jest stabilne - remisy zawsze w kolejności id
+    for name in SORTED_COLUMNS:
+        for suffix, reverse in (('', False), (':desc', True)):
+            order = sorted(range(len(rows)), key=lambda i: _sort_key(rows[i].get(name)), reverse=reverse)
+            blocks.append(('order', name + suffix, array.array('I', order)))
+    teryt_order = sorted(range(len(rows)), key=lambda i: rows[i]['teryt_code'] or '')
+    blocks.append(('order', 'teryt_code', array.array('I', teryt_order)))
+
+    encoded = [s.encode('utf-8') for s in strings]
+    string_offsets = array.array('I', [0])
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+    blocks.append(('strings', 'offsets', string_offsets))
+    blocks.append(('strings', 'data', b''.join(encoded)))
+
+    # Nagłówek opisuje położenie bloków; bloki są wyrównane do 8 bajtów
+    layout = {'column': {}, 'order': {}, 'strings': {}}
+    header = {
+        'generation': str(generation),
+        'count': len(rows),
+        'byteorder': sys.byteorder,
+        'columns': columns,
+        'string_count': len(encoded),
+        'layout': layout,
+    }
+    # Rozmiar nagłówka zależy od przesunięć - rezerwujemy miejsce z zapasem
+    payloads = [(kind, name, data if isinstance(data, bytes) else data.tobytes()) for kind, name, data in blocks]
+    header_size = 4096 + 64 * len(payloads)
+    offset = _align(_PREAMBLE.size + header_size)
+    for kind, name, payload in payloads:
+        layout[kind][name] = [offset, len(payload)]
+        offset = _align(offset + len(payload))
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    if len(header_bytes) > header_size:
+        raise InvalidSnapshot('Nagłówek migawki przekracza zarezerwowany rozmiar')
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for kind, name, payload in payloads:
+            f.seek(layout[kind][name][0])
+            f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    # Zamiana atomowa - procesy z otwartą starą migawką dalej czytają poprzedni plik
+    os.replace(tmp_path, path)
+    return len(rows)
+
+
+class _StringColumn:
+    """Kolumna tekstowa czytana z tablicy napisów (dekodowanie przy odczycie)"""
+
+    __slots__ = ('refs', 'snapshot')
+
+    def __init__(self, refs, snapshot):
+        self.refs = refs
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return len(self.refs)
+
+    def __getitem__(self, index):
+        return self.snapshot.string(self.refs[index])
+
+
+class _NullableColumn:
+    """Kolumna liczbowa z zamianą wartości NULL na None"""
+
+    __slots__ = ('values', 'is_null')
+
+    def __init__(self, values, is_null):
+        self.values = values
+        self.is_null = is_null
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        value = self.values[index]
+        return None if self.is_null(value) else value
+
+
+class MunicipalitySnapshot:
+    """Migawka gmin odwzorowana w pamięci (mmap) - strony współdzielone przez procesy robocze"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        try:
+            magic, version, header_length = _PREAMBLE.unpack_from(buffer, 0)
+        except struct.error:
+            raise InvalidSnapshot('Plik migawki jest za krótki')
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise InvalidSnapshot(f'Nieobsługiwany format migawki (wersja {version})')
+        header = json.loads(bytes(buffer[_PREAMBLE.size:_PREAMBLE.size + header_length]))
+        if header['byteorder'] != sys.byteorder:
+            raise InvalidSnapshot('Migawka zapisana z inną kolejnością bajtów')
+
+        def block(kind, name, fmt=None):
+            start, length = header['layout'][kind][name]
+            if start + length > len(buffer):
+                raise InvalidSnapshot('Plik migawki jest niekompletny')
+            view = buffer[start:start + length]
+            return view.cast(fmt) if fmt else view
+
+        self.path = path
+        self.generation = header['generation']
+        self.count = header['count']
+        self._string_offsets = block('strings', 'offsets', 'I')
+        self._string_data = block('strings', 'data')
+
+        # Widoki kolumn bez kopiowania danych (memoryview na mmap)
+        self.columns = {}
+        for column in header['columns']:
+            name, kind = column['name'], column['type']
+            if kind == 's':
+                self.columns[name] = _StringColumn(block('column', name, 'I'), self)
+            elif kind == 'i':
+                self.columns[name] = _NullableColumn(block('column', name, 'i'), INT_NULL.__eq__)
+            else:
+                self.columns[name] = _NullableColumn(block('column', name, 'd'), math.isnan)
+        self._ids = block('column', 'id', 'i')
+        self.orders = {name: block('order', name, 'I') for name in header['layout']['order']}
+
+    def __len__(self):
+        return self.count
+
+    def string(self, ref):
+        if ref == STRING_NULL:
+            return None
+        return str(self._string_data[self._string_offsets[ref]:self._string_offsets[ref + 1]], 'utf-8')
+
+    def find_id(self, id):
+        """Pozycja gminy o danym id (wyszukiwanie binarne) lub None"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._ids[middle] < id:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < self.count and self._ids[low] == id else None
+
+    def find_teryt(self, teryt_code):
+        """Pozycja gminy o danym kodzie TERYT (wyszukiwanie binarne) lub None"""
+        order = self.orders['teryt_code']
+        codes = self.columns['teryt_code']
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if (codes[order[middle]] or '') < teryt_code:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and codes[order[low]] == teryt_code:
+            return order[low]
+        return None
+
+    def row(self, index, fields=None):
+        """Słownik gminy (pola jak w Municipality.to_dict)"""
+        return {name: self.columns[name][index] for name in fields or ROW_FIELDS}
+
+    def updated_at(self, index):
+        value = self.columns['updated_at'][index]
+        return datetime.fromisoformat(value) if value else None
+
+    def get(self, id):
+        index = self.find_id(id)
+        return self.row(index) if index is not None else None
+
+    def get_by_teryt(self, teryt_code):
+        index = self.find_teryt(teryt_code)
+        return self.row(index) if index is not None else None
+
+    def iter_columns(self, *names):
+        """Krotki wartości wybranych kolumn dla wszystkich gmin"""
+        columns = [self.columns[name] for name in names]
+        for index in range(self.count):
+            yield tuple(column[index] for column in columns)
+
+    def rows(self):
+        for index in range(self.count):
+            yield self.row(index)
+
+
+def load_snapshot(path=None):
+    """Otwiera migawkę zgodną z bieżącą generacją importu (None, jeśli brak lub nieaktualna)"""
+    path = path or SNAPSHOT_FILE
+    if not os.path.exists(path):
+        return None
+    try:
+        snapshot = MunicipalitySnapshot(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Nie można otworzyć migawki gmin {path}: {str(e)}")
+        return None
+    if snapshot.generation != current_generation():
+        logger.info(f"Migawka gmin {path} nie odpowiada bieżącej generacji importu - odczyt z bazy")
+        return None
+    return snapshot
+
+
+# Migawka współdzielona w procesie, otwierana ponownie po każdym imporcie TERYT
+_snapshot_cache = GenerationCache(load_snapshot)
+
+
+def get_snapshot():
+    """Zwraca aktualną migawkę gmin lub None (odczyt z bazy)"""
+    if not SNAPSHOT_ENABLED:
+        return None
+    return _snapshot_cache.get()
@@ -0,0 +1,128 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_, func, literal, String
+
+# Górne ograniczenie liczenia rekordów w trybie szacowanym
+ESTIMATE_COUNT_CAP = 10000
+
+
+class InvalidCursor(ValueError):
+    """Niepoprawny lub niepasujący do zapytania kursor paginacji"""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(signature, values):
+    """Koduje kursor jako nieprzezroczysty ciąg znaków"""
+    raw = json.dumps({'s': signature, 'v': [_encode_value(v) for v in values]},
+                     separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, signature):
+    """Dekoduje kursor i sprawdza, czy pasuje do bieżącego sortowania"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = [_decode_value(v) for v in data['v']]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor('Niepoprawny kursor paginacji')
+    # Wartości klucza trafiają do porównań SQL - dopuszczalne tylko skalary
+    if any(isinstance(v, (dict, list)) for v in values):
+        raise InvalidCursor('Niepoprawny kursor paginacji')
+    if data.get('s') != signature:
+        raise InvalidCursor('Kursor nie pasuje do parametrów sortowania')
+    return values
+
+
+class KeysetKey:
+    """Kolumna klucza sortowania: wyrażenie SQL i odpowiadająca mu wartość z obiektu"""
+
+    def __init__(self, column, attribute, null_value=None):
+        self.attribute = attribute
+        self.null_value = null_value
+        # Kolumny z wartościami NULL porównujemy po podstawieniu wartości zastępczej
+        self.expression = column if null_value is None else func.coalesce(column, null_value)
+
+    def value_of(self, item):
+        value = getattr(item, self.attribute)
+        return self.null_value if value is None else value
+
+
+def keyset_paginate(query, keys, descending, cursor, per_page, signature, count=None):
+    """Paginacja kursorowa (keyset) - koszt strony nie zależy od jej numeru"""
+    if descending:
+        query = query.order_by(*[k.expression.desc() for k in keys])
+    else:
+        query = query.order_by(*[k.expression.asc() for k in keys])
+
+    total = None
+    total_estimated = False
+    if count == 'exact':
+        total = query.order_by(None).count()
+    elif count == 'estimate':
+        capped = query.order_by(None).limit(ESTIMATE_COUNT_CAP + 1).subquery()
+        total = query.session.query(func.count()).select_from(capped).scalar()
+        if total > ESTIMATE_COUNT_CAP:
+            total = ESTIMATE_COUNT_CAP
+            total_estimated = True
+
+    if cursor:
+        values = decode_cursor(cursor, signature)
+        if len(values) != len(keys):
+            raise InvalidCursor('Niepoprawny kursor paginacji')
+        if query.session.get_bind().dialect.name == 'sqlite':
+            values = [sqlite_comparable(v) for v in values]
+        query = query.filter(_after(keys, values, descending))
+
+    # Pobieramy jeden rekord więcej, aby wiedzieć, czy istnieje następna strona
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+
+    next_cursor = None
+    if has_more and items:
+        next_cursor = encode_cursor(signature, [k.value_of(items[-1]) for k in keys])
+
+    page = {
+        'items': items,
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'per_page': per_page
+    }
+    if total is not None:
+        page['total'] = total
+        page['total_estimated'] = total_estimated
+    return page
+
+
+def sqlite_comparable(value):
+    """SQLite porównuje daty jako tekst, a CURRENT_TIMESTAMP zapisuje je bez części ułamkowej"""
+    if isinstance(value, datetime) and value.microsecond == 0:
+        return literal(value.strftime('%Y-%m-%d %H:%M:%S'), String)
+    return value
+
+
+def _after(keys, values, descending):
+    """Warunek 'za ostatnim rekordem' dla złożonego klucza sortowania"""
+    clauses = []
+    for i, key in enumerate(keys):
+        equal = [keys[j].expression == values[j] for j in range(i)]
+        if descending:
+            beyond = key.expression < values[i]
+        else:
+            beyond = key.expression > values[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
@@ -0,0 +1,299 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from datetime import datetime
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapper
+
+from app.services.metrics import registry, install_metrics_endpoint
+
+logger = logging.getLogger(__name__)
+
+# Profilowanie żądań jest opcjonalne (PROFILING=1); wyłączone nie rejestruje żadnych hooków
+PROFILING_ENABLED = os.environ.get('PROFILING', '0') == '1'
+# Odsetek żądań wykonywanych pod cProfile (0 - bez próbkowania)
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+# Próg wolnego żądania w milisekundach
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 500))
+# Zrzut stosu wątku, który przekroczył próg wolnego żądania (wątek nadzorczy)
+PROFILE_STACK_CAPTURE = os.environ.get('PROFILE_STACK_CAPTURE', '0') == '1'
+# Katalog na pliki .prof z próbkowanych wolnych żądań (bez niego - tylko log)
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+# Liczba powtórzeń tego samego zapytania SELECT w żądaniu uznawana za wzorzec N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
+
+REQUESTS = registry.counter(
+    'http_requests_total', 'Liczba obsłużonych żądań', labels=('endpoint', 'method', 'status'))
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Czas obsługi żądania', labels=('endpoint',))
+PHASE_SECONDS = registry.counter(
+    'http_request_phase_seconds_total', 'Czas żądań w podziale na fazy', labels=('endpoint', 'phase'))
+SQL_STATEMENTS = registry.counter(
+    'db_statements_total', 'Liczba zapytań SQL wykonanych w żądaniach', labels=('endpoint',))
+SQL_SECONDS = registry.counter(
+    'db_statement_seconds_total', 'Czas zapytań SQL w żądaniach', labels=('endpoint',))
+ORM_OBJECTS = registry.counter(
+    'orm_objects_loaded_total', 'Liczba obiektów ORM utworzonych z wierszy', labels=('endpoint',))
+N_PLUS_ONE = registry.counter(
+    'n_plus_one_detected_total', 'Żądania z powtarzanym zapytaniem (wzorzec N+1)', labels=('endpoint',))
+SLOW_REQUESTS = registry.counter(
+    'slow_requests_total', 'Żądania przekraczające PROFILE_SLOW_MS', labels=('endpoint',))
+PROFILES_CAPTURED = registry.counter(
+    'profiles_captured_total', 'Zapisane profile i zrzuty stosu wolnych żądań', labels=('kind',))
+
+_current = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """Pomiary jednego żądania: fazy, zapytania SQL, obiekty ORM"""
+
+    __slots__ = ('endpoint', 'started', 'phases', 'current_phase', 'sql_count', 'sql_time',
+                 'statements', 'orm_objects', 'profiler', 'profiling', 'stack_captured')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.current_phase = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.statements = {}
+        self.orm_objects = 0
+        self.profiler = None
+        self.profiling = False
+        self.stack_captured = False
+
+
+class _Phase:
+    """Mierzy fazę żądania; czas zapytań SQL wykonanych w fazie jest liczony osobno"""
+
+    __slots__ = ('profile', 'name', 'started', 'sql_time')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.profile.current_phase = self.name
+        self.sql_time = self.profile.sql_time
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        profile = self.profile
+        elapsed = time.perf_counter() - self.started - (profile.sql_time - self.sql_time)
+        profile.phases[self.name] = profile.phases.get(self.name, 0.0) + elapsed
+        profile.current_phase = None
+        return False
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def phase(name):
+    """Kontekst fazy żądania (np. serializacja); bez profilowania nic nie mierzy"""
+    profile = _current.get()
+    if profile is None or profile.current_phase is not None:
+        # Fazy zagnieżdżone są wliczane do fazy zewnętrznej
+        return _NULL_PHASE
+    return _Phase(profile, name)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is None:
+        return
+    starts = conn.info.get('profile_query_start')
+    if not starts:
+        return
+    profile.sql_time += time.perf_counter() - starts.pop()
+    profile.sql_count += 1
+    profile.statements[statement] = profile.statements.get(statement, 0) + 1
+
+
+def _on_load(target, context):
+    profile = _current.get()
+    if profile is not None:
+        profile.orm_objects += 1
+
+
+# Jeden profiler naraz - od Pythona 3.12 cProfile nie może działać równolegle w wielu wątkach
+_profiler_lock = threading.Lock()
+
+# Aktywne żądania (identyfikator wątku -> pomiar) dla wątku nadzorczego
+_active = {}
+_reported_n_plus_one = set()
+
+
+def _start_request():
+    profile = RequestProfile(request.endpoint or 'unknown')
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE and _profiler_lock.acquire(blocking=False):
+        profile.profiler = cProfile.Profile()
+        profile.profiling = True
+        profile.profiler.enable()
+    g._request_profile_token = _current.set(profile)
+    if PROFILE_STACK_CAPTURE:
+        _active[threading.get_ident()] = profile
+
+
+def _stop_profiler(profile):
+    if profile.profiling:
+        profile.profiling = False
+        try:
+            profile.profiler.disable()
+        finally:
+            _profiler_lock.release()
+
+
+def _finish_request(response):
+    profile = _current.get()
+    if profile is None:
+        return response
+    elapsed = time.perf_counter() - profile.started
+    _stop_profiler(profile)
+    endpoint = profile.endpoint
+
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    REQUEST_DURATION.observe(elapsed, endpoint=endpoint)
+    SQL_STATEMENTS.inc(profile.sql_count, endpoint=endpoint)
+    SQL_SECONDS.inc(profile.sql_time, endpoint=endpoint)
+    if profile.orm_objects:
+        ORM_OBJECTS.inc(profile.orm_objects, endpoint=endpoint)
+
+    # Czas poza zapytaniami i mierzonymi fazami (m.in. hydratacja obiektów ORM i logika endpointu)
+    phases = dict(profile.phases, sql=profile.sql_time)
+    phases['other'] = max(0.0, elapsed - sum(phases.values()))
+    for name, seconds in phases.items():
+        PHASE_SECONDS.inc(seconds, endpoint=endpoint, phase=name)
+
+    timings = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in phases.items()]
+    timings.append(f'total;dur={elapsed * 1000:.2f};desc="{profile.sql_count} SQL"')
+    response.headers['Server-Timing'] = ', '.join(timings)
+
+    _check_n_plus_one(profile)
+    if elapsed * 1000 >= PROFILE_SLOW_MS:
+        SLOW_REQUESTS.inc(endpoint=endpoint)
+        logger.warning(
+            f"Wolne żądanie {request.method} {request.path} ({endpoint}): {elapsed * 1000:.0f} ms, "
+            f"SQL {profile.sql_count} zapytań / {profile.sql_time * 1000:.0f} ms"
+        )
+        if profile.profiler is not None:
+            _save_profile(profile)
+    return response
+
+
+def _teardown_request(exc):
+    profile = _current.get()
+    if profile is None:
+        return
+    # Profiler mógł pozostać włączony, gdy after_request nie zostało wywołane
+    _stop_profiler(profile)
+    _active.pop(threading.get_ident(), None)
+    token = g.pop('_request_profile_token', None)
+    if token is not None:
+        _current.reset(token)
+
+
+def _check_n_plus_one(profile):
+    for statement, count in profile.statements.items():
+        if count < N_PLUS_ONE_THRESHOLD or not statement.lstrip().upper().startswith('SELECT'):
+            continue
+        N_PLUS_ONE.inc(endpoint=profile.endpoint)
+        key = (profile.endpoint, statement)
+        if key not in _reported_n_plus_one:
+            _reported_n_plus_one.add(key)
+            logger.warning(
+                f"Możliwy wzorzec N+1 w {profile.endpoint}: zapytanie wykonane {count} razy: "
+                f"{' '.join(statement.split())[:300]}"
+            )
+        break
+
+
+def _save_profile(profile):
+    """Zapisuje profil wolnego żądania (log z najdroższymi funkcjami i opcjonalnie plik .prof)"""
+    stream = io.StringIO()
+    stats = pstats.Stats(profile.profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(25)
+    logger.warning(f"Profil wolnego żądania {profile.endpoint}:\n{stream.getvalue()}")
+    if PROFILE_DIR:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{profile.endpoint.replace('.', '_')}-{datetime.utcnow():%Y%m%dT%H%M%S%f}.prof"
+        stats.dump_stats(os.path.join(PROFILE_DIR, name))
+    PROFILES_CAPTURED.inc(kind='cprofile')
+
+
+def _watch_slow_requests():
+    """Wątek nadzorczy: zrzut stosu żądań trwających dłużej niż PROFILE_SLOW_MS"""
+    interval = max(0.05, PROFILE_SLOW_MS / 2000)
+    while True:
+        time.sleep(interval)
+        now = time.perf_counter()
+        frames = None
+        for thread_id, profile in list(_active.items()):
+            if profile.stack_captured or (now - profile.started) * 1000 < PROFILE_SLOW_MS:
+                continue
+            if frames is None:
+                frames = sys._current_frames()
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            profile.stack_captured = True
+            PROFILES_CAPTURED.inc(kind='stack')
+            logger.warning(
+                f"Żądanie {profile.endpoint} trwa ponad {PROFILE_SLOW_MS:.0f} ms, stos:\n"
+                f"{''.join(traceback.format_stack(frame))}"
+            )
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install_profiling(app):
+    """Włącza profilowanie żądań aplikacji i endpoint /metrics (gdy PROFILING=1)"""
+    global _installed
+    if not PROFILING_ENABLED:
+        return False
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    install_metrics_endpoint(app)
+
+    with _install_lock:
+        if not _installed:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Mapper, 'load', _on_load)
+            if PROFILE_STACK_CAPTURE:
+                threading.Thread(target=_watch_slow_requests, daemon=True,
+                                 name='slow-request-watchdog').start()
+            _installed = True
+    logger.info(f"Profilowanie żądań włączone (próbkowanie {PROFILE_SAMPLE_RATE}, próg {PROFILE_SLOW_MS} ms)")
+    return True
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Klucz subskrypcji wszystkich zadań (strumień zbiorczy)
+ALL_TASKS = '*'
+
+# Statusy, po których strumień pojedynczego zadania jest zamykany
+TERMINAL_STATUSES = ('completed', 'failed', 'stopped')
+
+# Liczba zadań, których ostatni stan pamiętamy do wyliczania zmian
+MAX_TRACKED_TASKS = 5000
+
+# Odstęp (w sekundach) między komunikatami podtrzymującymi połączenie SSE
+SSE_HEARTBEAT_INTERVAL = 15
+
+# Odstęp (w sekundach) między odczytami stanu obserwowanych zadań z bazy - zmiany zapisane
+# przez inne procesy (gunicorn -w N, uvicorn --workers N); 0 wyłącza odpytywanie
+PROGRESS_POLL_INTERVAL = float(os.environ.get('PROGRESS_POLL_INTERVAL', 2))
+
+
+def format_sse(event, data):
+    """Formatuje zdarzenie w formacie Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class Subscription:
+    """Subskrypcja zdarzeń postępu z łączeniem nieodebranych zmian"""
+
+    def __init__(self, task_ids=None):
+        self.task_ids = tuple(task_ids) if task_ids else (ALL_TASKS,)
+        self._condition = threading.Condition()
+        self._pending = OrderedDict()
+        self.closed = False
+
+    def push(self, task_id, delta):
+        with self._condition:
+            # Wolny odbiorca dostaje jedną scaloną zmianę na zadanie zamiast kolejki
+            merged = self._pending.get(task_id)
+            if merged is None:
+                self._pending[task_id] = dict(delta)
+            else:
+                merged.update(delta)
+            self._condition.notify()
+
+    def wait(self, timeout=None):
+        """Czeka na zmiany i zwraca listę par (task_id, zmiana)"""
+        with self._condition:
+            if not self._pending and not self.closed:
+                self._condition.wait(timeout)
+            return self._take()
+
+    def _take(self):
+        events = list(self._pending.items())
+        self._pending.clear()
+        return events
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class AsyncSubscription(Subscription):
+    """Subskrypcja odbierana w pętli asyncio - oczekiwanie nie zajmuje wątku"""
+
+    def __init__(self, task_ids=None, loop=None):
+        super().__init__(task_ids)
+        self._loop = loop or asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def _notify(self):
+        # Zmiany publikują wątki robocze - zdarzenie ustawiamy w wątku pętli
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            # Pętla została już zamknięta (zamykanie serwera)
+            pass
+
+    def push(self, task_id, delta):
+        super().push(task_id, delta)
+        self._notify()
+
+    def close(self):
+        super().close()
+        self._notify()
+
+    async def wait_async(self, timeout=None):
+        """Czeka na zmiany bez blokowania pętli i zwraca listę par (task_id, zmiana)"""
+        with self._condition:
+            ready = bool(self._pending) or self.closed
+        if not ready:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._event.clear()
+        with self._condition:
+            return self._take()
+
+
+class ProgressBroker:
+    """Rozgłaszanie zmian postępu badań do subskrybentów procesu
+
+    Zmiany zatwierdzone w tym procesie są publikowane od razu. Zmiany z innych procesów
+    broker odczytuje z bazy co PROGRESS_POLL_INTERVAL sekund - jednym zapytaniem dla
+    wszystkich zadań obserwowanych w procesie, niezależnie od liczby klientów.
+    """
+
+    def __init__(self, max_tracked=MAX_TRACKED_TASKS, poll_interval=PROGRESS_POLL_INTERVAL):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._last_state = OrderedDict()
+        # Chwila ostatniej publikacji zadania (time.monotonic) - odczyt z bazy sprzed niej jest nieaktualny
+        self._published_at = {}
+        self._max_tracked = max_tracked
+        self._poll_interval = poll_interval
+        self._load_states = None
+        self._poller = None
+        self._stop_polling = threading.Event()
+        # Zadania w toku widziane w poprzednim odczycie (strumień wszystkich zadań)
+        self._active = set()
+
+    def subscribe(self, task_ids=None, subscription=None):
+        """Tworzy subskrypcję dla wskazanych zadań (lub wszystkich); można przekazać własną (np. AsyncSubscription)"""
+        subscription = subscription or Subscription(task_ids)
+        with self._lock:
+            for key in subscription.task_ids:
+                self._subscribers.setdefault(key, set()).add(subscription)
+        self._ensure_poller()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Usuwa subskrypcję"""
+        subscription.close()
+        with self._lock:
+            for key in subscription.task_ids:
+                subscribers = self._subscribers.get(key)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[key]
+
+    def last_state(self, task_id):
+        """Zwraca ostatni opublikowany stan zadania (jeśli jest znany)"""
+        with self._lock:
+            state = self._last_state.get(task_id)
+            return dict(state) if state is not None else None
+
+    def remember(self, task_id, state, read_at=None):
+        """Zapamiętuje stan odczytany z bazy (bez powiadamiania subskrybentów)
+
+        Z read_at (time.monotonic przed odczytem) stan zastępuje zapamiętany, o ile od odczytu
+        nic nie opublikowano - zapamiętany stan mógł się zdezaktualizować, gdy zadania nikt
+        nie obserwował. Bez read_at zapisywany jest tylko stan nieznanego zadania.
+        """
+        with self._lock:
+            if read_at is None:
+                if task_id in self._last_state:
+                    return
+            elif self._published_at.get(task_id, read_at) > read_at:
+                return
+            self._last_state.pop(task_id, None)
+            self._last_state[task_id] = dict(state)
+            self._trim()
+
+    def _trim(self):
+        while len(self._last_state) > self._max_tracked:
+            task_id, _ = self._last_state.popitem(last=False)
+            self._published_at.pop(task_id, None)
+
+    def publish(self, task_id, state, read_at=None):
+        """Publikuje stan zadania - subskrybenci otrzymują tylko zmienione pola
+
+        read_at - chwila (time.monotonic) odczytu stanu z bazy; stan starszy niż ostatnia
+        publikacja jest pomijany, aby nie cofnąć subskrybentów do poprzedniej wersji.
+        """
+        with self._lock:
+            if read_at is not None and self._published_at.get(task_id, read_at) > read_at:
+                return 0
+            self._published_at[task_id] = time.monotonic()
+            previous = self._last_state.pop(task_id, None) or {}
+            delta = {k: v for k, v in state.items() if previous.get(k) != v or k not in previous}
+            self._last_state[task_id] = {**previous, **state}
+            self._trim()
+
+            if not delta:
+                return 0
+            delta['task_id'] = task_id
+            subscribers = set(self._subscribers.get(task_id, ()))
+            subscribers |= self._subscribers.get(ALL_TASKS, set())
+
+        for subscription in subscribers:
+            subscription.push(task_id, delta)
+        return len(subscribers)
+
+    def configure_polling(self, load_states):
+        """Ustawia odczyt stanu z bazy: load_states(task_ids, include_active) -> lista stanów
+
+        include_active - dołącz wszystkie badania w toku (są subskrybenci wszystkich zadań).
+        Wątek odpytujący startuje przy pierwszej subskrypcji.
+        """
+        self._load_states = load_states
+
+    def _ensure_poller(self):
+        if self._load_states is None or self._poll_interval <= 0 or self._poller is not None:
+            return
+        with self._lock:
+            if self._poller is None:
+                self._stop_polling.clear()
+                self._poller = threading.Thread(target=self._poll_loop, name='progress-poller', daemon=True)
+                self._poller.start()
+
+    def stop_polling(self, timeout=None):
+        """Zatrzymuje wątek odpytujący (zamykanie serwera, testy)"""
+        poller = self._poller
+        self._stop_polling.set()
+        if poller is not None:
+            poller.join(timeout)
+        self._poller = None
+
+    def _poll_loop(self):
+        while not self._stop_polling.wait(self._poll_interval):
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"Błąd odczytu stanu postępu z bazy: {str(e)}")
+
+    def poll_once(self):
+        """Odczytuje z bazy stan obserwowanych zadań i publikuje zmiany; zwraca liczbę stanów"""
+        with self._lock:
+            task_ids = {key for key, subscribers in self._subscribers.items() if subscribers and key != ALL_TASKS}
+            include_active = bool(self._subscribers.get(ALL_TASKS))
+        if include_active:
+            # Zadania zakończone od poprzedniego odczytu - ostatnia zmiana statusu
+            task_ids |= self._active
+        if self._load_states is None or not (task_ids or include_active):
+            self._active = set()
+            return 0
+
+        read_at = time.monotonic()
+        states = self._load_states(sorted(task_ids), include_active)
+        for state in states:
+            self.publish(state['task_id'], state, read_at=read_at)
+        if include_active:
+            self._active = {s['task_id'] for s in states if s.get('status') not in TERMINAL_STATUSES}
+        return len(states)
+
+
+# Broker współdzielony w procesie
+progress_broker = ProgressBroker()
@@ -0,0 +1,199 @@
+import math
+import os
+from datetime import datetime, timedelta
+
+from app.services.progress_events import TERMINAL_STATUSES
+
+# Liczba zmian postępu w jednym fragmencie historii (ogranicza koszt dopisania zmiany)
+PROGRESS_HISTORY_CHUNK_TICKS = int(os.environ.get('PROGRESS_HISTORY_CHUNK_TICKS', 512))
+# Maksymalna liczba różnych kroków w historii badania - kolejne trafiają do wspólnej pozycji
+PROGRESS_HISTORY_MAX_STEPS = int(os.environ.get('PROGRESS_HISTORY_MAX_STEPS', 256))
+OTHER_STEP = '(inne)'
+
+# Domyślna i maksymalna liczba punktów osi czasu zwracanych przez API
+DEFAULT_TIMELINE_POINTS = 200
+MAX_TIMELINE_POINTS = 5000
+
+
+def _encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varints(data):
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value
+            value = shift = 0
+
+
+def encode_tick(delta_ms, progress, step_index):
+    """Zmiana postępu jako trzy liczby varint: przyrost czasu [ms], postęp+1, indeks kroku+1 (0 - brak)"""
+    out = bytearray()
+    _encode_varint(delta_ms, out)
+    _encode_varint(0 if progress is None else progress + 1, out)
+    _encode_varint(0 if step_index is None else step_index + 1, out)
+    return bytes(out)
+
+
+def decode_chunk(chunk):
+    """Zmiany zapisane we fragmencie historii: [(czas, postęp, indeks kroku)]"""
+    values = _decode_varints(chunk.data)
+    at = chunk.started_at
+    ticks = []
+    # Ten sam iterator trzy razy - kolejne trójki liczb
+    for delta_ms, progress, step in zip(values, values, values):
+        at += timedelta(milliseconds=delta_ms)
+        ticks.append((at, progress - 1 if progress else None, step - 1 if step else None))
+    return ticks
+
+
+def _intern_step(steps, name):
+    """Indeks kroku w słowniku historii (dopisuje nową nazwę)"""
+    if not name:
+        return None
+    if name in steps:
+        return steps.index(name)
+    if len(steps) >= PROGRESS_HISTORY_MAX_STEPS - 1:
+        name = OTHER_STEP
+        if name in steps:
+            return steps.index(name)
+    steps.append(name)
+    return len(steps) - 1
+
+
+def record_progress(research, now=None):
+    """Dopisuje bieżący stan postępu badania do historii (w bieżącej transakcji)
+
+    Zapisywane są tylko zmiany postępu lub kroku oraz zakończenie badania - powtórzenia
+    tego samego stanu nie zajmują miejsca. Zwraca False, jeśli nic nie dopisano.
+    """
+    from app.extensions import db
+    from app.models.research import ResearchProgressChunk, ResearchProgressSeries
+
+    now = now or datetime.utcnow()
+    series = db.session.get(ResearchProgressSeries, research.id)
+    if series is None:
+        series = ResearchProgressSeries(
+            research_id=research.id, steps=[], step_seconds=[], ticks=0, started_at=now, last_at=now
+        )
+        db.session.add(series)
+
+    steps = list(series.steps)
+    step = _intern_step(steps, research.current_step)
+    progress = research.progress
+    if not isinstance(progress, int) or progress < 0:
+        progress = None
+    if (series.ticks and progress == series.last_progress and step == series.last_step
+            and research.status not in TERMINAL_STATUSES):
+        return False
+
+    # Czas liczony od zapisanej (zaokrąglonej) poprzedniej zmiany - zaokrąglenia się nie kumulują
+    delta_ms = max(0, int((now - series.last_at).total_seconds() * 1000)) if series.ticks else 0
+    at = series.last_at + timedelta(milliseconds=delta_ms)
+
+    # Czas od poprzedniej zmiany należy do poprzedniego kroku
+    seconds = list(series.step_seconds) + [0.0] * (len(steps) - len(series.step_seconds))
+    if series.ticks and series.last_step is not None:
+        seconds[series.last_step] = round(seconds[series.last_step] + delta_ms / 1000, 3)
+
+    seq, position = divmod(series.ticks, PROGRESS_HISTORY_CHUNK_TICKS)
+    if position == 0:
+        # Nowy fragment zaczyna się od czasu bezwzględnego, pierwsza zmiana ma przyrost 0
+        chunk = ResearchProgressChunk(research_id=research.id, seq=seq, started_at=at, ticks=0, data=b'')
+        db.session.add(chunk)
+        tick = encode_tick(0, progress, step)
+    else:
+        chunk = db.session.get(ResearchProgressChunk, (research.id, seq))
+        tick = encode_tick(delta_ms, progress, step)
+    chunk.data = chunk.data + tick
+    chunk.ticks += 1
+
+    series.steps = steps
+    series.step_seconds = seconds
+    series.ticks += 1
+    series.last_at = at
+    series.last_progress = progress
+    series.last_step = step
+    return True
+
+
+def _downsample(points, max_points):
+    """Do max_points punktów: z każdego przedziału pierwsza zmiana kroku i ostatni punkt"""
+    if len(points) <= max_points:
+        return points
+    size = math.ceil(len(points) / (max_points // 2))
+    kept = []
+    for start in range(0, len(points), size):
+        bucket = points[start:start + size]
+        previous = kept[-1][2] if kept else None
+        for point in bucket[:-1]:
+            if point[2] != previous:
+                kept.append(point)
+                break
+        kept.append(bucket[-1])
+    return kept
+
+
+def progress_timeline(research, max_points=DEFAULT_TIMELINE_POINTS, now=None):
+    """Oś czasu postępu badania (przerzedzona) i czas spędzony w poszczególnych krokach"""
+    from app.extensions import db
+    from app.models.research import ResearchProgressChunk, ResearchProgressSeries
+
+    series = db.session.get(ResearchProgressSeries, research.id)
+    if series is None:
+        return {'ticks': 0, 'started_at': None, 'last_at': None, 'points': [], 'steps': [], 'stored_bytes': 0}
+
+    chunks = (ResearchProgressChunk.query.filter_by(research_id=research.id)
+              .order_by(ResearchProgressChunk.seq).all())
+    ticks = [tick for chunk in chunks for tick in decode_chunk(chunk)]
+    names = series.steps
+
+    # Czas między kolejnymi zmianami należy do kroku wcześniejszej; trwające badanie - do chwili obecnej
+    breakdown = {}
+    for index, (at, _, step) in enumerate(ticks):
+        if step is None:
+            continue
+        if index + 1 < len(ticks):
+            until = ticks[index + 1][0]
+        elif research.status in TERMINAL_STATUSES:
+            until = at
+        else:
+            until = max(at, now or datetime.utcnow())
+        entry = breakdown.setdefault(step, {'seconds': 0.0, 'visits': 0, 'first_at': at})
+        entry['seconds'] += (until - at).total_seconds()
+        if index == 0 or ticks[index - 1][2] != step:
+            entry['visits'] += 1
+
+    total = sum(entry['seconds'] for entry in breakdown.values())
+    started_at = series.started_at
+    return {
+        'ticks': series.ticks,
+        'started_at': started_at.isoformat(),
+        'last_at': series.last_at.isoformat(),
+        'points': [
+            {
+                'offset': round((at - started_at).total_seconds(), 3),
+                'progress': progress,
+                'step': names[step] if step is not None else None
+            }
+            for at, progress, step in _downsample(ticks, max_points)
+        ],
+        'steps': [
+            {
+                'step': names[step],
+                'seconds': round(entry['seconds'], 3),
+                'share': round(entry['seconds'] / total, 4) if total else None,
+                'visits': entry['visits'],
+                'first_offset': round((entry['first_at'] - started_at).total_seconds(), 3)
+            }
+            for step, entry in sorted(breakdown.items(), key=lambda item: item[1]['first_at'])
+        ],
+        'stored_bytes': sum(len(chunk.data) for chunk in chunks)
+    }
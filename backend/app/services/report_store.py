@@ -0,0 +1,183 @@
+import fcntl
+import gzip
+import hashlib
+import os
+import tempfile
+
+try:
+    import zstandard
+except ImportError:  # zstd jest opcjonalny - domyślnie używamy gzip
+    zstandard = None
+
+DATA_DIR = os.environ.get('DATA_DIR', '/app/data')
+REPORTS_DIR = os.environ.get('REPORTS_DIR', os.path.join(DATA_DIR, 'reports'))
+
+# Kodek zapisu nowych raportów: gzip (domyślnie) lub zstd (wymaga pakietu zstandard)
+REPORT_CODEC = os.environ.get('REPORT_STORE_CODEC', 'gzip')
+
+CHUNK_SIZE = 64 * 1024
+
+_EXTENSIONS = {'gzip': 'gz', 'zstd': 'zst'}
+
+
+class UploadOffsetMismatch(Exception):
+    """Przesunięcie fragmentu nie zgadza się z bieżącym rozmiarem raportu"""
+
+    def __init__(self, offset):
+        super().__init__(f"Bieżący rozmiar raportu: {offset}")
+        self.offset = offset
+
+
+class StoredBlob:
+    """Opis raportu zapisanego w magazynie"""
+
+    def __init__(self, digest, encoding, size, stored_size, path):
+        self.digest = digest
+        self.encoding = encoding
+        self.size = size
+        self.stored_size = stored_size
+        self.path = path
+
+
+class ReportStore:
+    """Magazyn raportów adresowany treścią (sha256), z kompresją i deduplikacją"""
+
+    def __init__(self, root=REPORTS_DIR, codec=REPORT_CODEC):
+        if codec == 'zstd' and zstandard is None:
+            codec = 'gzip'
+        self.root = root
+        self.codec = codec
+
+    def path_for(self, digest, encoding):
+        """Ścieżka pliku raportu w magazynie"""
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.{_EXTENSIONS[encoding]}")
+
+    def _compressor(self, raw_file):
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=10).stream_writer(raw_file, closefd=False)
+        # mtime=0 - identyczna treść daje identyczny plik
+        return gzip.GzipFile(fileobj=raw_file, mode='wb', compresslevel=6, mtime=0)
+
+    def put_stream(self, chunks):
+        """Zapisuje raport z kolejnych fragmentów (bytes) bez trzymania całości w pamięci"""
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw_file:
+                with self._compressor(raw_file) as writer:
+                    for chunk in chunks:
+                        digest.update(chunk)
+                        size += len(chunk)
+                        writer.write(chunk)
+                stored_size = raw_file.tell()
+
+            hexdigest = digest.hexdigest()
+            path = self.path_for(hexdigest, self.codec)
+            if os.path.exists(path):
+                # Deduplikacja - identyczny raport jest już w magazynie
+                os.remove(tmp_path)
+                stored_size = os.path.getsize(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return StoredBlob(hexdigest, self.codec, size, stored_size, path)
+
+    def upload_path(self, upload_id):
+        """Ścieżka pliku częściowego raportu przesyłanego w częściach"""
+        return os.path.join(self.root, 'uploads', f"{upload_id}.part")
+
+    def append_upload(self, upload_id, chunks, expected_offset=None):
+        """Dopisuje fragmenty do pliku częściowego; zwraca (przesunięcie przed, po)"""
+        path = self.upload_path(upload_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab') as f:
+            # Blokada pliku chroni przed równoległymi dopisaniami z różnych procesów
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                offset = os.fstat(f.fileno()).st_size
+                if expected_offset is not None and expected_offset != offset:
+                    raise UploadOffsetMismatch(offset)
+                for chunk in chunks:
+                    f.write(chunk)
+                f.flush()
+                return offset, f.tell()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def upload_size(self, upload_id):
+        """Bieżący rozmiar pliku częściowego"""
+        try:
+            return os.path.getsize(self.upload_path(upload_id))
+        except OSError:
+            return 0
+
+    def finalize_upload(self, upload_id):
+        """Zapisuje plik częściowy w magazynie (kompresja strumieniowa)
+
+        Plik częściowy zostaje do wywołania discard_upload - po zapisie w bazie, żeby
+        nieudane zakończenie można było ponowić.
+        """
+        path = self.upload_path(upload_id)
+        if not os.path.exists(path):
+            open(path, 'ab').close()
+        with open(path, 'rb') as f:
+            return self.put_stream(iter(lambda: f.read(CHUNK_SIZE), b''))
+
+    def discard_upload(self, upload_id):
+        """Usuwa plik częściowy zakończonego przesyłania"""
+        try:
+            os.remove(self.upload_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def put_bytes(self, data):
+        """Zapisuje raport przekazany w całości"""
+        return self.put_stream(data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+
+    def put_text(self, text):
+        return self.put_bytes(text.encode('utf-8'))
+
+    def open(self, digest, encoding):
+        """Otwiera zdekompresowany strumień raportu"""
+        path = self.path_for(digest, encoding)
+        if encoding == 'zstd':
+            if zstandard is None:
+                raise RuntimeError('Odczyt raportu zstd wymaga pakietu zstandard')
+            return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return gzip.open(path, 'rb')
+
+    def iter_range(self, digest, encoding, start=0, stop=None, chunk_size=CHUNK_SIZE):
+        """Generuje zdekompresowane bajty z zakresu [start, stop)"""
+        with self.open(digest, encoding) as reader:
+            # Strumieni skompresowanych nie da się przewijać - pomijamy początek
+            remaining_skip = start
+            while remaining_skip > 0:
+                skipped = len(reader.read(min(chunk_size, remaining_skip)))
+                if not skipped:
+                    return
+                remaining_skip -= skipped
+
+            position = start
+            while stop is None or position < stop:
+                to_read = chunk_size if stop is None else min(chunk_size, stop - position)
+                chunk = reader.read(to_read)
+                if not chunk:
+                    return
+                position += len(chunk)
+                yield chunk
+
+    def read_text(self, digest, encoding):
+        """Odczytuje cały raport jako tekst"""
+        return b''.join(self.iter_range(digest, encoding)).decode('utf-8')
+
+
+# Magazyn współdzielony w procesie
+report_store = ReportStore()
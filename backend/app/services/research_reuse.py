@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from app.services.campaigns import IN_FLIGHT_STATUSES
+
+# Okno świeżości (w sekundach), w którym zakończone badanie jest zwracane zamiast nowego (0 - wyłączone)
+RESEARCH_REUSE_WINDOW = int(os.environ.get('RESEARCH_REUSE_WINDOW', 86400))
+
+# Blokady w procesie rozłożone na pasma według skrótu parametrów
+_locks = [threading.Lock() for _ in range(64)]
+
+
+def params_hash(region_id, breadth, depth, config):
+    """Skrót znormalizowanych parametrów badania"""
+    normalized = json.dumps(
+        {'region_id': str(region_id), 'breadth': int(breadth), 'depth': int(depth), 'config': config or {}},
+        sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+@contextmanager
+def reuse_lock(digest):
+    """Serializuje w procesie obsługę identycznych zleceń (między procesami chroni unikalny in_flight_key)"""
+    lock = _locks[int(digest[:8], 16) % len(_locks)]
+    with lock:
+        yield
+
+
+def find_in_flight(digest):
+    """Zwraca trwające lub oczekujące w kolejce backendu badanie o tych samych parametrach"""
+    from app.models.research import Research
+
+    # Badanie "scheduled" (kolejka kontroli przyjmowania) też zajmuje in_flight_key
+    return Research.query.filter(
+        Research.params_hash == digest,
+        Research.status.in_(('scheduled',) + IN_FLIGHT_STATUSES)
+    ).order_by(Research.id).first()
+
+
+def find_reusable(digest, window=None):
+    """Zwraca najnowsze zakończone badanie z raportem, mieszczące się w oknie świeżości"""
+    from app.models.research import Research, ResearchReport
+
+    window = RESEARCH_REUSE_WINDOW if window is None else window
+    if window <= 0:
+        return None
+
+    has_report = ResearchReport.query.filter(
+        ResearchReport.research_id == Research.id,
+        ResearchReport.upload_status.is_(None)
+    ).exists()
+    return Research.query.filter(
+        Research.params_hash == digest,
+        Research.status == 'completed',
+        Research.end_time >= datetime.utcnow() - timedelta(seconds=window),
+        has_report
+    ).order_by(Research.end_time.desc()).first()
@@ -0,0 +1,101 @@
+import json
+
+from flask import current_app
+from sqlalchemy import DateTime
+
+from app.services.profiling import phase
+
+try:
+    import orjson
+except ImportError:  # orjson jest opcjonalny - bez niego używamy kodera Flask
+    orjson = None
+
+
+class InvalidFields(ValueError):
+    """Nieznane pole w parametrze fields="""
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+class FieldSet:
+    """Pola modelu dostępne w projekcji (parametr fields=) - pobierane jako krotki, bez obiektów ORM"""
+
+    def __init__(self, model, names, expressions=None):
+        self.model = model
+        self.names = list(names)
+        # Pola wyliczane w zapytaniu: nazwa -> wyrażenie SQL
+        self.expressions = expressions or {}
+        self.allowed = set(self.names) | set(self.expressions)
+
+    def parse(self, raw):
+        """Zamienia 'a,b,c' na listę pól; None oznacza pełny obiekt"""
+        if not raw:
+            return None
+        fields = []
+        for name in raw.split(','):
+            name = name.strip()
+            if not name or name in fields:
+                continue
+            if name not in self.allowed:
+                raise InvalidFields(f'Nieznane pole: {name}')
+            fields.append(name)
+        return fields or None
+
+    def project(self, query, fields, required=()):
+        """Ogranicza zapytanie do kolumn potrzebnych dla pól (i kolumn wymaganych, np. klucza sortowania)"""
+        columns = []
+        labeled = []
+        for name in list(fields) + list(required):
+            if name in self.expressions:
+                labeled.append(self.expressions[name].label(name))
+                continue
+            if name not in columns:
+                columns.append(name)
+        return query.with_entities(*[getattr(self.model, c) for c in columns], *labeled)
+
+    def serializer(self, fields):
+        """Zwraca funkcję zamieniającą wiersz projekcji na słownik (daty w ISO 8601)"""
+        plan = []
+        for name in fields:
+            if name in self.expressions:
+                plan.append((name, None))
+            else:
+                column = getattr(self.model, name)
+                convert = _isoformat if isinstance(column.type, DateTime) else None
+                plan.append((name, convert))
+
+        def serialize(row):
+            values = row._mapping
+            item = {}
+            for name, convert in plan:
+                if convert is not None:
+                    item[name] = convert(values[name])
+                else:
+                    item[name] = values[name]
+            return item
+
+        return serialize
+
+    def serialize_rows(self, rows, fields):
+        serialize = self.serializer(fields)
+        return [serialize(row) for row in rows]
+
+
+def json_bytes(payload):
+    """Kodowanie JSON do bajtów UTF-8 (orjson, jeśli zainstalowany)"""
+    if orjson is None:
+        return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+
+
+def fast_jsonify(payload, status=200):
+    """Odpowiedź JSON kodowana przez orjson (jeśli zainstalowany) - szybsza dla dużych stron"""
+    with phase('encode'):
+        if orjson is None:
+            response = current_app.json.response(payload)
+            response.status_code = status
+            return response
+        body = orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return current_app.response_class(body, status=status, mimetype='application/json')
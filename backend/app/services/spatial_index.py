@@ -0,0 +1,162 @@
+import heapq
+import math
+
+from app.services.import_generation import GenerationCache
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+# Rozmiar komórki siatki w stopniach szerokości geograficznej (~14 km)
+DEFAULT_CELL_SIZE = 0.125
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Odległość po powierzchni Ziemi w kilometrach"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialGridIndex:
+    """Indeks przestrzenny gmin oparty na regularnej siatce"""
+
+    def __init__(self, points, cell_size=DEFAULT_CELL_SIZE):
+        points = [(id, lat, lng) for id, lat, lng in points if lat is not None and lng is not None]
+        self.size = len(points)
+        self.cell_lat = cell_size
+
+        # Komórki w przybliżeniu kwadratowe w kilometrach dla średniej szerokości danych
+        mean_lat = sum(p[1] for p in points) / len(points) if points else 52.0
+        self.cell_lng = cell_size / max(0.1, math.cos(math.radians(mean_lat)))
+
+        self.max_abs_lat = max((abs(p[1]) for p in points), default=52.0)
+
+        self.cells = {}
+        for id, lat, lng in points:
+            self.cells.setdefault(self._cell(lat, lng), []).append((lat, lng, id))
+
+        if self.cells:
+            rows = [c[0] for c in self.cells]
+            cols = [c[1] for c in self.cells]
+            self.bounds = (min(rows), min(cols), max(rows), max(cols))
+        else:
+            self.bounds = None
+
+    def __len__(self):
+        return self.size
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_lat), math.floor(lng / self.cell_lng))
+
+    def bbox(self, min_lat, min_lng, max_lat, max_lng, limit=None):
+        """Zwraca identyfikatory gmin w prostokącie (np. widok mapy)"""
+        if self.bounds is None:
+            return []
+        row0, col0 = self._cell(min_lat, min_lng)
+        row1, col1 = self._cell(max_lat, max_lng)
+        row0, col0 = max(row0, self.bounds[0]), max(col0, self.bounds[1])
+        row1, col1 = min(row1, self.bounds[2]), min(col1, self.bounds[3])
+
+        result = []
+        for row in range(row0, row1 + 1):
+            for col in range(col0, col1 + 1):
+                for lat, lng, id in self.cells.get((row, col), ()):
+                    if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+                        result.append(id)
+                        if limit is not None and len(result) >= limit:
+                            return result
+        return result
+
+    def radius(self, lat, lng, radius_km, limit=None):
+        """Zwraca pary (id, odległość) w promieniu od punktu, od najbliższych"""
+        if self.bounds is None:
+            return []
+        d_lat = radius_km / KM_PER_DEGREE
+        d_lng = radius_km / (KM_PER_DEGREE * max(0.01, math.cos(math.radians(min(89.0, abs(lat) + d_lat)))))
+
+        found = []
+        row0, col0 = self._cell(lat - d_lat, lng - d_lng)
+        row1, col1 = self._cell(lat + d_lat, lng + d_lng)
+        for row in range(max(row0, self.bounds[0]), min(row1, self.bounds[2]) + 1):
+            for col in range(max(col0, self.bounds[1]), min(col1, self.bounds[3]) + 1):
+                for p_lat, p_lng, id in self.cells.get((row, col), ()):
+                    distance = haversine_km(lat, lng, p_lat, p_lng)
+                    if distance <= radius_km:
+                        found.append((distance, id))
+        found.sort()
+        if limit is not None:
+            found = found[:limit]
+        return [(id, distance) for distance, id in found]
+
+    def nearest(self, lat, lng, k=10):
+        """Zwraca k najbliższych gmin jako pary (id, odległość)"""
+        if self.bounds is None or k <= 0:
+            return []
+        center_row, center_col = self._cell(lat, lng)
+        max_ring = max(
+            abs(center_row - self.bounds[0]), abs(center_row - self.bounds[2]),
+            abs(center_col - self.bounds[1]), abs(center_col - self.bounds[3])
+        )
+
+        # Dolne ograniczenie szerokości komórki w km między punktem a danymi
+        min_cell_km = self._min_cell_km(max(self.max_abs_lat, abs(lat)))
+
+        # Kopiec maksymalny (po ujemnej odległości) z k najlepszymi kandydatami
+        best = []
+        for ring in range(max_ring + 1):
+            # Każda komórka pierścienia leży co najmniej (ring - 1) komórek od punktu
+            if len(best) >= k and (ring - 1) * min_cell_km > -best[0][0]:
+                break
+            for row, col in self._ring_cells(center_row, center_col, ring):
+                for p_lat, p_lng, id in self.cells.get((row, col), ()):
+                    distance = haversine_km(lat, lng, p_lat, p_lng)
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, id))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, id))
+
+        return [(id, -neg) for neg, id in sorted(best, reverse=True)]
+
+    def _min_cell_km(self, max_abs_lat):
+        return min(
+            self.cell_lat * KM_PER_DEGREE,
+            self.cell_lng * KM_PER_DEGREE * max(0.01, math.cos(math.radians(min(89.0, max_abs_lat))))
+        )
+
+    @staticmethod
+    def _ring_cells(row, col, ring):
+        if ring == 0:
+            yield (row, col)
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield (row - ring, c)
+            yield (row + ring, c)
+        for r in range(row - ring + 1, row + ring):
+            yield (r, col - ring)
+            yield (r, col + ring)
+
+
+def _build_spatial_index():
+    from app.models.municipality import Municipality
+    from app.services.municipality_snapshot import get_snapshot
+
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return SpatialGridIndex(snapshot.iter_columns('id', 'lat', 'lng'))
+
+    points = Municipality.query.with_entities(
+        Municipality.id, Municipality.lat, Municipality.lng
+    ).filter(Municipality.lat.isnot(None), Municipality.lng.isnot(None)).all()
+    return SpatialGridIndex(points)
+
+
+# Indeks współdzielony w procesie, przebudowywany po każdym imporcie współrzędnych
+_spatial_cache = GenerationCache(_build_spatial_index)
+
+
+def get_spatial_index():
+    """Zwraca aktualny indeks przestrzenny gmin"""
+    return _spatial_cache.get()
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Float, String
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+# Dostępne przedziały czasowe agregacji
+BUCKET_UNITS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+}
+
+
+class elapsed_seconds(FunctionElement):
+    """Sekundy między dwiema datami w SQL; brak końca - do chwili obecnej (UTC), brak początku - 0"""
+
+    type = Float()
+    name = 'elapsed_seconds'
+    inherit_cache = True
+
+
+@compiles(elapsed_seconds)
+def _elapsed_seconds_default(element, compiler, **kw):
+    start, end = [compiler.process(c, **kw) for c in element.clauses]
+    return (
+        f"COALESCE(CAST(EXTRACT(EPOCH FROM (COALESCE({end}, timezone('utc', now())) - {start})) "
+        f"AS DOUBLE PRECISION), 0)"
+    )
+
+
+@compiles(elapsed_seconds, 'sqlite')
+def _elapsed_seconds_sqlite(element, compiler, **kw):
+    start, end = [compiler.process(c, **kw) for c in element.clauses]
+    return f"COALESCE(ROUND((julianday(COALESCE({end}, 'now')) - julianday({start})) * 86400.0, 3), 0)"
+
+
+@compiles(elapsed_seconds, 'mysql')
+def _elapsed_seconds_mysql(element, compiler, **kw):
+    start, end = [compiler.process(c, **kw) for c in element.clauses]
+    return f"COALESCE(TIMESTAMPDIFF(MICROSECOND, {start}, COALESCE({end}, UTC_TIMESTAMP(6))) / 1000000.0, 0)"
+
+
+class time_bucket(FunctionElement):
+    """Początek przedziału czasowego (hour, day, week - od poniedziałku) jako tekst ISO 8601"""
+
+    type = String()
+    name = 'time_bucket'
+    # Jednostka nie należy do klucza cache skompilowanych zapytań
+    inherit_cache = False
+
+    def __init__(self, column, unit):
+        if unit not in BUCKET_UNITS:
+            raise ValueError(f'Nieznany przedział: {unit}')
+        self.unit = unit
+        super().__init__(column)
+
+
+@compiles(time_bucket)
+def _time_bucket_default(element, compiler, **kw):
+    column = compiler.process(list(element.clauses)[0], **kw)
+    return f"to_char(date_trunc('{element.unit}', {column}), 'YYYY-MM-DD\"T\"HH24:MI:SS')"
+
+
+@compiles(time_bucket, 'sqlite')
+def _time_bucket_sqlite(element, compiler, **kw):
+    column = compiler.process(list(element.clauses)[0], **kw)
+    if element.unit == 'hour':
+        return f"strftime('%Y-%m-%dT%H:00:00', {column})"
+    if element.unit == 'week':
+        return f"strftime('%Y-%m-%dT00:00:00', {column}, 'weekday 0', '-6 days')"
+    return f"strftime('%Y-%m-%dT00:00:00', {column})"
+
+
+def bucket_start(value, unit):
+    """Początek przedziału zawierającego datę (ta sama reguła co time_bucket w SQL)"""
+    if unit == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def parse_utc(value):
+    """Data ISO 8601 (np. z parametru zapytania) jako UTC bez strefy - tak jak w bazie"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
@@ -0,0 +1,123 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Profil można wyłączyć (SQLITE_PROFILE=0), np. do pomiarów porównawczych
+SQLITE_PROFILE_ENABLED = os.environ.get('SQLITE_PROFILE', '1') == '1'
+
+
+def sqlite_pragmas():
+    """Ustawienia PRAGMA nakładane na każde połączenie SQLite z puli"""
+    return [
+        # WAL - odczyty nie blokują zapisu (i odwrotnie)
+        ('journal_mode', os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')),
+        # NORMAL jest bezpieczny w trybie WAL (utrata najwyżej ostatnich transakcji przy awarii zasilania)
+        ('synchronous', os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        # Wartość ujemna - rozmiar w KiB (domyślnie 64 MiB na połączenie)
+        ('cache_size', -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536))),
+        ('mmap_size', int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))),
+        ('temp_store', 'MEMORY'),
+        # Oczekiwanie na blokadę zapisu zamiast natychmiastowego "database is locked"
+        ('busy_timeout', int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))),
+    ]
+
+
+def apply_pragmas(dbapi_connection, pragmas=None):
+    """Nakłada ustawienia PRAGMA na połączenie DB-API"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas or sqlite_pragmas():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def _on_connect(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_pragmas(dbapi_connection)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install_sqlite_profile():
+    """Rejestruje nakładanie profilu na nowe połączenia SQLite (jednorazowo w procesie)"""
+    global _installed
+    if not SQLITE_PROFILE_ENABLED:
+        return False
+    with _install_lock:
+        if not _installed:
+            event.listen(Engine, 'connect', _on_connect)
+            _installed = True
+    return True
+
+
+def ensure_columns(engine, metadata):
+    """Dodaje do istniejących tabel kolumny zadeklarowane w modelach (ALTER TABLE, idempotentnie)
+
+    db.create_all() tworzy tylko brakujące tabele - kolumny dodane do modeli później trzeba
+    dopisać osobno. Zwraca listę "tabela.kolumna" dodanych kolumn.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    quote = engine.dialect.identifier_preparer.quote
+    added = []
+
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    logger.warning(f"Pominięto kolumnę {table.name}.{column.name} - NOT NULL bez wartości domyślnej")
+                    continue
+                # Sama kolumna (SQLite nie dodaje ograniczeń UNIQUE w ALTER TABLE) - unikalność jako indeks
+                ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                connection.exec_driver_sql(ddl)
+                if column.unique:
+                    connection.exec_driver_sql(
+                        f"CREATE UNIQUE INDEX IF NOT EXISTS {quote(f'uq_{table.name}_{column.name}')} "
+                        f"ON {quote(table.name)} ({quote(column.name)})"
+                    )
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def ensure_indexes(engine, metadata):
+    """Tworzy brakujące indeksy zadeklarowane w modelach (idempotentnie); zwraca nazwy utworzonych"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            missing = [c.name for c in index.columns if c.name not in columns]
+            if missing:
+                logger.warning(f"Pominięto indeks {index.name} - brak kolumn {', '.join(missing)}")
+                continue
+            index.create(bind=engine, checkfirst=True)
+            created.append(index.name)
+
+    if created and engine.dialect.name == 'sqlite':
+        # Aktualizacja statystyk, aby planista zapytań korzystał z nowych indeksów
+        with engine.begin() as connection:
+            connection.exec_driver_sql('ANALYZE')
+    return created
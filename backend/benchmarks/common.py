@@ -0,0 +1,80 @@
+"""Wspólne funkcje pomiarowe i zapis wyników benchmarków (JSON)"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+
+def percentile(samples, q):
+    """Percentyl q (0-1) z listy próbek"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(samples_ms, elapsed, errors=0):
+    """Podsumowanie serii pomiarów w milisekundach"""
+    count = len(samples_ms)
+    return {
+        'count': count,
+        'errors': errors,
+        'p50_ms': round(percentile(samples_ms, 0.50), 4) if count else None,
+        'p90_ms': round(percentile(samples_ms, 0.90), 4) if count else None,
+        'p99_ms': round(percentile(samples_ms, 0.99), 4) if count else None,
+        'mean_ms': round(sum(samples_ms) / count, 4) if count else None,
+        'ops_per_s': round(count / elapsed, 1) if elapsed else None
+    }
+
+
+def measure(fn, iterations, warmup=0):
+    """Wywołuje fn(i) podaną liczbę razy i zwraca podsumowanie czasów"""
+    for i in range(warmup):
+        fn(i)
+    samples = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return summarize(samples, time.perf_counter() - started)
+
+
+def environment_info():
+    """Wersja kodu i środowiska - pozwala porównywać wyniki między commitami"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': datetime.utcnow().isoformat()
+    }
+
+
+def write_results(benchmark, params, results, output=None, **extra):
+    """Zapisuje wyniki w formacie JSON (do pliku lub na standardowe wyjście)"""
+    report = {
+        'benchmark': benchmark,
+        'environment': environment_info(),
+        'params': params,
+        'results': results,
+        **extra
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return report
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Porównuje dwa pliki wyników benchmarku (np. z dwóch commitów) i wypisuje
+zmianę p50/p99 oraz przepustowości dla każdego pomiaru.
+
+Przykład:
+    python benchmarks/compare.py base.json head.json --threshold 0.1
+"""
+
+import argparse
+import json
+import sys
+
+
+def flatten(results, prefix=''):
+    """Spłaszcza zagnieżdżone wyniki do {nazwa: podsumowanie}"""
+    flat = {}
+    for name, value in results.items():
+        if isinstance(value, dict) and 'p50_ms' in value:
+            flat[prefix + name] = value
+        elif isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{name}."))
+    return flat
+
+
+def _change(base, head):
+    if not base or head is None:
+        return None
+    return (head - base) / base
+
+
+def compare(base, head, threshold):
+    """Zwraca wiersze porównania i listę pomiarów z regresją p50 powyżej progu"""
+    base_flat = flatten(base['results'])
+    head_flat = flatten(head['results'])
+    rows = []
+    regressions = []
+    for name in sorted(set(base_flat) & set(head_flat)):
+        b, h = base_flat[name], head_flat[name]
+        p50 = _change(b['p50_ms'], h['p50_ms'])
+        rows.append((name, b['p50_ms'], h['p50_ms'], p50, b['p99_ms'], h['p99_ms'],
+                     _change(b['ops_per_s'], h['ops_per_s'])))
+        if p50 is not None and p50 > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def _fmt(value, percent=False):
+    if value is None:
+        return '-'
+    return f"{value:+.1%}" if percent else f"{value:.3f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Porównanie wyników benchmarków')
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=0.1, help='dopuszczalny wzrost p50 (0.1 = 10%%)')
+    args = parser.parse_args()
+
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.head, encoding='utf-8') as f:
+        head = json.load(f)
+
+    print(f"base: {base['environment'].get('commit')}  head: {head['environment'].get('commit')}")
+    print(f"{'pomiar':40} {'p50 base':>10} {'p50 head':>10} {'zmiana':>8} {'p99 base':>10} {'p99 head':>10} {'ops/s':>8}")
+    rows, regressions = compare(base, head, args.threshold)
+    for name, b50, h50, c50, b99, h99, cops in rows:
+        print(f"{name:40} {_fmt(b50):>10} {_fmt(h50):>10} {_fmt(c50, True):>8} "
+              f"{_fmt(b99):>10} {_fmt(h99):>10} {_fmt(cops, True):>8}")
+
+    if regressions:
+        print(f"Regresja p50 powyżej {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
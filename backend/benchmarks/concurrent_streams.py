@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pomiar backendu przy wielu otwartych strumieniach SSE i wolnym document_processor -
+porównanie wdrożenia synchronicznego (Flask/gunicorn) z trybem ASGI (app/asgi.py).
+
+Scenariusz:
+1. otwiera --streams połączeń /api/research/events (każde obserwuje --tasks badań),
+2. w trakcie mierzy opóźnienia zwykłych żądań (wyszukiwanie gmin),
+3. publikuje --updates zmian postępu i mierzy czas dostarczenia do wszystkich strumieni,
+4. tworzy --creates badań; atrapa document_processor odpowiada z opóźnieniem --stub-delay,
+   mierzony jest czas przyjęcia wszystkich zleceń.
+
+Backend musi wysyłać zlecenia do atrapy uruchamianej przez ten skrypt, np.:
+
+    DOCUMENT_PROCESSOR_URL=http://127.0.0.1:5001 gunicorn -w 2 --threads 32 "app.app:create_app()"
+    python benchmarks/concurrent_streams.py --output sync.json
+
+    DOCUMENT_PROCESSOR_URL=http://127.0.0.1:5001 DISPATCHER_MAX_WORKERS=64 \\
+        uvicorn --factory app.asgi:create_asgi_app --workers 2 --port 5000
+    python benchmarks/concurrent_streams.py --output asgi.json
+
+    python benchmarks/compare.py sync.json asgi.json
+
+Zmiany postępu docierają od razu do strumieni w procesie, który obsłużył aktualizację,
+a do pozostałych procesów - z odczytem bazy co PROGRESS_POLL_INTERVAL sekund. Przy kilku
+procesach i --update-interval krótszym niż ten odstęp pośrednie wartości postępu są
+scalane, więc delivered_ratio spada poniżej 1, choć strumienie widzą ostatni stan.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from benchmarks.common import summarize, write_results
+from scripts.stub_document_processor import serve
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('concurrent_streams')
+
+
+class StreamClient:
+    """Klient SSE na surowym połączeniu asyncio (tysiące połączeń bez wątków)"""
+
+    def __init__(self, host, port, path, on_event):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.on_event = on_event
+        self.connected_at = None
+        self.error = None
+
+    async def run(self, started, stop):
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except OSError as e:
+            self.error = str(e)
+            return
+        try:
+            # HTTP/1.0 - odpowiedź bez kodowania chunked, do zamknięcia połączenia
+            writer.write(f"GET {self.path} HTTP/1.0\r\nHost: {self.host}\r\n"
+                         f"Accept: text/event-stream\r\n\r\n".encode('ascii'))
+            await writer.drain()
+            status = await reader.readline()
+            if b' 200 ' not in status:
+                self.error = status.decode('latin-1').strip() or 'brak odpowiedzi'
+                return
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            self.connected_at = time.perf_counter() - started
+
+            event = None
+            while not stop.is_set():
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode('utf-8').rstrip('\r\n')
+                if line.startswith('event: '):
+                    event = line[7:]
+                elif line.startswith('data: ') and event == 'progress':
+                    self.on_event(self, json.loads(line[6:]), time.perf_counter())
+        except (OSError, asyncio.IncompleteReadError) as e:
+            self.error = str(e)
+        finally:
+            writer.close()
+
+
+class DeliveryTracker:
+    """Czas od wysłania zmiany postępu do jej odbioru w strumieniach"""
+
+    def __init__(self):
+        self.sent = {}
+        self.latencies = []
+        # Liczone są tylko strumienie otwarte przed rozpoczęciem publikowania zmian
+        self.clients = None
+
+    def on_event(self, client, delta, received_at):
+        if self.clients is None or client not in self.clients:
+            return
+        key = (delta.get('task_id'), delta.get('progress'))
+        sent_at = self.sent.get(key)
+        if sent_at is not None:
+            self.latencies.append((received_at - sent_at) * 1000)
+
+
+def measure_requests(base_url, duration, concurrency):
+    """Opóźnienia zwykłych żądań wykonywanych w trakcie otwartych strumieni"""
+    samples = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def loop(i):
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                ok = session.get(f"{base_url}/api/municipalities/search",
+                                 params={'q': 'wo', 'limit': 10}, timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            with lock:
+                samples.append((time.perf_counter() - t0) * 1000)
+                errors[0] += 0 if ok else 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(loop, range(concurrency)))
+    return summarize(samples, time.perf_counter() - started, errors=errors[0])
+
+
+def create_researches(base_url, count, concurrency):
+    def create(i):
+        response = requests.post(f"{base_url}/api/research/", json={
+            'region_name': f"Region strumieni {i}", 'region_id': f"streams-{time.time_ns()}-{i}", 'reuse': False
+        }, timeout=30)
+        return response.json()['task_id']
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(create, range(count)))
+
+
+async def run(args, stub_state):
+    base_url = args.base_url.rstrip('/')
+    url = urlsplit(base_url)
+    loop = asyncio.get_running_loop()
+
+    # Obserwowane badania tworzymy przez API (trafiają do kolejki zleceń atrapy)
+    task_ids = await loop.run_in_executor(None, create_researches, base_url, args.tasks, 8)
+    path = f"/api/research/events?task_ids={','.join(task_ids)}"
+
+    tracker = DeliveryTracker()
+    stop = asyncio.Event()
+    started = time.perf_counter()
+    clients = [StreamClient(url.hostname, url.port or 80, path, tracker.on_event) for _ in range(args.streams)]
+    runners = []
+    for i in range(0, len(clients), 200):
+        # Połączenia otwierane porcjami, aby nie przepełnić kolejki listen serwera
+        runners.extend(asyncio.ensure_future(c.run(started, stop)) for c in clients[i:i + 200])
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(args.settle)
+    connected = [c.connected_at * 1000 for c in clients if c.connected_at is not None]
+    logger.info(f"Otwarte strumienie: {len(connected)}/{args.streams}")
+
+    results = {
+        'connect': summarize(connected, None, errors=args.streams - len(connected)),
+        'requests_during_streams': await loop.run_in_executor(
+            None, measure_requests, base_url, args.duration, args.concurrency),
+    }
+
+    tracker.clients = {c for c in clients if c.connected_at is not None and c.error is None}
+    session = requests.Session()
+    for i in range(args.updates):
+        task_id = task_ids[i % len(task_ids)]
+        progress = 1 + i // len(task_ids)
+        tracker.sent[(task_id, progress)] = time.perf_counter()
+        await loop.run_in_executor(None, lambda: session.put(
+            f"{base_url}/api/research/{task_id}/status", json={'progress': progress}, timeout=30))
+        await asyncio.sleep(args.update_interval)
+    await asyncio.sleep(args.settle)
+    expected = args.updates * len(tracker.clients)
+    results['delivery'] = summarize(tracker.latencies, None)
+    results['delivered_ratio'] = round(len(tracker.latencies) / expected, 4) if expected else None
+
+    # Wolny document_processor - czas przyjęcia wszystkich zleceń
+    accepted_before = stub_state.to_dict()['accepted']
+    t0 = time.perf_counter()
+    await loop.run_in_executor(None, create_researches, base_url, args.creates, args.concurrency)
+    deadline = t0 + args.dispatch_timeout
+    while stub_state.to_dict()['accepted'] - accepted_before < args.creates and time.perf_counter() < deadline:
+        await asyncio.sleep(0.1)
+    accepted = stub_state.to_dict()['accepted'] - accepted_before
+    elapsed = time.perf_counter() - t0
+    results['dispatch'] = {
+        'creates': args.creates,
+        'accepted': accepted,
+        'seconds': round(elapsed, 3),
+        'throughput': round(accepted / elapsed, 2) if elapsed else None
+    }
+
+    stop.set()
+    for runner in runners:
+        runner.cancel()
+    await asyncio.gather(*runners, return_exceptions=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Strumienie SSE i wolny document_processor: sync vs ASGI')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--streams', type=int, default=2000, help='liczba otwartych strumieni SSE')
+    parser.add_argument('--tasks', type=int, default=10, help='liczba badań obserwowanych przez strumienie')
+    parser.add_argument('--updates', type=int, default=50, help='liczba publikowanych zmian postępu')
+    parser.add_argument('--update-interval', type=float, default=0.05)
+    parser.add_argument('--creates', type=int, default=200, help='liczba badań tworzonych przy wolnej atrapie')
+    parser.add_argument('--concurrency', type=int, default=8, help='wątki wykonujące zwykłe żądania')
+    parser.add_argument('--duration', type=float, default=10.0, help='czas pomiaru zwykłych żądań w sekundach')
+    parser.add_argument('--settle', type=float, default=2.0, help='czas na ustabilizowanie połączeń i dostarczenie zmian')
+    parser.add_argument('--dispatch-timeout', type=float, default=120.0)
+    parser.add_argument('--stub-port', type=int, default=5001)
+    parser.add_argument('--stub-delay', type=float, default=1.0, help='opóźnienie odpowiedzi atrapy w sekundach')
+    parser.add_argument('--label', help='opis wdrożenia zapisywany w wynikach (np. sync, asgi)')
+    parser.add_argument('--output', help='plik wynikowy JSON (domyślnie stdout)')
+    args = parser.parse_args()
+
+    server, stub_state = serve(port=args.stub_port, delay=args.stub_delay)
+    try:
+        results = asyncio.run(run(args, stub_state))
+    finally:
+        server.shutdown()
+
+    write_results('concurrent_streams', vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Test obciążeniowy API backendu: przepustowość i opóźnienia p50/p99 dla
+wyszukiwania gmin, listy badań, paginacji, przyjmowania statusów, pobierania
+raportów i tworzenia badań.
+
+Backend musi działać na bazie z benchmarks/seed_database.py i wysyłać zlecenia
+do atrapy document_processor uruchamianej przez ten skrypt:
+
+    python benchmarks/seed_database.py --db /tmp/bench/orthank.db
+    DOCUMENT_PROCESSOR_URL=http://127.0.0.1:5001 <uruchomienie backendu na tej bazie>
+    python benchmarks/load_test.py --base-url http://127.0.0.1:5000 --output load.json
+
+Scenariusze modyfikujące dane (status, status_batch, create) można pominąć
+opcją --scenarios.
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from benchmarks.common import summarize, write_results
+from benchmarks.seed_database import NAME_PARTS, task_id_for, has_report
+from scripts.stub_document_processor import serve
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('load_test')
+
+DEFAULT_SCENARIOS = [
+    'search', 'list', 'list_fields', 'paginate', 'status', 'status_batch', 'report_download', 'create'
+]
+
+# Kody odpowiedzi uznawane za poprawne
+OK_STATUS_CODES = (200, 201, 202, 206, 304)
+
+
+class Worker:
+    """Stan jednego wątku obciążającego (sesja HTTP, kursor paginacji)"""
+
+    def __init__(self, base_url, research_count, seed):
+        self.base_url = base_url.rstrip('/')
+        self.research_count = research_count
+        self.session = requests.Session()
+        self.rnd = random.Random(seed)
+        self.cursor = ''
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    def random_task(self, with_report=False):
+        i = self.rnd.randint(1, self.research_count)
+        if with_report and not has_report(i):
+            i = i - 1 if i > 1 else i + 1
+        return task_id_for(i)
+
+    def search(self):
+        query = self.rnd.choice(NAME_PARTS)[:self.rnd.randint(2, 5)]
+        return self.session.get(self.url('/api/municipalities/search'), params={'q': query, 'limit': 15})
+
+    def list(self):
+        return self.session.get(self.url('/api/research/'), params={
+            'page': self.rnd.randint(1, 50), 'per_page': 20
+        })
+
+    def list_fields(self):
+        return self.session.get(self.url('/api/research/'), params={
+            'page': self.rnd.randint(1, 50), 'per_page': 20,
+            'fields': 'task_id,title,region_name,status,progress,start_time,updated_at'
+        })
+
+    def paginate(self):
+        response = self.session.get(self.url('/api/research/'), params={
+            'cursor': self.cursor, 'per_page': 50, 'fields': 'task_id,status'
+        })
+        if response.status_code == 200:
+            self.cursor = response.json().get('next_cursor') or ''
+        return response
+
+    def status(self):
+        return self.session.put(self.url(f"/api/research/{self.random_task()}/status"), json={
+            'progress': self.rnd.randint(0, 99), 'current_step': 'Analiza źródeł'
+        })
+
+    def status_batch(self):
+        updates = [
+            {'task_id': self.random_task(), 'progress': self.rnd.randint(0, 99)}
+            for _ in range(50)
+        ]
+        return self.session.post(self.url('/api/research/status/batch'), json={'updates': updates})
+
+    def report_download(self):
+        return self.session.get(
+            self.url(f"/api/research/{self.random_task(with_report=True)}/report/download"),
+            headers={'Accept-Encoding': self.rnd.choice(['gzip', 'identity'])}
+        )
+
+    def create(self):
+        region = self.rnd.randint(1, 10 ** 9)
+        return self.session.post(self.url('/api/research/'), json={
+            'region_name': f"Region {region}", 'region_id': str(region), 'reuse': False
+        })
+
+
+def run_scenario(name, base_url, research_count, concurrency, duration):
+    """Uruchamia scenariusz w wielu wątkach przez zadany czas"""
+    samples = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def loop(worker):
+        action = getattr(worker, name)
+        local_samples = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                response = action()
+                ok = response.status_code in OK_STATUS_CODES
+                response.close()
+            except requests.RequestException:
+                ok = False
+            local_samples.append((time.perf_counter() - t0) * 1000)
+            if not ok:
+                local_errors += 1
+        with lock:
+            samples.extend(local_samples)
+            errors.append(local_errors)
+
+    workers = [Worker(base_url, research_count, seed=i) for i in range(concurrency)]
+    threads = [threading.Thread(target=loop, args=(w,)) for w in workers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, time.perf_counter() - started, errors=sum(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Test obciążeniowy API backendu')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--scenarios', default=','.join(DEFAULT_SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='czas scenariusza w sekundach')
+    parser.add_argument('--stub-port', type=int, default=5001, help='port atrapy document_processor (0 - bez atrapy)')
+    parser.add_argument('--stub-delay', type=float, default=0.05)
+    parser.add_argument('--output', help='plik wynikowy JSON (domyślnie stdout)')
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = [s for s in scenarios if s not in DEFAULT_SCENARIOS]
+    if unknown:
+        parser.error(f"Nieznane scenariusze: {', '.join(unknown)}")
+
+    server = stub_state = None
+    if args.stub_port:
+        server, stub_state = serve(port=args.stub_port, delay=args.stub_delay)
+
+    # Liczba badań w bazie testowej wyznacza zakres losowanych task_id
+    total = requests.get(f"{args.base_url.rstrip('/')}/api/research/", params={'per_page': 1}).json()['total']
+    logger.info(f"Baza testowa: {total} badań")
+
+    results = {}
+    for name in scenarios:
+        logger.info(f"Scenariusz {name} ({args.concurrency} wątków, {args.duration} s)")
+        results[name] = run_scenario(name, args.base_url, total, args.concurrency, args.duration)
+        logger.info(f"{name}: {results[name]}")
+
+    extra = {}
+    if server is not None:
+        # Chwila na wysłanie zleceń z kolejki wychodzącej przed odczytem liczników atrapy
+        time.sleep(2)
+        extra['stub'] = stub_state.to_dict()
+        server.shutdown()
+
+    write_results('load_test', vars(args), results, args.output, **extra)
+
+
+if __name__ == "__main__":
+    main()
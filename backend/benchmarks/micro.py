@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Mikrobenchmarki backendu: serializacja (to_dict i projekcja fields=),
+wyszukiwanie gmin (budowa indeksu, MunicipalitySearchIndex, Municipality.search)
+oraz import TERYT (pełny i różnicowy) na syntetycznym pliku TERC.
+
+Aplikacja działa na tymczasowej bazie SQLite (DATABASE_URL jest nadpisywany),
+więc pomiar nie dotyka danych produkcyjnych.
+
+Przykład:
+    python benchmarks/micro.py --researches 20000 --output micro.json
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import measure, write_results
+from benchmarks.seed_database import FULL_MUNICIPALITY_COUNT, NAME_PARTS, seed_database
+
+QUERIES = ['Łódź', 'krak', 'nowa wola', 'dabrowa', 'świętochłowice', 'gora zielona', 'ost', '1234']
+
+
+def write_terc(path, count, rnd):
+    """Zapisuje syntetyczny plik TERC (województwa, powiaty i gminy)"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(['WOJ', 'POW', 'GMI', 'RODZ', 'NAZWA', 'NAZWA_DOD', 'STAN_NA'])
+        for woj in range(16):
+            woj_code = f"{woj * 2 + 2:02d}"
+            writer.writerow([woj_code, '', '', '', f"WOJEWÓDZTWO {woj}", 'województwo', '2025-01-01'])
+            for county in range(1, 21):
+                writer.writerow([woj_code, f"{county:02d}", '', '', f"powiat {county}", 'powiat', '2025-01-01'])
+        for i in range(count):
+            name = f"{rnd.choice(NAME_PARTS)} {i}"
+            writer.writerow([f"{i % 16 * 2 + 2:02d}", f"{i % 20 + 1:02d}", f"{i // 320 + 1:02d}",
+                             str(i % 3 + 1), name, 'gmina wiejska', '2025-01-01'])
+
+
+def bench_serialization(Research, Municipality, iterations):
+    from app.api.municipalities import MUNICIPALITY_FIELDS
+    from app.api.research import RESEARCH_FIELDS
+
+    results = {}
+    page = Research.query.order_by(Research.created_at.desc()).limit(100).all()
+    results['research_to_dict_100'] = measure(lambda i: [r.to_dict() for r in page], iterations)
+
+    fields = RESEARCH_FIELDS.parse('task_id,title,region_name,status,progress,start_time,duration')
+    rows = RESEARCH_FIELDS.project(
+        Research.query.order_by(Research.created_at.desc()), fields, required=('created_at', 'id')
+    ).limit(100).all()
+    results['research_fields_100'] = measure(
+        lambda i: RESEARCH_FIELDS.serialize_rows(rows, fields), iterations
+    )
+
+    municipalities = Municipality.query.order_by(Municipality.id).limit(500).all()
+    results['municipality_to_dict_500'] = measure(
+        lambda i: [m.to_dict() for m in municipalities], iterations
+    )
+    fields = MUNICIPALITY_FIELDS.parse('id,name,teryt_code,county_name,voivodeship_name')
+    rows = MUNICIPALITY_FIELDS.project(Municipality.query.order_by(Municipality.id), fields).limit(500).all()
+    results['municipality_fields_500'] = measure(
+        lambda i: MUNICIPALITY_FIELDS.serialize_rows(rows, fields), iterations
+    )
+    return results
+
+
+def bench_search(Municipality, iterations):
+    from app.services.municipality_search import (
+        MunicipalitySearchIndex, get_search_index, invalidate_search_index
+    )
+
+    payloads = [m.to_dict() for m in Municipality.query.order_by(Municipality.id).all()]
+    results = {
+        'index_build': measure(lambda i: MunicipalitySearchIndex(payloads), max(3, iterations // 100))
+    }
+
+    invalidate_search_index()
+    index = get_search_index()
+    results['index_search'] = measure(
+        lambda i: index.search_ids(QUERIES[i % len(QUERIES)], 20), iterations, warmup=len(QUERIES)
+    )
+    results['model_search'] = measure(
+        lambda i: Municipality.search(QUERIES[i % len(QUERIES)], 20), iterations, warmup=len(QUERIES)
+    )
+    return results
+
+
+def bench_import(tmp, municipalities, rounds):
+    import scripts.import_teryt_data as importer
+
+    rnd = random.Random(42)
+    csv_path = os.path.join(tmp, 'TERC.csv')
+    write_terc(csv_path, municipalities, rnd)
+    importer.DB_PATH = os.path.join(tmp, 'import.db')
+
+    def full_import(i):
+        if os.path.exists(importer.DB_PATH):
+            os.remove(importer.DB_PATH)
+        importer.create_database()
+        importer.import_teryt_data(csv_path, mode='full')
+
+    results = {'import_full': measure(full_import, rounds)}
+    # Import różnicowy na niezmienionym pliku - tylko porównanie skrótów treści
+    results['import_diff_unchanged'] = measure(
+        lambda i: importer.import_teryt_data(csv_path, mode='diff'), rounds
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mikrobenchmarki backendu')
+    parser.add_argument('--municipalities', type=int, default=FULL_MUNICIPALITY_COUNT)
+    parser.add_argument('--researches', type=int, default=20000)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--import-rounds', type=int, default=5)
+    parser.add_argument('--output', help='plik wynikowy JSON (domyślnie stdout)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'micro.db')}"
+        os.environ.setdefault('REPORTS_DIR', os.path.join(tmp, 'reports'))
+
+        from app.app import create_app
+        from app.extensions import db
+        from app.models.municipality import Municipality
+        from app.models.research import Research
+
+        app = create_app()
+        with app.app_context():
+            seed_database(db.engine, args.municipalities, args.researches, store_reports=False)
+            results = {}
+            results.update(bench_serialization(Research, Municipality, args.iterations))
+            results.update(bench_search(Municipality, args.iterations))
+            db.session.remove()
+            db.engine.dispose()
+
+        results.update(bench_import(tmp, args.municipalities, args.import_rounds))
+
+    write_results('micro', vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
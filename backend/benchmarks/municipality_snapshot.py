@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Zimny start procesu roboczego z danymi gmin z bazy i z migawki (mmap):
+czas zbudowania indeksu wyszukiwania, hierarchii i indeksu przestrzennego,
+czas obsługi pierwszych żądań oraz przyrost pamięci RSS (prywatnej i współdzielonej).
+
+Każdy pomiar działa w osobnym procesie, tak jak nowy worker gunicorn.
+
+Przykład:
+    python benchmarks/municipality_snapshot.py --runs 5 --output snapshot.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import summarize, write_results
+from benchmarks.seed_database import FULL_MUNICIPALITY_COUNT
+
+
+def memory_kb():
+    """RSS procesu oraz jego część prywatną (Linux, /proc/self/smaps_rollup)"""
+    result = {}
+    try:
+        with open('/proc/self/smaps_rollup', encoding='utf-8') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('Rss', 'Private_Clean', 'Private_Dirty', 'Shared_Clean'):
+                    result[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return result
+
+
+def worker(mode):
+    """Mierzy zimny start w bieżącym procesie i wypisuje wynik jako JSON"""
+    os.environ['MUNICIPALITY_SNAPSHOT'] = '1' if mode == 'snapshot' else '0'
+    from app.app import create_app
+
+    app = create_app()
+    client = app.test_client()
+    before = memory_kb()
+    started = time.perf_counter()
+    with app.app_context():
+        from app.services.hierarchy import get_hierarchy
+        from app.services.municipality_search import get_search_index
+        from app.services.spatial_index import get_spatial_index
+
+        get_search_index()
+        get_hierarchy()
+        get_spatial_index()
+    warm = time.perf_counter() - started
+
+    # Pierwsze żądania, które korzystają z danych gmin
+    started = time.perf_counter()
+    for path in ('/api/municipalities/?per_page=50', '/api/municipalities/1',
+                 '/api/municipalities/search?q=wola', '/api/municipalities/tree'):
+        client.get(path)
+    first_requests = time.perf_counter() - started
+    after = memory_kb()
+
+    print(json.dumps({
+        'warm_ms': warm * 1000,
+        'first_requests_ms': first_requests * 1000,
+        'rss_delta_kb': after.get('Rss', 0) - before.get('Rss', 0),
+        'private_delta_kb': (after.get('Private_Clean', 0) + after.get('Private_Dirty', 0)
+                             - before.get('Private_Clean', 0) - before.get('Private_Dirty', 0))
+    }))
+
+
+def prepare(municipalities):
+    """Baza z gminami, migawka i znacznik generacji w katalogu tymczasowym"""
+    from app.app import create_app
+    from app.extensions import db
+    from app.models.municipality import Municipality
+    from app.services.municipality_snapshot import SNAPSHOT_FILE, write_snapshot
+    from app.services.import_generation import GENERATION_FILE
+    from benchmarks.seed_database import seed_database
+
+    app = create_app()
+    with app.app_context():
+        seed_database(db.engine, municipalities, 0, store_reports=False)
+        rows = [dict(m.to_dict(), updated_at=m.updated_at) for m in Municipality.query.all()]
+    generation = str(time.time_ns())
+    write_snapshot(SNAPSHOT_FILE, rows, generation)
+    with open(GENERATION_FILE, 'w', encoding='utf-8') as f:
+        f.write(generation)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Zimny start workera: baza vs migawka gmin')
+    parser.add_argument('--municipalities', type=int, default=FULL_MUNICIPALITY_COUNT)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help='plik wynikowy JSON (domyślnie stdout)')
+    parser.add_argument('--worker', choices=['db', 'snapshot'], help=argparse.SUPPRESS)
+    parser.add_argument('--prepare', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.prepare:
+        prepare(args.municipalities)
+        return
+    if args.worker:
+        worker(args.worker)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'snapshot.db')}"
+        os.environ['DATA_DIR'] = tmp
+        # Dane przygotowuje osobny proces - workery startują bez niczego w pamięci
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--prepare',
+                        '--municipalities', str(args.municipalities)], check=True)
+
+        results = {}
+        for mode in ('db', 'snapshot'):
+            runs = []
+            for _ in range(args.runs):
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--worker', mode],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            results[mode] = {
+                'warm': summarize([r['warm_ms'] for r in runs], None),
+                'first_requests': summarize([r['first_requests_ms'] for r in runs], None),
+                'rss_delta_kb': max(r['rss_delta_kb'] for r in runs),
+                'private_delta_kb': max(r['private_delta_kb'] for r in runs)
+            }
+
+    parameters = {'municipalities': args.municipalities, 'runs': args.runs}
+    write_results('municipality_snapshot', parameters, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tworzy syntetyczną bazę do pomiarów: pełny zestaw gmin (2479), setki tysięcy
+badań i raportów. Dane są deterministyczne (stałe ziarno), więc wyniki z różnych
+commitów można porównywać.
+
+Treści raportów trafiają do magazynu raportów (REPORTS_DIR) - kilkaset różnych
+treści współdzielonych przez wiele raportów, tak jak przy deduplikacji.
+
+Przykład:
+    REPORTS_DIR=/tmp/bench/reports python benchmarks/seed_database.py \
+        --db /tmp/bench/orthank.db --researches 300000
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from app.extensions import db
+from app.services.report_store import report_store
+import app.models.municipality  # noqa: F401
+import app.models.research  # noqa: F401
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('benchmark_seed')
+
+# Liczba gmin w Polsce według TERYT
+FULL_MUNICIPALITY_COUNT = 2479
+
+STATUSES = ['completed'] * 6 + ['failed', 'stopped', 'running', 'queued']
+NAME_PARTS = ['Łódź', 'Kraków', 'Wola', 'Nowa', 'Stara', 'Góra', 'Żabno', 'Świętochłowice',
+              'Brzeg', 'Dąbrowa', 'Końskie', 'Ostrów', 'Sośnie', 'Zielona', 'Biała', 'Rzeczyca']
+TYPES = ['gmina miejska', 'gmina wiejska', 'gmina miejsko-wiejska']
+VOIVODESHIPS = ['dolnośląskie', 'kujawsko-pomorskie', 'lubelskie', 'lubuskie', 'łódzkie',
+                'małopolskie', 'mazowieckie', 'opolskie', 'podkarpackie', 'podlaskie',
+                'pomorskie', 'śląskie', 'świętokrzyskie', 'warmińsko-mazurskie',
+                'wielkopolskie', 'zachodniopomorskie']
+
+BATCH_SIZE = 10000
+
+
+def task_id_for(i):
+    """Identyfikator zadania i-tego badania (używany przez test obciążeniowy)"""
+    return f"bench_{i:07d}"
+
+
+def has_report(i):
+    """Czy i-te badanie ma raport"""
+    return i % 2 == 1
+
+
+def municipality_rows(count, rnd, now):
+    for i in range(1, count + 1):
+        woj = i % 16
+        county = i % 20 + 1
+        name = f"{rnd.choice(NAME_PARTS)} {rnd.choice(NAME_PARTS)}" if i % 3 else rnd.choice(NAME_PARTS)
+        yield {
+            'id': i,
+            'teryt_code': f"{woj * 2 + 2:02d}{county:02d}{i:04d}{i % 3 + 1}",
+            'name': f"{name} {i}",
+            'type': TYPES[i % 3],
+            'voivodeship_code': f"{woj * 2 + 2:02d}",
+            'voivodeship_name': VOIVODESHIPS[woj],
+            'county_code': f"{woj * 2 + 2:02d}{county:02d}",
+            'county_name': f"powiat {rnd.choice(NAME_PARTS).lower()} {county}",
+            'lat': round(49.0 + rnd.random() * 5.8, 6),
+            'lng': round(14.1 + rnd.random() * 10.0, 6),
+            'population': rnd.randint(1500, 500000),
+            'area': round(rnd.uniform(20, 500), 2),
+            'created_at': now,
+            'updated_at': now
+        }
+
+
+def research_rows(count, municipalities, rnd, now):
+    for i in range(1, count + 1):
+        municipality_id = rnd.randint(1, municipalities)
+        created = now + timedelta(seconds=i * 20)
+        status = rnd.choice(STATUSES)
+        start = created + timedelta(seconds=rnd.randint(1, 60))
+        finished = status in ('completed', 'failed', 'stopped')
+        yield {
+            'id': i,
+            'task_id': task_id_for(i),
+            'title': f"Badanie regionu: gmina {municipality_id}",
+            'status': status,
+            'progress': 100 if status == 'completed' else rnd.randint(0, 99),
+            'current_step': 'Analiza źródeł' if not finished else None,
+            'region_name': f"Gmina {municipality_id}",
+            'region_id': str(municipality_id),
+            'breadth': rnd.choice([2, 4, 6]),
+            'depth': rnd.choice([1, 2, 3]),
+            'config': {'language': 'pl', 'sources': rnd.randint(5, 30)},
+            'municipality_id': municipality_id,
+            'start_time': start,
+            'end_time': start + timedelta(seconds=rnd.randint(120, 7200)) if finished else None,
+            'created_at': created,
+            'updated_at': created
+        }
+
+
+def report_body(i, rnd):
+    sections = [f"## Sekcja {n}\n\n" + ' '.join(rnd.choice(NAME_PARTS) for _ in range(400))
+                for n in range(1, rnd.randint(3, 12))]
+    return f"# Raport {i}\n\n" + '\n\n'.join(sections)
+
+
+def _insert_batches(connection, table, rows):
+    batch = []
+    inserted = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            connection.execute(table.insert(), batch)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        connection.execute(table.insert(), batch)
+        inserted += len(batch)
+    return inserted
+
+
+def seed_database(engine, municipalities=FULL_MUNICIPALITY_COUNT, researches=200000,
+                  distinct_reports=200, seed_value=42, store_reports=True):
+    """Wypełnia pustą bazę danymi syntetycznymi; zwraca liczby utworzonych rekordów"""
+    rnd = random.Random(seed_value)
+    now = datetime(2025, 1, 1)
+    db.metadata.create_all(engine)
+    tables = db.metadata.tables
+
+    # Pula treści raportów zapisanych w magazynie (z kompresją i deduplikacją)
+    blobs = []
+    if store_reports:
+        for i in range(distinct_reports):
+            blobs.append(report_store.put_text(report_body(i, rnd)))
+
+    def report_rows():
+        for i in range(1, researches + 1):
+            if not has_report(i):
+                continue
+            row = {
+                'research_id': i, 'type': 'markdown', 'title': f"Raport z badania {i}",
+                'created_at': now, 'updated_at': now
+            }
+            if blobs:
+                blob = blobs[i % len(blobs)]
+                row.update(content_hash=blob.digest, content_encoding=blob.encoding,
+                           content_size=blob.size, stored_size=blob.stored_size)
+            yield row
+
+    with engine.begin() as connection:
+        counts = {
+            'municipalities': _insert_batches(connection, tables['municipalities'],
+                                              municipality_rows(municipalities, rnd, now)),
+            'researches': _insert_batches(connection, tables['researches'],
+                                          research_rows(researches, municipalities, rnd, now)),
+            'reports': _insert_batches(connection, tables['research_reports'], report_rows())
+        }
+        if engine.dialect.name == 'sqlite':
+            connection.exec_driver_sql('ANALYZE')
+    counts['distinct_reports'] = len(blobs)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Syntetyczna baza do pomiarów wydajności')
+    parser.add_argument('--db', required=True, help='ścieżka pliku bazy SQLite (zostanie nadpisany)')
+    parser.add_argument('--municipalities', type=int, default=FULL_MUNICIPALITY_COUNT)
+    parser.add_argument('--researches', type=int, default=200000)
+    parser.add_argument('--distinct-reports', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+
+    started = time.perf_counter()
+    engine = create_engine(f'sqlite:///{args.db}')
+    counts = seed_database(engine, args.municipalities, args.researches,
+                           args.distinct_reports, args.seed)
+    engine.dispose()
+    counts['seconds'] = round(time.perf_counter() - started, 2)
+    logger.info(f"Utworzono bazę {args.db}")
+    print(json.dumps(counts, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Porównanie wydajności bazy SQLite przed i po zastosowaniu profilu
+(WAL + PRAGMA z app/services/sqlite_profile.py oraz indeksy z modeli).
+
+Obie bazy mają te same dane syntetyczne; baza "before" nie ma nowych indeksów
+i używa domyślnych ustawień SQLite. Wynik (JSON) zawiera p50/p99 i przepustowość
+zapytań odpowiadających endpointom listy badań, /pending, listy powiatów,
+pobierania raportu oraz aktualizacji statusu.
+
+Przykład:
+    python benchmarks/sqlite_profile.py --researches 200000 --output sqlite_profile.json
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, text
+
+from app.services.sqlite_profile import apply_pragmas
+from benchmarks.common import measure, write_results
+from benchmarks.seed_database import FULL_MUNICIPALITY_COUNT, seed_database, task_id_for
+
+# Indeksy spoza pierwotnego schematu - usuwane w bazie "before"
+PROFILE_INDEXES = [
+    'ix_researches_created_at_id',
+    'ix_researches_municipality_created_at',
+    'ix_researches_status_created_at',
+    'ix_research_reports_research_type_created',
+    'ix_municipalities_hierarchy',
+    'ix_municipalities_county_code',
+    'ix_municipalities_name',
+]
+
+QUERIES = {
+    'research_list': (
+        'SELECT id, task_id, status, progress, created_at FROM researches '
+        'ORDER BY created_at DESC, id DESC LIMIT 20 OFFSET :offset'
+    ),
+    'research_list_by_status': (
+        'SELECT id, task_id, status, progress, created_at FROM researches WHERE status = :status '
+        'ORDER BY created_at DESC, id DESC LIMIT 20'
+    ),
+    'research_list_by_municipality': (
+        'SELECT id, task_id, status, progress, created_at FROM researches '
+        'WHERE municipality_id = :municipality_id ORDER BY created_at DESC, id DESC LIMIT 20'
+    ),
+    'pending': "SELECT * FROM researches WHERE status = 'queued' ORDER BY created_at LIMIT 100",
+    'counties': (
+        'SELECT DISTINCT county_code, county_name FROM municipalities '
+        'WHERE voivodeship_code = :voivodeship_code ORDER BY county_name'
+    ),
+    'latest_report': (
+        "SELECT id, updated_at FROM research_reports WHERE research_id = :research_id "
+        "AND type = 'markdown' ORDER BY created_at DESC LIMIT 1"
+    ),
+}
+
+
+def seed(path, municipalities, researches):
+    """Tworzy bazę z danymi syntetycznymi (bez treści raportów)"""
+    engine = create_engine(f'sqlite:///{path}')
+    seed_database(engine, municipalities, researches, store_reports=False)
+    engine.dispose()
+
+
+def run_suite(path, profiled, municipalities, researches, iterations):
+    """Mierzy zapytania i zapisy na podanej bazie"""
+    engine = create_engine(f'sqlite:///{path}')
+    if profiled:
+        event.listen(engine, 'connect', lambda connection, record: apply_pragmas(connection))
+    else:
+        event.listen(engine, 'connect',
+                     lambda connection, record: apply_pragmas(connection, [('journal_mode', 'DELETE')]))
+
+    rnd = random.Random(7)
+    results = {}
+    with engine.connect() as connection:
+        params = {
+            'research_list': lambda i: {'offset': rnd.randint(0, 50) * 20},
+            'research_list_by_status': lambda i: {'status': rnd.choice(['running', 'failed', 'queued'])},
+            'research_list_by_municipality': lambda i: {'municipality_id': rnd.randint(1, municipalities)},
+            'pending': lambda i: {},
+            'counties': lambda i: {'voivodeship_code': f"{rnd.randint(0, 15) * 2 + 2:02d}"},
+            'latest_report': lambda i: {'research_id': rnd.randint(1, researches)},
+        }
+        for name, sql in QUERIES.items():
+            statement = text(sql)
+            results[name] = measure(
+                lambda i: connection.execute(statement, params[name](i)).all(), iterations
+            )
+
+    # Aktualizacje statusu - każda w osobnej transakcji, jak w PUT /<task_id>/status
+    update = text('UPDATE researches SET progress = :progress, updated_at = :now WHERE task_id = :task_id')
+
+    def write(i):
+        with engine.begin() as connection:
+            connection.execute(update, {
+                'progress': i % 100, 'now': datetime.utcnow(),
+                'task_id': task_id_for(rnd.randint(1, researches))
+            })
+
+    results['status_update'] = measure(write, max(100, iterations // 2))
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pomiar profilu wydajności SQLite (przed/po)')
+    parser.add_argument('--municipalities', type=int, default=FULL_MUNICIPALITY_COUNT)
+    parser.add_argument('--researches', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--output', help='plik wynikowy JSON (domyślnie stdout)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before_path = os.path.join(tmp, 'before.db')
+        after_path = os.path.join(tmp, 'after.db')
+        seed(before_path, args.municipalities, args.researches)
+        seed(after_path, args.municipalities, args.researches)
+
+        engine = create_engine(f'sqlite:///{before_path}')
+        with engine.begin() as connection:
+            for name in PROFILE_INDEXES:
+                connection.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+        engine.dispose()
+        engine = create_engine(f'sqlite:///{after_path}')
+        with engine.begin() as connection:
+            connection.exec_driver_sql('ANALYZE')
+        engine.dispose()
+
+        before = run_suite(before_path, False, args.municipalities, args.researches, args.iterations)
+        after = run_suite(after_path, True, args.municipalities, args.researches, args.iterations)
+
+    speedup = {
+        name: round(before[name]['p50_ms'] / after[name]['p50_ms'], 2) if after[name]['p50_ms'] else None
+        for name in before
+    }
+    write_results('sqlite_profile', vars(args), {'before': before, 'after': after},
+                  args.output, speedup_p50=speedup)
+
+
+if __name__ == "__main__":
+    main()
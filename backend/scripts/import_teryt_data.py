@@ -2,13 +2,21 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import csv
 import json
+import hashlib
+import argparse
 import requests
 import sqlite3
+import time
 from datetime import datetime
 import logging
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.municipality_snapshot import write_snapshot
+
 # Konfiguracja logowania
 logging.basicConfig(
     level=logging.INFO,
@@ -19,6 +27,8 @@ logger = logging.getLogger('teryt_importer')
 # Ścieżki plików
 DB_PATH = os.environ.get('DB_PATH', '/app/data/municipalities.db')
 DATA_DIR = os.environ.get('DATA_DIR', '/app/data')
+GENERATION_FILE = os.path.join(DATA_DIR, 'teryt_generation')
+SNAPSHOT_PATH = os.path.join(DATA_DIR, 'municipalities.snapshot')
 TERYT_URL = "https://eteryt.stat.gov.pl/eTeryt/rejestr_teryt/udostepnianie_danych/baza_teryt/uzytkownicy_indywidualni/pobieranie/pliki_pelne.aspx"
 
 def ensure_data_dir():
@@ -79,6 +89,7 @@ def create_database():
         area REAL,
         bip_url TEXT,
         official_website TEXT,
+        content_hash TEXT,
         created_at TEXT,
         updated_at TEXT
     )
@@ -131,79 +142,192 @@ def map_voivodeship_code(code):
     }
     return voivodeships.get(code, 'nieznane')
 
-def import_teryt_data(csv_path):
-    """Importuje dane z pliku CSV TERYT do bazy danych"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    now = datetime.now().isoformat()
-    count = 0
-    
-    # Pobieranie danych powiatów (w prawdziwym przypadku pobralibyśmy też dane powiatów)
-    county_names = {
-        '0201': 'bolesławiecki',
-        '1201': 'krakowski',
-        '1401': 'warszawski',
-        '2415': 'katowicki',
-        '3001': 'gdański'
-    }
-    
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        next(reader)  # Pomijamy nagłówek
+# Domyślne nazwy powiatów dla plików bez wierszy powiatów (przykładowe dane)
+DEFAULT_COUNTY_NAMES = {
+    '0201': 'bolesławiecki',
+    '1201': 'krakowski',
+    '1401': 'warszawski',
+    '2415': 'katowicki',
+    '3001': 'gdański'
+}
+
+# Rodzaje jednostek z pełnego pliku TERC, które są gminami
+# (4, 5 - miasto i obszar wiejski gminy miejsko-wiejskiej, 8, 9 - dzielnice i delegatury)
+TERC_MUNICIPALITY_KINDS = ('1', '2', '3')
+
+# Kolumny ładowane do tabeli municipalities (bez współrzędnych, które uzupełnia geolokalizacja)
+IMPORT_COLUMNS = (
+    'teryt_code', 'name', 'type', 'voivodeship_code', 'voivodeship_name',
+    'county_code', 'county_name', 'bip_url', 'content_hash', 'created_at', 'updated_at'
+)
+
+DEFAULT_CHUNK_SIZE = 5000
+
+def map_municipality_type(rodz_code, type_suffix, county_kind=None):
+    """Ustala typ gminy na podstawie kodu rodzaju TERYT"""
+    if rodz_code == '1' and county_kind == 'miasto na prawach powiatu':
+        return 'miasto na prawach powiatu'
+    if rodz_code == '1':
+        return 'gmina miejska'
+    if rodz_code == '2' and 'miasto-gmina' in type_suffix:
+        return 'gmina miejsko-wiejska'
+    if rodz_code == '2':
+        return 'gmina wiejska'
+    if rodz_code == '3':
+        return 'gmina miejsko-wiejska'
+    if rodz_code == '4':
+        return 'miasto na prawach powiatu'
+    return 'nieznany'
+
+def content_hash(record):
+    """Skrót treści rekordu gminy - służy do wykrywania zmian w trybie różnicowym"""
+    raw = '\x1f'.join(record[key] or '' for key in IMPORT_COLUMNS[1:8])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def iter_terc_records(csv_path):
+    """Strumieniowo odczytuje rekordy gmin z pliku TERC (pełnego lub przykładowego)"""
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        header_line = f.readline()
+        delimiter = ';' if header_line.count(';') > header_line.count(',') else ','
+        header = [h.strip().upper() for h in next(csv.reader([header_line], delimiter=delimiter))]
+        columns = {name: idx for idx, name in enumerate(header)}
         
-        for row in reader:
-            woj_code = row[0]
-            pow_code = row[1]
-            gmi_code = row[2]
-            rodz_code = row[3]
-            name = row[4]
-            type_suffix = row[5]
-            
-            # Tworzenie kodu TERYT
-            teryt_code = f"{woj_code}{pow_code}{gmi_code}{rodz_code}"
-            
-            # Ustalanie typu gminy
-            if rodz_code == '1':
-                municipality_type = 'gmina miejska'
-            elif rodz_code == '2' and 'miasto-gmina' in type_suffix:
-                municipality_type = 'gmina miejsko-wiejska'
-            elif rodz_code == '2':
-                municipality_type = 'gmina wiejska'
-            elif rodz_code == '3':
-                municipality_type = 'gmina miejsko-wiejska'
-            elif rodz_code == '4':
-                municipality_type = 'miasto na prawach powiatu'
-            else:
-                municipality_type = 'nieznany'
-            
-            # Pobieranie nazwy województwa
-            voivodeship_name = map_voivodeship_code(woj_code)
+        # Pełny plik TERC z GUS ma kolumnę NAZWA_DOD i wiersze województw oraz powiatów
+        full_terc = 'NAZWA_DOD' in columns
+        suffix_column = columns.get('NAZWA_DOD', columns.get('NAZDOD'))
+        
+        voivodeship_names = {}
+        county_names = dict(DEFAULT_COUNTY_NAMES)
+        county_kinds = {}
+        
+        for row in csv.reader(f, delimiter=delimiter):
+            if not row:
+                continue
+            woj_code = row[columns['WOJ']].strip()
+            pow_code = row[columns['POW']].strip()
+            gmi_code = row[columns['GMI']].strip()
+            rodz_code = row[columns['RODZ']].strip()
+            name = row[columns['NAZWA']].strip()
+            type_suffix = row[suffix_column].strip() if suffix_column is not None else ''
             
-            # Pobieranie nazwy powiatu
+            # Wiersze województw i powiatów uzupełniają słowniki nazw
+            if not pow_code:
+                voivodeship_names[woj_code] = name.lower()
+                continue
             county_code = f"{woj_code}{pow_code}"
-            county_name = county_names.get(county_code, '')
+            if not gmi_code:
+                county_names[county_code] = name
+                county_kinds[county_code] = type_suffix
+                continue
+            if full_terc and rodz_code not in TERC_MUNICIPALITY_KINDS:
+                continue
             
-            # Generowanie przykładowego URL BIP (w rzeczywistym przypadku trzeba pobrać prawdziwe adresy)
-            bip_url = f"https://bip.{name.lower().replace(' ', '')}.pl"
-            
-            # Wstawianie danych do bazy
-            c.execute('''
-            INSERT OR REPLACE INTO municipalities 
-            (teryt_code, name, type, voivodeship_code, voivodeship_name, county_code, county_name, 
-             bip_url, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                teryt_code, name, municipality_type, woj_code, voivodeship_name, county_code, 
-                county_name, bip_url, now, now
-            ))
+            yield {
+                'teryt_code': f"{woj_code}{pow_code}{gmi_code}{rodz_code}",
+                'name': name,
+                'type': map_municipality_type(rodz_code, type_suffix, county_kinds.get(county_code)),
+                'voivodeship_code': woj_code,
+                'voivodeship_name': voivodeship_names.get(woj_code) or map_voivodeship_code(woj_code),
+                'county_code': county_code,
+                'county_name': county_names.get(county_code, ''),
+                # Generowanie przykładowego URL BIP (w rzeczywistym przypadku trzeba pobrać prawdziwe adresy)
+                'bip_url': f"https://bip.{name.lower().replace(' ', '')}.pl"
+            }
+
+def iter_chunks(iterable, size):
+    """Dzieli strumień na porcje o zadanym rozmiarze"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def connect_for_import(db_path=None):
+    """Otwiera połączenie SQLite z ustawieniami przyspieszającymi import masowy"""
+    conn = sqlite3.connect(db_path or DB_PATH, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-65536')
+    return conn
+
+def ensure_import_columns(conn):
+    """Dodaje kolumnę content_hash do istniejącej tabeli gmin (jednorazowo)"""
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(municipalities)')}
+    if 'content_hash' not in existing:
+        conn.execute('ALTER TABLE municipalities ADD COLUMN content_hash TEXT')
+
+def import_teryt_data(csv_path, mode='full', chunk_size=DEFAULT_CHUNK_SIZE, prune=False):
+    """Importuje dane z pliku CSV TERYT do bazy danych (strumieniowo, w jednej transakcji)"""
+    conn = connect_for_import()
+    ensure_import_columns(conn)
+    
+    # Ten sam format i strefa (UTC) co daty zapisywane przez SQLAlchemy - porównywalne tekstowo w SQLite
+    now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    
+    placeholders = ', '.join('?' for _ in IMPORT_COLUMNS)
+    # UPSERT zachowuje klucz główny i datę utworzenia (w przeciwieństwie do INSERT OR REPLACE)
+    upsert_sql = f'''
+    INSERT INTO municipalities ({', '.join(IMPORT_COLUMNS)})
+    VALUES ({placeholders})
+    ON CONFLICT(teryt_code) DO UPDATE SET
+        {', '.join(f"{c} = excluded.{c}" for c in IMPORT_COLUMNS[1:9])},
+        updated_at = excluded.updated_at
+    '''
+    update_sql = f'''
+    UPDATE municipalities SET {', '.join(f"{c} = ?" for c in IMPORT_COLUMNS[1:9])}, updated_at = ?
+    WHERE teryt_code = ?
+    '''
+    
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        existing = {}
+        if mode == 'diff' or prune:
+            existing = dict(conn.execute('SELECT teryt_code, content_hash FROM municipalities'))
+        seen = set()
+        
+        for chunk in iter_chunks(iter_terc_records(csv_path), chunk_size):
+            inserts = []
+            updates = []
+            for record in chunk:
+                record['content_hash'] = content_hash(record)
+                teryt_code = record['teryt_code']
+                seen.add(teryt_code)
+                
+                if mode != 'diff' or teryt_code not in existing:
+                    stats['inserted' if teryt_code not in existing else 'updated'] += 1
+                    inserts.append(tuple(record[c] for c in IMPORT_COLUMNS[:9]) + (now, now))
+                elif existing[teryt_code] != record['content_hash']:
+                    stats['updated'] += 1
+                    updates.append(
+                        tuple(record[c] for c in IMPORT_COLUMNS[1:9]) + (now, teryt_code)
+                    )
+                else:
+                    stats['unchanged'] += 1
             
-            count += 1
-    
-    conn.commit()
-    conn.close()
-    
-    logger.info(f"Zaimportowano {count} rekordów gmin do bazy danych")
+            if inserts:
+                conn.executemany(upsert_sql, inserts)
+            if updates:
+                conn.executemany(update_sql, updates)
+        
+        if prune:
+            removed = [(code,) for code in existing if code not in seen]
+            conn.executemany('DELETE FROM municipalities WHERE teryt_code = ?', removed)
+            stats['deleted'] = len(removed)
+        
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    
+    logger.info(f"Zaimportowano dane gmin (tryb {mode}): {stats}")
+    return stats
 
 def get_geolocation_data():
     """
@@ -225,65 +349,116 @@ def get_geolocation_data():
         ('3001011', 54.3520, 18.6466),  # Gdańsk
     ]
     
-    for teryt, lat, lng in geo_data:
-        c.execute('''
-        UPDATE municipalities SET lat = ?, lng = ? WHERE teryt_code = ?
-        ''', (lat, lng, teryt))
+    # Aktualizujemy tylko wiersze, w których współrzędne faktycznie się zmieniły
+    before = conn.total_changes
+    c.executemany('''
+    UPDATE municipalities SET lat = ?, lng = ?
+    WHERE teryt_code = ? AND (lat IS NOT ? OR lng IS NOT ?)
+    ''', [(lat, lng, teryt, lat, lng) for teryt, lat, lng in geo_data])
+    changed = conn.total_changes - before
     
     conn.commit()
     conn.close()
     
-    logger.info("Zaktualizowano dane geolokalizacyjne")
+    logger.info(f"Zaktualizowano dane geolokalizacyjne ({changed} zmian)")
+    return changed
 
 def export_to_json():
-    """Eksportuje dane z bazy do pliku JSON"""
+    """Eksportuje dane z bazy do pliku JSON (strumieniowo - rekord po rekordzie)"""
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    # Pobieranie wszystkich gmin
-    c.execute('SELECT * FROM municipalities')
-    rows = c.fetchall()
-    
-    # Konwersja do słowników
-    municipalities = []
-    for row in rows:
-        municipality = {key: row[key] for key in row.keys()}
-        municipalities.append(municipality)
     
-    # Zapisywanie do pliku JSON
+    # Zapis do pliku tymczasowego i zamiana atomowa - czytelnicy nie widzą niepełnego pliku
     json_path = os.path.join(DATA_DIR, 'municipalities.json')
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(municipalities, f, ensure_ascii=False, indent=2)
-    
-    conn.close()
+    tmp_path = f"{json_path}.tmp"
+    count = 0
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('[')
+            for row in conn.execute('SELECT * FROM municipalities ORDER BY id'):
+                f.write(',\n  ' if count else '\n  ')
+                f.write(json.dumps(dict(row), ensure_ascii=False))
+                count += 1
+            f.write('\n]\n' if count else ']\n')
+        os.replace(tmp_path, json_path)
+    finally:
+        conn.close()
     
     logger.info(f"Wyeksportowano dane do JSON: {json_path}")
-    logger.info(f"Łącznie wyeksportowano {len(municipalities)} rekordów gmin")
+    logger.info(f"Łącznie wyeksportowano {count} rekordów gmin")
+
+def export_snapshot(generation):
+    """Zapisuje binarną migawkę gmin odwzorowywaną w pamięci przez procesy backendu"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = (dict(row) for row in conn.execute('SELECT * FROM municipalities'))
+        count = write_snapshot(SNAPSHOT_PATH, rows, generation)
+    finally:
+        conn.close()
+    
+    logger.info(f"Zapisano migawkę gmin: {SNAPSHOT_PATH} ({count} rekordów, generacja {generation})")
+    return count
 
-def main():
+def bump_import_generation(generation=None):
+    """Zapisuje nowy znacznik generacji importu (unieważnia cache backendu)"""
+    generation = generation or str(time.time_ns())
+    tmp_path = f"{GENERATION_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(generation)
+    os.replace(tmp_path, GENERATION_FILE)
+    
+    logger.info(f"Zapisano znacznik generacji importu: {generation}")
+    return generation
+
+def parse_args(argv=None):
+    """Parsuje argumenty wiersza poleceń"""
+    parser = argparse.ArgumentParser(description='Import danych TERYT do bazy gmin')
+    parser.add_argument('--terc', help='ścieżka do pliku TERC (domyślnie przykładowe dane)')
+    parser.add_argument('--mode', choices=['full', 'diff'], default=os.environ.get('IMPORT_MODE', 'diff'),
+                        help='full - wszystkie rekordy, diff - tylko zmienione (domyślnie)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--prune', action='store_true', help='usuwa gminy nieobecne w pliku')
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Główna funkcja importująca dane"""
+    args = parse_args(argv)
     logger.info("Rozpoczęcie importu danych TERYT")
     
     # Upewniamy się, że katalog danych istnieje
     ensure_data_dir()
     
     # Pobieramy dane TERYT
-    csv_path = download_teryt_data()
+    csv_path = args.terc or download_teryt_data()
     
     # Tworzymy bazę danych
     create_database()
     
     # Importujemy dane TERYT
-    import_teryt_data(csv_path)
+    stats = import_teryt_data(csv_path, mode=args.mode, chunk_size=args.chunk_size, prune=args.prune)
     
     # Aktualizujemy dane geolokalizacyjne
-    get_geolocation_data()
+    geo_changes = get_geolocation_data()
+    
+    changed = stats['inserted'] or stats['updated'] or stats['deleted'] or geo_changes
+    json_path = os.path.join(DATA_DIR, 'municipalities.json')
+    if (not changed and os.path.exists(json_path) and os.path.exists(SNAPSHOT_PATH)
+            and os.path.exists(GENERATION_FILE)):
+        logger.info("Brak zmian w danych gmin - pomijam eksport i zmianę generacji")
+        return
     
     # Eksportujemy dane do JSON
     export_to_json()
     
+    # Migawka musi powstać przed zmianą generacji - backend otwiera ją po wykryciu nowej generacji
+    generation = str(time.time_ns())
+    export_snapshot(generation)
+    
+    # Informujemy backend o zmianie danych gmin
+    bump_import_generation(generation)
+    
     logger.info("Import danych TERYT zakończony pomyślnie")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
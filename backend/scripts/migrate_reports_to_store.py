@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Przenosi treść starszych raportów z kolumny research_reports.content
+do magazynu raportów adresowanego treścią (app/services/report_store.py).
+
+Raporty są przetwarzane porcjami, więc w pamięci jest naraz tylko jedna porcja.
+"""
+
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.app import create_app
+from app.extensions import db
+from app.models.research import ResearchReport
+from sqlalchemy.orm import undefer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('report_migration')
+
+BATCH_SIZE = 100
+
+def migrate_reports(batch_size=BATCH_SIZE):
+    """Przenosi raporty inline do magazynu raportów"""
+    migrated = 0
+    last_id = 0
+
+    while True:
+        reports = ResearchReport.query.options(undefer(ResearchReport.content)).filter(
+            ResearchReport.id > last_id,
+            ResearchReport.content_hash.is_(None),
+            ResearchReport.content.isnot(None)
+        ).order_by(ResearchReport.id).limit(batch_size).all()
+
+        if not reports:
+            break
+
+        for report in reports:
+            report.store_content(report.content)
+            last_id = report.id
+
+        db.session.commit()
+        db.session.expunge_all()
+        migrated += len(reports)
+        logger.info(f"Przeniesiono {migrated} raportów")
+
+    return migrated
+
+def main():
+    app = create_app()
+    with app.app_context():
+        migrated = migrate_reports()
+    logger.info(f"Migracja raportów zakończona: {migrated} raportów")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Aktualizuje istniejącą bazę do schematu z modeli: tworzy brakujące tabele, dodaje brakujące
+kolumny (ALTER TABLE ADD COLUMN) i indeksy (CREATE INDEX IF NOT EXISTS) oraz przełącza bazę
+SQLite w tryb WAL. Migrację można uruchamiać wielokrotnie.
+"""
+
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.app import create_app
+from app.extensions import db
+from app.services.sqlite_profile import ensure_columns, ensure_indexes
+
+# Import modeli rejestruje ich tabele i indeksy w metadanych
+import app.models.municipality  # noqa: F401
+import app.models.research  # noqa: F401
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('sqlite_index_migration')
+
+def migrate_indexes():
+    """Dodaje brakujące indeksy i ustawia tryb dziennika WAL"""
+    engine = db.engine
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            mode = connection.exec_driver_sql('PRAGMA journal_mode=WAL').scalar()
+            logger.info(f"Tryb dziennika SQLite: {mode}")
+
+    # Nowe tabele (np. kampanie, kolejka zleceń) i kolumny dodane do istniejących tabel
+    db.metadata.create_all(engine, checkfirst=True)
+    for name in ensure_columns(engine, db.metadata):
+        logger.info(f"Dodano kolumnę {name}")
+
+    created = ensure_indexes(engine, db.metadata)
+    for name in created:
+        logger.info(f"Utworzono indeks {name}")
+    return created
+
+def main():
+    app = create_app()
+    with app.app_context():
+        created = migrate_indexes()
+    logger.info(f"Migracja indeksów zakończona: utworzono {len(created)} indeksów")
+
+if __name__ == "__main__":
+    main()
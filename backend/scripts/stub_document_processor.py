@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lokalna atrapa document_processor do testów i pomiarów backendu.
+
+Przyjmuje zlecenia /api/deep_research/start i /api/deep_research/stop,
+opcjonalnie z opóźnieniem i losowymi błędami, i liczy powtórzone zlecenia
+(na podstawie nagłówka Idempotency-Key).
+
+Przykład:
+    python scripts/stub_document_processor.py --port 5001 --delay 0.2 --fail-rate 0.1
+    DOCUMENT_PROCESSOR_URL=http://localhost:5001 flask run
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('stub_document_processor')
+
+
+class StubState:
+    """Liczniki przyjętych zleceń"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.accepted = {}
+        self.duplicates = 0
+        self.failures = 0
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'accepted': len(self.accepted),
+                'duplicates': self.duplicates,
+                'failures': self.failures
+            }
+
+
+def make_handler(state, delay, fail_rate):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _reply(self, code, body):
+            raw = json.dumps(body).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+
+            if self.path not in ('/api/deep_research/start', '/api/deep_research/stop'):
+                self._reply(404, {'error': 'not found'})
+                return
+
+            if delay:
+                time.sleep(delay)
+
+            key = self.headers.get('Idempotency-Key') or f"{payload.get('task_id')}:{self.path}"
+            with state.lock:
+                state.requests += 1
+                if random.random() < fail_rate:
+                    state.failures += 1
+                    failed = True
+                else:
+                    failed = False
+                    if key in state.accepted:
+                        state.duplicates += 1
+                    state.accepted[key] = payload
+
+            if failed:
+                self._reply(503, {'error': 'simulated failure'})
+            else:
+                self._reply(200, {'status': 'accepted', 'task_id': payload.get('task_id')})
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._reply(200, state.to_dict())
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=5001, delay=0.0, fail_rate=0.0):
+    """Uruchamia atrapę w wątku i zwraca (serwer, stan)"""
+    state = StubState()
+    server = ThreadingHTTPServer((host, port), make_handler(state, delay, fail_rate))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Atrapa document_processor')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--delay', type=float, default=0.0, help='opóźnienie odpowiedzi w sekundach')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='odsetek odpowiedzi 503 (0-1)')
+    args = parser.parse_args()
+
+    server, state = serve(args.host, args.port, args.delay, args.fail_rate)
+    logger.info(f"Atrapa document_processor nasłuchuje na http://{args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(10)
+            logger.info(f"Statystyki: {state.to_dict()}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+
+# Moduły aplikacji czytają konfigurację przy imporcie - środowisko testowe ustawiamy przed nimi
+DATA_DIR = tempfile.mkdtemp(prefix='orthank-tests-')
+os.environ['DATA_DIR'] = DATA_DIR
+os.environ['REPORTS_DIR'] = os.path.join(DATA_DIR, 'reports')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DATA_DIR, 'test.db')}"
+# Bez dyspozytora w tle i bez migawki gmin - testy, które ich potrzebują, włączają je same
+os.environ['DISPATCHER_ENABLED'] = '0'
+os.environ['RESEARCH_DISPATCH_MODE'] = 'pull'
+os.environ['MUNICIPALITY_SNAPSHOT'] = '0'
+# Odczyt stanu postępu z bazy testy wywołują same (progress_broker.poll_once)
+os.environ['PROGRESS_POLL_INTERVAL'] = '0'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app = create_app()
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        db.create_all()
+    return flask_app
+
+
+@pytest.fixture(autouse=True)
+def app_context(app):
+    """Kontekst aplikacji i pusta baza dla każdego testu"""
+    from app.services.http_cache import response_cache
+
+    with app.app_context():
+        yield
+        db.session.remove()
+        with db.engine.begin() as connection:
+            for table in reversed(db.metadata.sorted_tables):
+                connection.execute(table.delete())
+        response_cache.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_research():
+    """Tworzy badanie w bazie (domyślne wartości pól wymaganych)"""
+    from app.models.research import Research
+
+    counter = iter(range(1, 1000000))
+
+    def make(**fields):
+        number = next(counter)
+        values = {
+            'task_id': f'task_{number}',
+            'title': f'Badanie {number}',
+            'status': 'queued',
+            'progress': 0,
+            'region_name': f'Region {number}',
+            'region_id': str(number),
+            'created_at': datetime.utcnow()
+        }
+        values.update(fields)
+        research = Research(**values)
+        db.session.add(research)
+        db.session.commit()
+        return research
+
+    return make
+
+
+# Gminy testowe: powtórzone nazwy i liczby ludności, NULL w kolumnach sortowania, znaki % _ i polskie litery
+MUNICIPALITIES = [
+    ('0201011', 'Nowa Wieś', 'gmina wiejska', '02', 'dolnośląskie', '0201', 'bolesławiecki', 5200, 120.5),
+    ('0201022', 'Bolesławiec', 'gmina miejska', '02', 'dolnośląskie', '0201', 'bolesławiecki', 38000, 23.6),
+    ('0401011', 'Nowa Wieś', 'gmina wiejska', '04', 'kujawsko-pomorskie', '0401', 'aleksandrowski', 5200, None),
+    ('1001011', 'Łódź', 'gmina miejska', '10', 'łódzkie', '1001', None, 660000, 293.3),
+    ('1002023', 'Łask', 'gmina miejsko-wiejska', '10', 'łódzkie', '1002', 'łaski', None, 148.7),
+    ('1002032', 'łask', 'gmina wiejska', '10', 'łódzkie', '1002', 'łaski', 8000, 148.7),
+    ('1201011', 'Gmina 100%', 'gmina wiejska', '12', 'małopolskie', '1201', 'bocheński', None, None),
+    ('1201022', 'Gmina_1', 'gmina wiejska', '12', 'małopolskie', '1201', 'bocheński', 3100, 55.0),
+    ('1201033', 'Gmina 1', 'gmina wiejska', '12', 'małopolskie', '1201', None, 3100, 55.0),
+    ('1465011', 'Warszawa', 'gmina miejska', '14', 'mazowieckie', '1465', 'Warszawa', 1860000, 517.2),
+    ('1401011', 'Wola', 'gmina wiejska', '14', 'mazowieckie', '1401', 'białobrzeski', 5200, 80.1),
+    ('3001011', 'Wola', 'gmina wiejska', '30', 'wielkopolskie', '3001', 'chodzieski', 4100, 80.1),
+    ('3001022', 'NOWA WIEŚ', 'gmina miejsko-wiejska', '30', 'wielkopolskie', '3001', 'chodzieski', 12000, 201.0),
+]
+
+
+@pytest.fixture
+def municipalities():
+    """Wstawia gminy testowe; zwraca je w kolejności id"""
+    from app.models.municipality import Municipality
+
+    fields = ('teryt_code', 'name', 'type', 'voivodeship_code', 'voivodeship_name',
+              'county_code', 'county_name', 'population', 'area')
+    rows = [Municipality(**dict(zip(fields, values)), lat=50.0 + i / 10, lng=19.0 + i / 10)
+            for i, values in enumerate(MUNICIPALITIES)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
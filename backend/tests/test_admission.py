@@ -0,0 +1,96 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.extensions import db
+from app.models.research import Research
+from app.services import admission
+from app.services.admission import admission_transaction
+from app.services.campaigns import release_scheduled_research
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    def set_limits(max_running, max_queue=50):
+        monkeypatch.setattr(admission, 'CAMPAIGN_MAX_RUNNING', max_running)
+        monkeypatch.setattr(admission, 'ADMISSION_MAX_QUEUE', max_queue)
+    return set_limits
+
+
+def submit(client, number):
+    return client.post('/api/research/', json={'region_name': f'Region {number}', 'region_id': str(number)})
+
+
+def statuses():
+    db.session.remove()
+    result = {}
+    for (status,) in db.session.query(Research.status):
+        result[status] = result.get(status, 0) + 1
+    return result
+
+
+def test_submissions_beyond_the_limit_wait_in_the_backend_queue(client, limits):
+    limits(max_running=2)
+    assert [submit(client, n).get_json()['status'] for n in range(4)] == ['queued', 'queued', 'scheduled', 'scheduled']
+
+
+def test_full_queue_is_rejected_with_retry_after(client, limits):
+    limits(max_running=1, max_queue=1)
+    assert submit(client, 1).status_code == 202
+    assert submit(client, 2).status_code == 202
+
+    response = submit(client, 3)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['retry_after'] == int(response.headers['Retry-After'])
+    assert statuses() == {'queued': 1, 'scheduled': 1}
+
+
+def test_concurrent_submissions_respect_the_running_limit(app, limits):
+    limits(max_running=3)
+    barrier = threading.Barrier(12)
+    codes = []
+
+    def worker(number):
+        client = app.test_client()
+        barrier.wait()
+        codes.append(submit(client, number).status_code)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert codes == [202] * 12
+    assert statuses() == {'queued': 3, 'scheduled': 9}
+
+
+def test_admission_transaction_holds_the_sqlite_write_lock():
+    # Osobne połączenie - tak jak inny proces backendu
+    other = sqlite3.connect(db.engine.url.database, timeout=0)
+    try:
+        with admission_transaction():
+            with pytest.raises(sqlite3.OperationalError, match='locked'):
+                other.execute('BEGIN IMMEDIATE')
+        # Blok bez zatwierdzenia wycofuje transakcję i zwalnia blokadę
+        other.execute('BEGIN IMMEDIATE')
+        other.rollback()
+    finally:
+        other.close()
+
+
+def test_released_slot_goes_to_the_oldest_scheduled_submission(client, limits, monkeypatch):
+    limits(max_running=1)
+    first = submit(client, 1).get_json()['task_id']
+    second = submit(client, 2).get_json()['task_id']
+    third = submit(client, 3).get_json()['task_id']
+
+    assert client.put(f'/api/research/{first}/status', json={'status': 'completed'}).status_code == 200
+    with admission_transaction():
+        released = release_scheduled_research(max_running=1)
+    assert [r.task_id for r in released] == [second]
+
+    db.session.remove()
+    assert Research.query.filter_by(task_id=third).one().status == 'scheduled'
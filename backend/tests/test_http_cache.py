@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from werkzeug.http import http_date
+
+from app.services.http_cache import conditional_json, make_etag, response_cache
+
+
+def respond(app, etag, last_modified, headers=None):
+    with app.test_request_context(headers=headers or {}):
+        return conditional_json('resource', etag, last_modified, lambda: {'etag': etag})
+
+
+def test_if_none_match_returns_not_modified(app):
+    etag = make_etag('v1')
+    response = respond(app, etag, datetime.utcnow(), {'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == f'"{etag}"'
+
+
+def test_changed_etag_returns_body(app):
+    old, new = make_etag('v1'), make_etag('v2')
+    response = respond(app, new, datetime.utcnow(), {'If-None-Match': f'"{old}"'})
+    assert response.status_code == 200
+    assert response.get_json() == {'etag': new}
+
+
+def test_update_within_the_same_second_is_not_hidden_by_if_modified_since(app):
+    # Odczyt i zmiana w tej samej sekundzie - Last-Modified się nie zmienia, ETag tak
+    modified = datetime.utcnow().replace(microsecond=100)
+    first = respond(app, make_etag('v1'), modified)
+    assert first.status_code == 200
+
+    changed = modified + timedelta(microseconds=500)
+    response = respond(app, make_etag('v2'), changed, {'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 200
+    assert response.get_json() == {'etag': make_etag('v2')}
+
+
+def test_if_modified_since_is_used_without_etag(app):
+    modified = datetime.utcnow() - timedelta(minutes=5)
+    since = http_date(modified + timedelta(seconds=1))
+    assert respond(app, None, modified, {'If-Modified-Since': since}).status_code == 304
+    assert respond(app, None, modified + timedelta(minutes=1), {'If-Modified-Since': since}).status_code == 200
+
+
+def test_body_is_served_from_cache_for_the_same_etag(app):
+    etag = make_etag('v1')
+    respond(app, etag, None)
+    hits = response_cache.hits
+    respond(app, etag, None)
+    assert response_cache.hits == hits + 1
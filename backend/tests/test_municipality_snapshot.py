@@ -0,0 +1,175 @@
+import itertools
+import os
+import struct
+
+import pytest
+from sqlalchemy import text
+
+from app.extensions import db
+from app.models.municipality import Municipality
+from app.services import municipality_snapshot
+from app.services.import_generation import current_generation
+from app.services.municipality_snapshot import (
+    ROW_FIELDS, SNAPSHOT_VERSION, MunicipalitySnapshot, load_snapshot, write_snapshot
+)
+
+SORT_COLUMNS = ['name', 'voivodeship_name', 'county_name', 'type', 'population', 'area']
+
+
+@pytest.fixture
+def snapshot_path(tmp_path, municipalities):
+    """Migawka gmin zapisana jak w scripts/import_teryt_data.py (surowe wiersze tabeli)"""
+    path = str(tmp_path / 'municipalities.snapshot')
+    rows = [dict(row) for row in db.session.execute(text('SELECT * FROM municipalities')).mappings()]
+    assert write_snapshot(path, rows, current_generation()) == len(municipalities)
+    return path
+
+
+@pytest.fixture
+def use_snapshot(monkeypatch):
+    """Włącza migawkę w endpointach: get_snapshot() zwraca wskazaną migawkę lub None"""
+    def use(snapshot):
+        monkeypatch.setattr('app.api.municipalities.get_snapshot', lambda: snapshot)
+    return use
+
+
+def test_round_trip(snapshot_path, municipalities):
+    snapshot = MunicipalitySnapshot(snapshot_path)
+    assert len(snapshot) == len(municipalities)
+    assert list(snapshot.rows()) == [{f: m.to_dict()[f] for f in ROW_FIELDS} for m in municipalities]
+    assert [snapshot.updated_at(i) for i in range(len(snapshot))] == [m.updated_at for m in municipalities]
+
+
+def test_lookup_by_id_and_teryt(snapshot_path, municipalities):
+    snapshot = MunicipalitySnapshot(snapshot_path)
+    for m in municipalities:
+        assert snapshot.get(m.id) == {f: m.to_dict()[f] for f in ROW_FIELDS}
+        assert snapshot.get_by_teryt(m.teryt_code)['id'] == m.id
+
+    missing_id = max(m.id for m in municipalities) + 1
+    assert snapshot.get(missing_id) is None
+    assert snapshot.get(0) is None
+    assert snapshot.get_by_teryt('9999999') is None
+    assert snapshot.get_by_teryt('0000000') is None
+    assert snapshot.get_by_teryt('') is None
+
+
+def test_lookup_endpoints_match_database(client, snapshot_path, municipalities, use_snapshot):
+    m = municipalities[3]
+    urls = [f'/api/municipalities/{m.id}', f'/api/municipalities/teryt/{m.teryt_code}',
+            '/api/municipalities/999999', '/api/municipalities/teryt/9999999']
+    use_snapshot(None)
+    expected = [(r.status_code, r.get_json()) for r in map(client.get, urls)]
+    use_snapshot(MunicipalitySnapshot(snapshot_path))
+    assert [(r.status_code, r.get_json()) for r in map(client.get, urls)] == expected
+    assert expected[0] == (200, m.to_dict())
+
+
+def list_page(client, **params):
+    response = client.get('/api/municipalities/', query_string={'per_page': 100, **params})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+@pytest.mark.parametrize('sort_by,sort_dir', list(itertools.product(SORT_COLUMNS, ['asc', 'desc'])))
+def test_sort_order_matches_database(client, snapshot_path, use_snapshot, sort_by, sort_dir):
+    use_snapshot(None)
+    expected = list_page(client, sort_by=sort_by, sort_dir=sort_dir)
+    use_snapshot(MunicipalitySnapshot(snapshot_path))
+    page = list_page(client, sort_by=sort_by, sort_dir=sort_dir)
+
+    assert page['total'] == expected['total']
+    # Kolejność wartości jak w SQL (NULL na początku rosnąco); remisy w migawce według id
+    assert [i[sort_by] for i in page['items']] == [i[sort_by] for i in expected['items']]
+    assert sorted(i['id'] for i in page['items']) == sorted(i['id'] for i in expected['items'])
+    for _, tied in itertools.groupby(page['items'], key=lambda i: i[sort_by]):
+        ids = [i['id'] for i in tied]
+        assert ids == sorted(ids)
+
+
+@pytest.mark.parametrize('filters', [
+    {'name': 'nowa'},
+    {'name': 'NOWA wieś'},
+    {'name': 'łask'},
+    {'name': 'Łask'},
+    {'name': '100%'},
+    {'name': 'gmina_'},
+    {'name': '%'},
+    {'voivodeship': 'ŁÓDZ'},
+    {'voivodeship': 'mazow'},
+    {'county': 'bol'},
+    {'type': 'gmina wiejska'},
+    {'type': 'gmina'},
+    {'name': 'wola', 'type': 'gmina wiejska', 'voivodeship': 'wielko'},
+    {'name': 'brak'},
+])
+def test_filters_match_database(client, snapshot_path, use_snapshot, filters):
+    use_snapshot(None)
+    expected = list_page(client, sort_by='population', **filters)
+    use_snapshot(MunicipalitySnapshot(snapshot_path))
+    page = list_page(client, sort_by='population', **filters)
+
+    assert page['total'] == expected['total']
+    assert sorted(i['id'] for i in page['items']) == sorted(i['id'] for i in expected['items'])
+
+
+def test_pages_and_fields_match_database(client, snapshot_path, use_snapshot):
+    params = {'sort_by': 'name', 'per_page': 4, 'fields': 'id,name,population'}
+    use_snapshot(None)
+    expected = [client.get('/api/municipalities/', query_string={**params, 'page': n}).get_json() for n in (1, 2, 4, 9)]
+    use_snapshot(MunicipalitySnapshot(snapshot_path))
+    pages = [client.get('/api/municipalities/', query_string={**params, 'page': n}).get_json() for n in (1, 2, 4, 9)]
+
+    for page, reference in zip(pages, expected):
+        assert {k: v for k, v in page.items() if k != 'items'} == {k: v for k, v in reference.items() if k != 'items'}
+        assert [set(i) for i in page['items']] == [set(i) for i in reference['items']]
+        assert [i['name'] for i in page['items']] == [i['name'] for i in reference['items']]
+
+
+def rewrite(path, change):
+    # Nowy plik zamiast zmiany w miejscu - stara migawka może być jeszcze odwzorowana w pamięci
+    with open(path, 'rb') as f:
+        data = change(f.read())
+    with open(f'{path}.damaged', 'wb') as f:
+        f.write(data)
+    os.replace(f'{path}.damaged', path)
+
+
+def corrupt_version(path):
+    rewrite(path, lambda data: data[:8] + struct.pack('<I', SNAPSHOT_VERSION + 1) + data[12:])
+
+
+def truncate(path):
+    rewrite(path, lambda data: data[:len(data) // 2])
+
+
+def test_unusable_snapshot_is_not_loaded(snapshot_path, tmp_path):
+    assert load_snapshot(snapshot_path) is not None
+    assert load_snapshot(str(tmp_path / 'brak.snapshot')) is None
+
+    stale = str(tmp_path / 'stale.snapshot')
+    write_snapshot(stale, [], 'inna-generacja')
+    assert load_snapshot(stale) is None
+
+    corrupt_version(snapshot_path)
+    assert load_snapshot(snapshot_path) is None
+
+
+@pytest.mark.parametrize('damage', [corrupt_version, truncate])
+def test_damaged_snapshot_falls_back_to_database(client, snapshot_path, municipalities, monkeypatch, damage):
+    monkeypatch.setattr(municipality_snapshot, 'SNAPSHOT_ENABLED', True)
+    monkeypatch.setattr(municipality_snapshot, 'SNAPSHOT_FILE', snapshot_path)
+    municipality_snapshot._snapshot_cache.invalidate()
+    try:
+        # Gmina dodana po zapisie migawki - widoczna tylko przy odczycie z bazy
+        db.session.add(Municipality(teryt_code='3201011', name='Nowa gmina', type='gmina wiejska',
+                                    voivodeship_code='32', voivodeship_name='zachodniopomorskie', county_code='3201'))
+        db.session.commit()
+        assert list_page(client)['total'] == len(municipalities)
+
+        damage(snapshot_path)
+        municipality_snapshot._snapshot_cache.invalidate()
+        assert list_page(client)['total'] == len(municipalities) + 1
+        assert client.get('/api/municipalities/teryt/3201011').status_code == 200
+    finally:
+        municipality_snapshot._snapshot_cache.invalidate()
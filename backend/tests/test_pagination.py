@@ -0,0 +1,119 @@
+import base64
+import itertools
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app.api.municipalities import KEYSET_NULL_VALUES
+from app.extensions import db
+from app.services.pagination import encode_cursor
+
+SORT_COLUMNS = ['name', 'voivodeship_name', 'county_name', 'type', 'population', 'area']
+
+
+def walk(client, url, **params):
+    """Przechodzi wszystkie strony kursorem; zwraca elementy i liczbę stron"""
+    items, cursor, pages = [], '', 0
+    while True:
+        response = client.get(url, query_string={**params, 'cursor': cursor})
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        items.extend(body['items'])
+        pages += 1
+        assert body['has_more'] == (body['next_cursor'] is not None)
+        if not body['has_more']:
+            return items, pages
+        assert len(body['items']) == params['per_page']
+        cursor = body['next_cursor']
+
+
+def expected_order(municipalities, sort_by, sort_dir):
+    null_value = KEYSET_NULL_VALUES.get(sort_by)
+
+    def key(m):
+        value = getattr(m, sort_by)
+        return (null_value if value is None else value, m.id)
+    return [m.id for m in sorted(municipalities, key=key, reverse=(sort_dir == 'desc'))]
+
+
+@pytest.mark.parametrize('sort_by,sort_dir', list(itertools.product(SORT_COLUMNS, ['asc', 'desc'])))
+@pytest.mark.parametrize('per_page', [1, 2, 5])
+def test_walk_every_page_without_gaps_or_repeats(client, municipalities, sort_by, sort_dir, per_page):
+    items, pages = walk(client, '/api/municipalities/', sort_by=sort_by, sort_dir=sort_dir, per_page=per_page)
+    ids = [item['id'] for item in items]
+    assert ids == expected_order(municipalities, sort_by, sort_dir)
+    assert pages == -(-len(municipalities) // per_page)
+
+
+def test_walk_with_projection_and_filters(client, municipalities):
+    items, _ = walk(client, '/api/municipalities/', sort_by='population', per_page=2,
+                    fields='id,name', type='gmina wiejska')
+    wiejskie = [m for m in municipalities if m.type == 'gmina wiejska']
+    assert [item['id'] for item in items] == expected_order(wiejskie, 'population', 'asc')
+    assert all(set(item) == {'id', 'name'} for item in items)
+
+
+def test_count_is_returned_on_request(client, municipalities):
+    body = client.get('/api/municipalities/', query_string={'cursor': '', 'per_page': 3, 'count': 'exact'}).get_json()
+    assert body['total'] == len(municipalities)
+    assert body['total_estimated'] is False
+    assert 'total' not in client.get('/api/municipalities/', query_string={'cursor': '', 'per_page': 3}).get_json()
+
+
+@pytest.mark.parametrize('per_page', [1, 3])
+def test_research_walk_with_equal_creation_times(client, make_research, per_page):
+    # Badania z API mają daty CURRENT_TIMESTAMP (pełne sekundy, powtórzenia), kampanie - z Pythona
+    base = datetime(2026, 3, 1, 12, 0, 0)
+    created = [base, base, base + timedelta(microseconds=250), base, base - timedelta(seconds=1),
+               base + timedelta(seconds=1), base + timedelta(seconds=1, microseconds=999999),
+               base - timedelta(seconds=1), base + timedelta(seconds=1)]
+    made = [make_research(created_at=at) for at in created]
+    db.session.execute(text("UPDATE researches SET created_at = substr(created_at, 1, 19) "
+                            "WHERE created_at LIKE '%.000000'"))
+    db.session.commit()
+    stored = db.session.execute(text('SELECT created_at FROM researches')).scalars().all()
+    assert sorted(len(value) for value in stored) == [19] * 7 + [26] * 2
+
+    items, _ = walk(client, '/api/research/', per_page=per_page)
+    expected = [r.task_id for r in sorted(made, key=lambda r: (r.created_at, r.id), reverse=True)]
+    assert [item['task_id'] for item in items] == expected
+
+
+def raw_cursor(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+@pytest.mark.parametrize('cursor', [
+    'nie-kursor!',
+    'ąę',
+    raw_cursor('tekst'),
+    raw_cursor({'s': 'municipalities:name:asc'}),
+    raw_cursor({'s': 'municipalities:name:asc', 'v': ['Wola']}),
+    raw_cursor({'s': 'municipalities:name:asc', 'v': ['Wola', 1, 2]}),
+    raw_cursor({'s': 'municipalities:name:asc', 'v': [{'x': 1}, 1]}),
+    raw_cursor({'s': 'municipalities:name:asc', 'v': [['Wola'], 1]}),
+    raw_cursor({'s': 'municipalities:name:asc', 'v': [{'dt': 'wczoraj'}, 1]}),
+    raw_cursor({'s': 'municipalities:name:asc', 'v': 5}),
+    base64.urlsafe_b64encode(b'\xff\xfe').decode('ascii'),
+])
+def test_tampered_cursor_is_rejected(client, municipalities, cursor):
+    response = client.get('/api/municipalities/', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_cursor_from_another_sort_order_is_rejected(client, municipalities):
+    first = client.get('/api/municipalities/', query_string={'cursor': '', 'per_page': 2, 'sort_by': 'name'}).get_json()
+    cursor = first['next_cursor']
+    assert client.get('/api/municipalities/', query_string={'cursor': cursor, 'sort_by': 'name'}).status_code == 200
+
+    for params in ({'sort_by': 'population'}, {'sort_by': 'name', 'sort_dir': 'desc'}):
+        response = client.get('/api/municipalities/', query_string={'cursor': cursor, **params})
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Kursor nie pasuje do parametrów sortowania'
+
+    assert client.get('/api/research/', query_string={'cursor': cursor}).status_code == 400
+    forged = encode_cursor('research:created_at:desc', ['Wola', 1])
+    assert client.get('/api/municipalities/', query_string={'cursor': forged}).status_code == 400
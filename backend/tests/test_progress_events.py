@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+
+from app.extensions import db
+from app.models.research import Research
+from app.services.progress_events import ProgressBroker, progress_broker
+
+
+def write_elsewhere(task_id, **values):
+    """Zapis z pominięciem brokera - tak widzi go proces, który nie obsługiwał aktualizacji"""
+    Research.query.filter_by(task_id=task_id).update(values)
+    db.session.commit()
+    db.session.remove()
+
+
+def read_events(response, count):
+    events = []
+    for chunk in response.response:
+        text = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+        if text.startswith('event:'):
+            name, data = text.split('\n')[:2]
+            events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+        if len(events) == count:
+            break
+    return events
+
+
+def test_publish_sends_only_changed_fields():
+    broker = ProgressBroker()
+    subscription = broker.subscribe(['t1'])
+    broker.publish('t1', {'task_id': 't1', 'status': 'running', 'progress': 10})
+    broker.publish('t1', {'task_id': 't1', 'status': 'running', 'progress': 20})
+    broker.publish('t1', {'task_id': 't1', 'status': 'running', 'progress': 20})
+
+    # Niepobrane zmiany są scalane w jedną
+    assert subscription.wait(0) == [('t1', {'task_id': 't1', 'status': 'running', 'progress': 20})]
+    assert subscription.wait(0) == []
+
+
+def test_state_read_before_local_publish_is_ignored():
+    broker = ProgressBroker()
+    subscription = broker.subscribe(['t1'])
+    read_at = time.monotonic()
+    broker.publish('t1', {'task_id': 't1', 'progress': 50})
+
+    assert broker.publish('t1', {'task_id': 't1', 'progress': 40}, read_at=read_at) == 0
+    assert subscription.wait(0) == [('t1', {'task_id': 't1', 'progress': 50})]
+
+
+def test_snapshot_replaces_stale_remembered_state():
+    broker = ProgressBroker()
+    broker.publish('t1', {'task_id': 't1', 'status': 'running', 'progress': 100})
+
+    # Zmiany innych procesów, gdy nikt nie obserwował zadania - odczyt z bazy jest nowszy
+    broker.remember('t1', {'task_id': 't1', 'status': 'queued', 'progress': 0}, time.monotonic())
+    subscription = broker.subscribe(['t1'])
+    broker.publish('t1', {'task_id': 't1', 'status': 'running', 'progress': 100})
+    assert subscription.wait(0) == [('t1', {'task_id': 't1', 'status': 'running', 'progress': 100})]
+
+    # Odczyt sprzed publikacji nie zastępuje opublikowanego stanu
+    read_at = time.monotonic()
+    broker.publish('t1', {'task_id': 't1', 'status': 'completed', 'progress': 100})
+    broker.remember('t1', {'task_id': 't1', 'status': 'running', 'progress': 100}, read_at)
+    assert broker.last_state('t1')['status'] == 'completed'
+
+
+def test_poll_delivers_changes_committed_by_other_processes(make_research):
+    make_research(task_id='t1', status='running', progress=10)
+    make_research(task_id='t2', status='running', progress=10)
+    subscription = progress_broker.subscribe(['t1'])
+    try:
+        progress_broker.poll_once()
+        subscription.wait(0)
+
+        write_elsewhere('t1', progress=60, current_step='Analiza')
+        write_elsewhere('t2', progress=70)
+        progress_broker.poll_once()
+        [(task_id, delta)] = subscription.wait(0)
+        assert task_id == 't1'
+        assert (delta['progress'], delta['current_step']) == (60, 'Analiza')
+
+        # Bez zmian w bazie odczyt niczego nie wysyła
+        progress_broker.poll_once()
+        assert subscription.wait(0) == []
+    finally:
+        progress_broker.unsubscribe(subscription)
+
+
+def test_poll_for_all_tasks_reports_new_and_finished_research(make_research):
+    make_research(task_id='t1', status='running')
+    subscription = progress_broker.subscribe(None)
+    try:
+        progress_broker.poll_once()
+        assert [task_id for task_id, _ in subscription.wait(0)] == ['t1']
+
+        make_research(task_id='t2', status='queued')
+        write_elsewhere('t1', status='completed', progress=100)
+        progress_broker.poll_once()
+        events = dict(subscription.wait(0))
+        assert events['t1']['status'] == 'completed'
+        assert events['t2']['status'] == 'queued'
+    finally:
+        progress_broker.unsubscribe(subscription)
+
+
+def test_task_stream_ends_on_status_written_by_another_process(client, make_research):
+    make_research(task_id='t1', status='running', progress=10)
+    response = client.get('/api/research/t1/events', buffered=False)
+    try:
+        assert read_events(response, 1)[0][0] == 'snapshot'
+
+        write_elsewhere('t1', status='completed', progress=100)
+        progress_broker.poll_once()
+        (name, delta), (end, _) = read_events(response, 2)
+        assert (name, delta['status'], delta['progress']) == ('progress', 'completed', 100)
+        assert end == 'end'
+    finally:
+        response.close()
+
+
+def test_poller_thread_reads_states_in_the_background():
+    loaded = threading.Event()
+    calls = []
+
+    def load_states(task_ids, include_active):
+        calls.append((task_ids, include_active))
+        loaded.set()
+        return [{'task_id': 't1', 'progress': 30}]
+
+    broker = ProgressBroker(poll_interval=0.01)
+    broker.configure_polling(load_states)
+    subscription = broker.subscribe(['t1'])
+    try:
+        assert loaded.wait(5)
+        assert calls[0] == (['t1'], False)
+        assert subscription.wait(5) == [('t1', {'task_id': 't1', 'progress': 30})]
+    finally:
+        broker.stop_polling(5)
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.extensions import db
+from app.models.research import ResearchProgressChunk, ResearchProgressSeries
+from app.services import progress_history
+from app.services.progress_history import OTHER_STEP, decode_chunk, encode_tick, progress_timeline, record_progress
+
+START = datetime(2026, 1, 5, 8, 0, 0)
+
+
+def chunk(*ticks, started_at=START):
+    return SimpleNamespace(started_at=started_at, data=b''.join(encode_tick(*tick) for tick in ticks))
+
+
+def test_codec_round_trip():
+    ticks = [(0, 0, None), (1, 1, 0), (127, 99, 1), (128, 100, 127), (16384, None, 128), (0, None, None)]
+    at, expected = START, []
+    for delta_ms, progress, step in ticks:
+        at += timedelta(milliseconds=delta_ms)
+        expected.append((at, progress, step))
+    assert decode_chunk(chunk(*ticks)) == expected
+
+
+def test_codec_large_time_deltas():
+    # Przerwy dłuższe niż 2^32 ms (ok. 50 dni) - varint nie ma górnej granicy
+    deltas = [2 ** 32 + 5, timedelta(days=400) // timedelta(milliseconds=1), 2 ** 63]
+    decoded = decode_chunk(chunk(*((delta, 50, 3) for delta in deltas[:2])))
+    assert [at for at, _, _ in decoded] == [START + timedelta(milliseconds=deltas[0]),
+                                            START + timedelta(milliseconds=deltas[0] + deltas[1])]
+    assert len(encode_tick(deltas[2], None, None)) == 12
+
+
+def test_codec_none_and_zero_are_distinct():
+    decoded = decode_chunk(chunk((0, None, None), (0, 0, 0), (0, None, 0), (0, 0, None)))
+    assert [(progress, step) for _, progress, step in decoded] == [(None, None), (0, 0), (None, 0), (0, None)]
+    assert encode_tick(0, None, None) == b'\x00\x00\x00'
+
+
+def record(research, at, progress=None, step=None, status=None):
+    research.progress = progress
+    research.current_step = step
+    if status:
+        research.status = status
+    recorded = record_progress(research, now=at)
+    db.session.commit()
+    return recorded
+
+
+def test_steps_are_interned_across_chunk_boundaries(make_research, monkeypatch):
+    monkeypatch.setattr(progress_history, 'PROGRESS_HISTORY_CHUNK_TICKS', 4)
+    research = make_research(status='running')
+    steps = ['pobieranie', 'analiza', 'pobieranie', 'raport', 'analiza']
+    expected = []
+    for n in range(11):
+        at = START + timedelta(seconds=n * 1.5)
+        step = steps[n % len(steps)]
+        assert record(research, at, progress=n * 9, step=step)
+        expected.append((at, n * 9, step))
+
+    series = db.session.get(ResearchProgressSeries, research.id)
+    assert series.steps == ['pobieranie', 'analiza', 'raport']
+    chunks = ResearchProgressChunk.query.filter_by(research_id=research.id).order_by(ResearchProgressChunk.seq).all()
+    assert [c.ticks for c in chunks] == [4, 4, 3]
+    # Każdy fragment zaczyna się od czasu bezwzględnego i przyrostu 0
+    assert [c.started_at for c in chunks] == [expected[0][0], expected[4][0], expected[8][0]]
+    assert all(c.data.startswith(b'\x00') for c in chunks)
+
+    decoded = [tick for c in chunks for tick in decode_chunk(c)]
+    assert [(at, progress, series.steps[step]) for at, progress, step in decoded] == expected
+
+
+def test_repeated_state_is_not_recorded(make_research):
+    research = make_research(status='running')
+    assert record(research, START, 10, 'analiza')
+    assert not record(research, START + timedelta(seconds=1), 10, 'analiza')
+    assert record(research, START + timedelta(seconds=2), 10, 'analiza', status='completed')
+    assert db.session.get(ResearchProgressSeries, research.id).ticks == 2
+
+
+def test_step_dictionary_is_capped(make_research, monkeypatch):
+    monkeypatch.setattr(progress_history, 'PROGRESS_HISTORY_MAX_STEPS', 3)
+    research = make_research(status='running')
+    for n, step in enumerate(['a', 'b', 'c', 'd', 'a']):
+        record(research, START + timedelta(seconds=n), progress=n, step=step)
+    assert db.session.get(ResearchProgressSeries, research.id).steps == ['a', 'b', OTHER_STEP]
+    assert [p['step'] for p in progress_timeline(research)['points']] == ['a', 'b', OTHER_STEP, OTHER_STEP, 'a']
+
+
+def test_timeline_endpoint_downsamples_long_history(client, make_research, monkeypatch):
+    monkeypatch.setattr(progress_history, 'PROGRESS_HISTORY_CHUNK_TICKS', 64)
+    research = make_research(task_id='t1', status='running')
+    steps = ['pobieranie', 'analiza', 'raport']
+    for n in range(600):
+        status = 'completed' if n == 599 else None
+        record(research, START + timedelta(seconds=n), progress=n % 100, step=steps[n // 200], status=status)
+
+    full = client.get('/api/research/t1/timeline', query_string={'points': 5000}).get_json()
+    assert full['ticks'] == 600
+    assert len(full['points']) == 600
+    assert [s['step'] for s in full['steps']] == steps
+    assert [s['seconds'] for s in full['steps']] == [200.0, 200.0, 199.0]
+
+    body = client.get('/api/research/t1/timeline', query_string={'points': 40}).get_json()
+    points = body['points']
+    assert len(points) <= 40
+    # Ostatni punkt, wszystkie kroki i niemalejący czas zachowane po przerzedzeniu
+    assert points[-1] == full['points'][-1]
+    assert {p['step'] for p in points} == set(steps)
+    assert [p['offset'] for p in points] == sorted(p['offset'] for p in points)
+    assert all(p in full['points'] for p in points)
+    assert body['steps'] == full['steps']
+
+    assert len(client.get('/api/research/t1/timeline', query_string={'points': 0}).get_json()['points']) <= 2
+
+
+def test_status_updates_are_recorded_in_timeline(client, make_research):
+    make_research(task_id='t1', status='running')
+    for update in ({'progress': 10, 'current_step': 'pobieranie'}, {'progress': 10, 'current_step': 'pobieranie'},
+                   {'progress': 60, 'current_step': 'analiza'}, {'status': 'completed', 'progress': 100}):
+        assert client.put('/api/research/t1/status', json=update).status_code == 200
+
+    body = client.get('/api/research/t1/timeline').get_json()
+    assert body['status'] == 'completed'
+    assert [(p['progress'], p['step']) for p in body['points']] == [(10, 'pobieranie'), (60, 'analiza'), (100, 'analiza')]
+    assert client.get('/api/research/brak/timeline').status_code == 404
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.models.research import Research
+
+
+def claim(client, worker_id, **options):
+    response = client.post('/api/research/claim', json={'worker_id': worker_id, **options})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def expire_leases():
+    Research.query.update({'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+
+def test_status_update_requires_current_lease(client, make_research):
+    make_research(task_id='t1')
+    lease = claim(client, 'worker-a')
+    assert [item['task_id'] for item in lease['items']] == ['t1']
+
+    response = client.put('/api/research/t1/status', json={'progress': 50})
+    assert response.status_code == 409
+
+    response = client.put('/api/research/t1/status', json={'progress': 50, 'lease_token': 'obcy'})
+    assert response.status_code == 409
+
+    response = client.put('/api/research/t1/status', json={'progress': 50, 'lease_token': lease['lease_token']})
+    assert response.status_code == 200
+    assert response.get_json()['progress'] == 50
+
+
+def test_expired_lease_cannot_overwrite_new_owner(client, make_research):
+    make_research(task_id='t1')
+    first = claim(client, 'worker-a')
+    expire_leases()
+
+    # Wygasła dzierżawa wraca do kolejki i trafia do drugiego procesu
+    second = claim(client, 'worker-b')
+    assert [item['task_id'] for item in second['items']] == ['t1']
+
+    late = client.put('/api/research/t1/status', json={
+        'status': 'completed', 'progress': 100, 'report': '# Stary wynik', 'lease_token': first['lease_token']
+    })
+    assert late.status_code == 409
+
+    research = Research.query.filter_by(task_id='t1').one()
+    assert research.status == 'running'
+    assert research.lease_owner == 'worker-b'
+    assert research.reports == []
+
+    response = client.put('/api/research/t1/status', json={
+        'status': 'completed', 'progress': 100, 'lease_token': second['lease_token']
+    })
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'completed'
+
+
+def test_expired_lease_is_lost_after_requeue(client, make_research):
+    make_research(task_id='t1')
+    first = claim(client, 'worker-a')
+    # Stan po _requeue_expired_leases - zadanie czeka w kolejce na kolejny proces
+    Research.query.update({'status': 'queued', 'lease_owner': None, 'lease_token': None, 'lease_expires_at': None})
+    db.session.commit()
+
+    response = client.put('/api/research/t1/status', json={'status': 'failed', 'lease_token': first['lease_token']})
+    assert response.status_code == 409
+    db.session.remove()
+    assert Research.query.filter_by(task_id='t1').one().status == 'queued'
+
+
+def test_batch_reports_lease_lost_per_item(client, make_research):
+    make_research(task_id='t1')
+    make_research(task_id='t2')
+    first = claim(client, 'worker-a', limit=1)
+    expire_leases()
+    second = claim(client, 'worker-b', limit=2)
+    assert {item['task_id'] for item in second['items']} == {'t1', 't2'}
+
+    response = client.post('/api/research/status/batch', json={'updates': [
+        {'task_id': 't1', 'progress': 90, 'lease_token': first['lease_token']},
+        {'task_id': 't2', 'progress': 40, 'lease_token': second['lease_token']},
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [item['result'] for item in body['results']] == ['lease_lost', 'applied']
+    assert body['summary'] == {'lease_lost': 1, 'applied': 1}
+
+    db.session.remove()
+    progress = dict(db.session.query(Research.task_id, Research.progress))
+    assert progress == {'t1': 0, 't2': 40}
+
+
+def test_unleased_research_accepts_updates_without_token(client, make_research):
+    make_research(task_id='t1', status='running')
+    response = client.put('/api/research/t1/status', json={'progress': 10})
+    assert response.status_code == 200
+
+    response = client.post('/api/research/status/batch', json={'updates': [{'task_id': 't1', 'progress': 20}]})
+    assert response.get_json()['results'][0]['result'] == 'applied'
+
+
+def test_renewal_with_stale_token_is_rejected(client, make_research):
+    make_research(task_id='t1')
+    first = claim(client, 'worker-a')
+    expire_leases()
+    second = claim(client, 'worker-b')
+
+    assert client.post('/api/research/t1/lease', json={'lease_token': first['lease_token']}).status_code == 409
+    assert client.post('/api/research/t1/lease', json={'lease_token': second['lease_token']}).status_code == 200
@@ -0,0 +1,84 @@
+import threading
+
+from app.extensions import db
+from app.models.research import Research
+
+PARAMS = {'region_name': 'Kraków', 'region_id': '1261011', 'breadth': 3, 'depth': 1, 'config': {'lang': 'pl'}}
+
+
+def submit(client, **fields):
+    return client.post('/api/research/', json={**PARAMS, **fields})
+
+
+def complete(client, task_id):
+    response = client.put(f'/api/research/{task_id}/status', json={
+        'status': 'completed', 'progress': 100, 'report': '# Raport'
+    })
+    assert response.status_code == 200
+
+
+def test_identical_submission_joins_run_in_flight(client):
+    first = submit(client)
+    assert first.status_code == 202
+
+    second = submit(client)
+    assert second.status_code == 200
+    assert second.get_json()['reused'] == 'in_flight'
+    assert second.get_json()['task_id'] == first.get_json()['task_id']
+
+    # Inne parametry - osobne badanie
+    assert submit(client, depth=2).status_code == 202
+
+
+def test_completed_result_is_reused_only_on_request(client):
+    task_id = submit(client).get_json()['task_id']
+    complete(client, task_id)
+
+    fresh = submit(client)
+    assert fresh.status_code == 202
+    assert fresh.get_json()['task_id'] != task_id
+    complete(client, fresh.get_json()['task_id'])
+
+    reused = submit(client, reuse=True)
+    assert reused.status_code == 200
+    assert reused.get_json()['reused'] == 'completed'
+    assert reused.get_json()['task_id'] == fresh.get_json()['task_id']
+
+
+def test_explicit_task_id_is_never_replaced(client):
+    complete(client, submit(client, task_id='mine-1').get_json()['task_id'])
+
+    response = submit(client, task_id='mine-2', reuse=True)
+    assert response.status_code == 202
+    assert response.get_json()['task_id'] == 'mine-2'
+    assert client.get('/api/research/mine-2').status_code == 200
+
+    # Identyczne badanie w toku - 409 ze wskazaniem istniejącego zadania
+    conflict = submit(client, task_id='mine-3')
+    assert conflict.status_code == 409
+    assert conflict.get_json()['task_id'] == 'mine-2'
+    assert client.get('/api/research/mine-3').status_code == 404
+
+    duplicate = submit(client, task_id='mine-2', depth=5)
+    assert duplicate.status_code == 409
+
+
+def test_concurrent_identical_submissions_create_one_run(app):
+    barrier = threading.Barrier(8)
+    responses = []
+
+    def worker():
+        client = app.test_client()
+        barrier.wait()
+        responses.append(submit(client))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(r.status_code for r in responses) == [200] * 7 + [202]
+    assert len({r.get_json()['task_id'] for r in responses}) == 1
+    db.session.remove()
+    assert Research.query.count() == 1
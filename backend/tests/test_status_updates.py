@@ -0,0 +1,81 @@
+from app.extensions import db
+from app.models.research import Research
+
+
+def batch(client, *updates):
+    response = client.post('/api/research/status/batch', json={'updates': list(updates)})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_batch_applies_and_coalesces_updates(client, make_research):
+    make_research(task_id='t1', status='running')
+    make_research(task_id='t2', status='running')
+
+    body = batch(
+        client,
+        {'task_id': 't1', 'progress': 10, 'current_step': 'Wyszukiwanie'},
+        {'task_id': 't2', 'status': 'completed', 'progress': 100, 'report': '# Raport'},
+        {'task_id': 't1', 'progress': 20},
+        {'task_id': 'brak', 'progress': 5},
+    )
+    assert [item['result'] for item in body['results']] == ['coalesced', 'applied', 'applied', 'not_found']
+
+    db.session.remove()
+    t1 = Research.query.filter_by(task_id='t1').one()
+    assert (t1.progress, t1.current_step) == (20, 'Wyszukiwanie')
+    t2 = Research.query.filter_by(task_id='t2').one()
+    assert t2.status == 'completed' and t2.end_time is not None
+    assert t2.reports[0].read_content() == '# Raport'
+
+
+def test_batch_rejects_invalid_items_without_failing_the_rest(client, make_research):
+    for number in range(1, 8):
+        make_research(task_id=f't{number}', status='running', progress=5)
+
+    body = batch(
+        client,
+        {'task_id': 't1', 'status': 'bogus'},
+        {'task_id': 't2', 'progress': 'abc'},
+        {'task_id': 't3', 'progress': {'a': 1}},
+        {'task_id': 't4', 'progress': 101},
+        {'task_id': 't5', 'current_step': ['krok']},
+        {'task_id': {'a': 1}, 'progress': 1},
+        {'task_id': 't6', 'progress': True},
+        {'task_id': 't7', 'progress': 60, 'error_message': None},
+    )
+    results = [item['result'] for item in body['results']]
+    assert results == ['invalid'] * 7 + ['applied']
+    assert all(item.get('error') for item in body['results'][:5])
+    assert body['summary'] == {'invalid': 7, 'applied': 1}
+
+    db.session.remove()
+    stored = {r.task_id: (r.status, r.progress, r.current_step) for r in Research.query.all()}
+    assert stored['t7'] == ('running', 60, None)
+    for number in range(1, 7):
+        assert stored[f't{number}'] == ('running', 5, None)
+
+
+def test_batch_validates_the_merged_update(client, make_research):
+    make_research(task_id='t1', status='running')
+
+    # Poprawna późniejsza wartość zastępuje niepoprawną
+    body = batch(client, {'task_id': 't1', 'progress': 'abc'}, {'task_id': 't1', 'progress': 30})
+    assert [item['result'] for item in body['results']] == ['coalesced', 'applied']
+
+    body = batch(client, {'task_id': 't1', 'progress': 40}, {'task_id': 't1', 'status': 'bogus'})
+    assert [item['result'] for item in body['results']] == ['coalesced', 'invalid']
+    db.session.remove()
+    assert Research.query.filter_by(task_id='t1').one().progress == 30
+
+
+def test_single_update_rejects_invalid_values(client, make_research):
+    make_research(task_id='t1', status='running')
+
+    assert client.put('/api/research/t1/status', json={'status': 'bogus'}).status_code == 400
+    assert client.put('/api/research/t1/status', json={'progress': -1}).status_code == 400
+    assert client.put('/api/research/t1/status', json={'error_message': 3}).status_code == 400
+
+    response = client.put('/api/research/t1/status', json={'status': 'failed', 'error_message': 'Błąd'})
+    assert response.status_code == 200
+    assert response.get_json()['error_message'] == 'Błąd'
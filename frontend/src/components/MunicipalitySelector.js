@@ -3,6 +3,9 @@ import { Form, InputGroup, Dropdown, Spinner, Badge } from 'react-bootstrap';
 import axios from 'axios';
 import { debounce } from 'lodash';
 
+// Pola gminy potrzebne do listy podpowiedzi i wyboru gminy
+const SEARCH_FIELDS = 'id,name,type,voivodeship_name,teryt_code';
+
 const MunicipalitySelector = ({ 
   onSelect, 
   initialValue = null, 
@@ -25,7 +28,7 @@ const MunicipalitySelector = ({
 
     setLoading(true);
     try {
-      const response = await axios.get(`/api/municipalities/search?q=${encodeURIComponent(query)}&limit=15`);
+      const response = await axios.get(`/api/municipalities/search?q=${encodeURIComponent(query)}&limit=15&fields=${SEARCH_FIELDS}`);
       setMunicipalities(response.data);
     } catch (error) {
       console.error('Błąd podczas wyszukiwania gmin:', error);
@@ -55,19 +55,60 @@ const ResearchProgress = ({ taskId, onComplete, onError }) => {
     }
   };
 
-  // Pobieraj aktualizacje postępu co 5 sekund
+  // Obsługa stanu badania (z odpowiedzi API lub zdarzenia SSE)
+  const handleState = useCallback((state) => {
+    if (state.status === 'completed') {
+      fetchReport();
+      if (onComplete) onComplete(state);
+    } else if (state.status === 'failed' || state.status === 'stopped') {
+      setError(state.error_message || 'Badanie zakończyło się niepowodzeniem');
+      if (onError) onError(state);
+    }
+  }, [fetchReport, onComplete, onError]);
+
+  // Subskrypcja zmian postępu przez SSE (z awaryjnym pollingiem co 5 sekund)
   useEffect(() => {
-    // Natychmiastowe pierwsze pobranie
-    fetchProgress();
-    
-    // Ustaw polling tylko jeśli badanie jest w trakcie
-    const intervalId = setInterval(() => {
+    let intervalId = null;
+    let source = null;
+
+    const startPolling = () => {
+      if (intervalId) return;
       fetchProgress();
-    }, 5000);
+      intervalId = setInterval(fetchProgress, 5000);
+    };
+
+    if (typeof window.EventSource === 'undefined') {
+      startPolling();
+      return () => clearInterval(intervalId);
+    }
+
+    source = new window.EventSource(`/api/research/${taskId}/events`);
+    let current = null;
+
+    const applyEvent = (event) => {
+      const data = JSON.parse(event.data);
+      const statusChanged = data.status && (!current || current.status !== data.status);
+      current = { ...(current || {}), ...data };
+      setProgress(prev => ({ ...(prev || {}), ...data }));
+      setLoading(false);
+      if (statusChanged) handleState(current);
+    };
+
+    source.addEventListener('snapshot', applyEvent);
+    source.addEventListener('progress', applyEvent);
+    source.addEventListener('end', () => source.close());
+    source.onerror = () => {
+      // Serwer zamknął strumień po zakończeniu badania lub połączenie zostało zerwane
+      if (source.readyState === window.EventSource.CLOSED) {
+        startPolling();
+      }
+    };
 
-    // Czyszczenie przy odmontowaniu lub gdy badanie się zakończyło
-    return () => clearInterval(intervalId);
-  }, [fetchProgress]);
+    return () => {
+      if (source) source.close();
+      if (intervalId) clearInterval(intervalId);
+    };
+  }, [taskId, fetchProgress, handleState]);
 
   if (loading && !progress) {
     return (
@@ -100,6 +141,8 @@ const ResearchProgress = ({ taskId, onComplete, onError }) => {
 
   const getStatusBadge = (status) => {
     switch (status) {
+      case 'scheduled':
+        return <Badge bg="secondary">Zaplanowane</Badge>;
       case 'queued':
         return <Badge bg="info">W kolejce</Badge>;
       case 'starting':
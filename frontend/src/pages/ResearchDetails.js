@@ -21,13 +21,10 @@ const ResearchDetails = () => {
     setError(null);
     
     try {
-      const response = await axios.get(`/api/research/${taskId}`);
+      // Szczegóły gminy dołączone do odpowiedzi - bez dodatkowego zapytania
+      const response = await axios.get(`/api/research/${taskId}?embed=municipality`);
       setResearch(response.data);
-      
-      // Jeśli badanie ma przypisaną gminę, pobierz jej szczegóły
-      if (response.data.municipality_id) {
-        fetchMunicipalityDetails(response.data.municipality_id);
-      }
+      setMunicipality(response.data.municipality || null);
     } catch (err) {
       console.error('Błąd podczas pobierania szczegółów badania:', err);
       setError(err.response?.data?.error || err.message || 'Wystąpił nieznany błąd');
@@ -36,17 +33,6 @@ const ResearchDetails = () => {
     }
   };
   
-  // Pobieranie szczegółów gminy
-  const fetchMunicipalityDetails = async (municipalityId) => {
-    try {
-      const response = await axios.get(`/api/municipalities/${municipalityId}`);
-      setMunicipality(response.data);
-    } catch (err) {
-      console.error('Błąd podczas pobierania szczegółów gminy:', err);
-      // Nie ustawiamy głównego błędu, aby nie przesłaniać głównych informacji
-    }
-  };
-  
   // Pobierz dane po załadowaniu komponentu
   useEffect(() => {
     fetchResearchDetails();
@@ -5,6 +5,9 @@ import { formatDistance } from 'date-fns';
 import { pl } from 'date-fns/locale';
 import axios from 'axios';
 
+// Pola badania wyświetlane w tabeli
+const LIST_FIELDS = 'task_id,title,region_name,status,progress,start_time,updated_at';
+
 const ResearchList = () => {
   const navigate = useNavigate();
   const [searchParams, setSearchParams] = useSearchParams();
@@ -34,6 +37,8 @@ const ResearchList = () => {
     const params = new URLSearchParams();
     params.append('page', pagination.page);
     params.append('per_page', pagination.perPage);
+    // Tylko pola wyświetlane w tabeli - mniejsza odpowiedź i szybsza serializacja
+    params.append('fields', LIST_FIELDS);
     
     if (filters.status) params.append('status', filters.status);
     if (filters.region) params.append('region_name', filters.region);
@@ -69,6 +74,30 @@ const ResearchList = () => {
     setSearchParams(params);
   }, [pagination.page, pagination.perPage, filters.status, filters.region]);
   
+  // Zbiorczy strumień SSE aktualizujący postęp badań widocznych na stronie
+  const activeTaskIds = researches
+    .filter(r => ['scheduled', 'queued', 'running'].includes(r.status))
+    .map(r => r.task_id)
+    .join(',');
+
+  useEffect(() => {
+    if (!activeTaskIds || typeof window.EventSource === 'undefined') return undefined;
+
+    const source = new window.EventSource(
+      `/api/research/events?task_ids=${encodeURIComponent(activeTaskIds)}`
+    );
+    const applyEvent = (event) => {
+      const data = JSON.parse(event.data);
+      setResearches(prev => prev.map(r => (
+        r.task_id === data.task_id ? { ...r, ...data } : r
+      )));
+    };
+    source.addEventListener('snapshot', applyEvent);
+    source.addEventListener('progress', applyEvent);
+
+    return () => source.close();
+  }, [activeTaskIds]);
+  
   // Obsługa zmiany filtrów
   const handleFilterChange = (e) => {
     const { name, value } = e.target;
@@ -97,6 +126,10 @@ const ResearchList = () => {
     let label = status;
     
     switch (status) {
+      case 'scheduled':
+        variant = 'secondary';
+        label = 'Zaplanowane';
+        break;
       case 'queued':
         variant = 'info';
         label = 'W kolejce';
@@ -228,6 +261,7 @@ const ResearchList = () => {
                   onChange={handleFilterChange}
                 >
                   <option value="">Wszystkie statusy</option>
+                  <option value="scheduled">Zaplanowane</option>
                   <option value="queued">W kolejce</option>
                   <option value="running">W trakcie</option>
                   <option value="completed">Zakończone</option>